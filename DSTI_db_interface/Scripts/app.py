@@ -11,11 +11,15 @@ sys.path.insert(0, PROJECT_ROOT)
 import DSTI_db_interface.cli_user_interface as cli
 
 # 3rd party packages
-app = cli.UserCLI()
 
 if __name__ == "__main__":
 
+    if sys.argv[1:]:
+        # Batch command, e.g. app.py export --output survey_data.csv
+        sys.exit(cli.run_batch_command(sys.argv[1:]))
+
     try:
+        app = cli.UserCLI()
         app.run_cli_app()
     except KeyboardInterrupt:
         pass
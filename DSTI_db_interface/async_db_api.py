@@ -0,0 +1,319 @@
+from __future__ import annotations
+
+# Standard library imports
+import asyncio
+import concurrent.futures
+import functools
+import threading
+import weakref
+
+# Local Imports
+from .dependency_installation import lazy_import
+from . import db_api as db
+from . import metrics
+from . import queries_and_dynamic_queries as q
+from . import result_cache
+from .db_connection import get_config, get_connection_pool, render_sql
+
+# External library imports, imported on first use
+pd = lazy_import("pandas")
+
+
+# SHARED VARIABLES
+
+# Used when config.ini has no [ASYNC] section
+DEFAULT_MAX_WORKERS = 4
+
+# Bounded thread pool all blocking ODBC work runs on,
+# created lazily by get_executor()
+_executor = None
+_executor_lock = threading.Lock()
+
+# Concurrency limit, one asyncio.Semaphore per event loop
+_semaphores = weakref.WeakKeyDictionary()
+_max_workers = None
+_max_concurrent_queries = None
+
+
+# FUNCTIONS
+def configure(max_workers=None, max_concurrent_queries=None) -> None:
+    """
+    Sets the number of worker threads blocking database work
+    runs on, and how many calls may use them at once (defaults
+    to max_workers). Both default to the [ASYNC] section of
+    config.ini.
+
+    Takes effect for calls made after it returns.
+    """
+    global _executor, _max_workers, _max_concurrent_queries
+
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+        _max_workers = max_workers or get_configured_max_workers()
+        _executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=_max_workers, thread_name_prefix="async_db_api"
+        )
+        _max_concurrent_queries = max_concurrent_queries
+        _semaphores.clear()
+
+
+def get_configured_max_workers() -> int:
+    config = get_config()
+    return config.getint("ASYNC", "max_workers", fallback=DEFAULT_MAX_WORKERS)
+
+
+def get_executor() -> concurrent.futures.ThreadPoolExecutor:
+    global _executor, _max_workers
+
+    with _executor_lock:
+        if _executor is None:
+            _max_workers = get_configured_max_workers()
+            _executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=_max_workers, thread_name_prefix="async_db_api"
+            )
+        return _executor
+
+
+def get_semaphore() -> asyncio.Semaphore:
+    """
+    Returns the concurrency limiting semaphore of the running loop
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+
+    if semaphore is None:
+        get_executor()
+        limit = _max_concurrent_queries or _max_workers
+        semaphore = asyncio.Semaphore(limit)
+        _semaphores[loop] = semaphore
+
+    return semaphore
+
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Runs a blocking function on the bounded executor, within
+    the concurrency limit, without blocking the event loop.
+
+    If the awaiting task is cancelled the result is discarded,
+    but a call which has already started runs to completion.
+    """
+    loop = asyncio.get_running_loop()
+
+    async with get_semaphore():
+        return await loop.run_in_executor(
+            get_executor(), functools.partial(func, *args, **kwargs)
+        )
+
+
+async def run_sql_select_query(
+    sql_query=None,
+    params=None,
+    use_cache=None,
+    cache_ttl=None,
+    explain=False,
+    compact=False,
+):
+    """
+    Async counterpart of db_api.run_sql_select_query, taking
+    the same arguments.
+
+    Cancelling the awaiting task also cancels the statement
+    running on the server (ODBC SQLCancel), and the connection
+    goes back to the pool once the worker thread lets go of it.
+    Views and explain=True run db_api.run_sql_select_query on
+    the executor instead, and are not cancelled on the server.
+    """
+    if not db.is_non_empty_select_query(sql_query):
+        raise db.NonPermittedQuery
+
+    if db.is_view_ddl_query(sql_query) or explain:
+        return await run_blocking(
+            db.run_sql_select_query,
+            sql_query,
+            params=params,
+            explain=explain,
+            compact=compact,
+        )
+
+    if use_cache is None:
+        use_cache = await run_blocking(result_cache.is_result_cache_enabled)
+
+    if use_cache:
+        cache = await run_blocking(result_cache.get_result_cache)
+        cached_df = await run_blocking(cache.get, sql_query, params)
+        metrics.increment(
+            "dsti_result_cache_requests_total",
+            result="miss" if cached_df is None else "hit",
+        )
+        if cached_df is not None:
+            return db.get_compact_dataframe(cached_df) if compact else cached_df
+
+    df = await read_sql_cancellable(sql_query, params, compact)
+
+    if use_cache:
+        await run_blocking(cache.put, sql_query, df, cache_ttl, params)
+
+    return df
+
+
+async def read_sql_cancellable(sql_query, params=None, compact=False) -> pd.DataFrame:
+    """
+    Runs a SELECT on a pooled connection from a worker thread,
+    cancelling it on the server if the awaiting task is cancelled.
+
+    params and compact are as for db_api.run_sql_select_query.
+    """
+    loop = asyncio.get_running_loop()
+
+    async with get_semaphore():
+        pool = await loop.run_in_executor(get_executor(), get_connection_pool)
+        with metrics.timer("dsti_connection_acquire_seconds"):
+            acquiring = get_executor().submit(pool.acquire)
+            try:
+                connection = await asyncio.wrap_future(acquiring)
+
+            except asyncio.CancelledError:
+                # The worker may still hand over a connection
+                acquiring.add_done_callback(
+                    lambda acquired: release_acquired_connection(pool, acquired)
+                )
+                raise
+
+        cursor = connection.cursor()
+
+        work = get_executor().submit(
+            fetch_dataframe, cursor, render_sql(sql_query), params, compact
+        )
+        try:
+            df = await asyncio.wrap_future(work)
+
+        except asyncio.CancelledError:
+            cancel_cursor(cursor)
+            # The worker may still be using the connection
+            work.add_done_callback(lambda _: pool.release(connection))
+            raise
+
+        except Exception as e:
+            await loop.run_in_executor(get_executor(), pool.release, connection)
+            raise
+
+        await loop.run_in_executor(get_executor(), pool.release, connection)
+        return df
+
+
+def release_acquired_connection(pool, acquired) -> None:
+    """
+    Releases the connection of acquired, a finished
+    pool.acquire future, unless it never got one
+    """
+    if not acquired.cancelled() and acquired.exception() is None:
+        pool.release(acquired.result())
+
+
+def fetch_dataframe(cursor, sql_query, params=None, compact=False) -> pd.DataFrame:
+    """
+    Executes sql_query on cursor, binding params to its ?
+    placeholders if given, and returns all rows as a DataFrame.
+
+    With compact=True the rows are fetched and narrowed chunk
+    by chunk (see db_api.get_cursor_chunks).
+    """
+    try:
+        with metrics.timer("dsti_query_execution_seconds"):
+            if params is None:
+                cursor.execute(sql_query)
+            else:
+                cursor.execute(sql_query, params)
+            columns = [column[0] for column in cursor.description]
+            if compact:
+                df = db.concat_compact_chunks(
+                    db.get_cursor_chunks(cursor, columns), columns
+                )
+            else:
+                rows = [tuple(row) for row in cursor.fetchall()]
+                df = pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+        db.record_fetched_dataframe(df)
+        return df
+    finally:
+        cursor.close()
+
+
+def cancel_cursor(cursor) -> None:
+    try:
+        cursor.cancel()
+    except Exception as e:
+        pass
+
+
+async def get_live_questions_in_survey_matrix() -> dict:
+    """
+    Async counterpart of
+    queries_and_dynamic_queries.get_live_questions_in_survey_matrix,
+    with the Survey, Question and SurveyStructure lookups running
+    concurrently on separate pooled connections.
+    """
+    survey_ids, question_ids, survey_structure = await asyncio.gather(
+        run_blocking(q.get_survey_ids),
+        run_blocking(q.get_question_ids),
+        run_blocking(q.get_survey_structure),
+    )
+
+    return q.get_questions_in_survey_matrix(
+        survey_ids=survey_ids,
+        question_ids=question_ids,
+        survey_structure=survey_structure,
+    )
+
+
+async def get_all_survey_data(
+    update_view=True,
+    query_generator=None,
+    checkpoint_mode=None,
+    questions_in_survey_matrix=None,
+    fetch_mode=None,
+    fetch_workers=None,
+    explain=False,
+    compact=None,
+    blocked=False,
+) -> pd.DataFrame:
+    """
+    Async counterpart of db_api.get_all_survey_data, taking
+    the same arguments and returning the same result.
+
+    The survey structure lookups run concurrently (see
+    get_live_questions_in_survey_matrix), the rest runs
+    db_api.get_all_survey_data on the executor.
+    """
+    if questions_in_survey_matrix is None:
+        questions_in_survey_matrix = await get_live_questions_in_survey_matrix()
+
+    return await run_blocking(
+        db.get_all_survey_data,
+        update_view=update_view,
+        query_generator=query_generator,
+        checkpoint_mode=checkpoint_mode,
+        questions_in_survey_matrix=questions_in_survey_matrix,
+        fetch_mode=fetch_mode,
+        fetch_workers=fetch_workers,
+        explain=explain,
+        compact=compact,
+        blocked=blocked,
+    )
+
+
+async def update_vw_AllSurveyData_if_obsolete(
+    query_generator=None, checkpoint_mode=None
+) -> None:
+    """
+    Async counterpart of db_api.update_vw_AllSurveyData_if_obsolete.
+    """
+    questions_in_survey_matrix = await get_live_questions_in_survey_matrix()
+
+    await run_blocking(
+        db.update_vw_AllSurveyData_if_obsolete,
+        query_generator=query_generator,
+        checkpoint_mode=checkpoint_mode,
+        questions_in_survey_matrix=questions_in_survey_matrix,
+    )
@@ -0,0 +1,438 @@
+# Standard library imports
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Local Imports
+from . import db_api as db
+from . import db_backends
+from . import metrics
+from . import queries_and_dynamic_queries as q
+from .db_connection import configure_backend
+
+# External library imports
+import numpy as np
+
+
+# SHARED VARIABLES
+
+DEFAULT_RESULTS_PATH = os.path.join(
+    os.path.join(os.path.dirname(__file__)), "Data", "benchmarks", "results.jsonl"
+)
+
+# Size of the synthetic dataset when not given
+DEFAULT_USERS = 1000
+DEFAULT_SURVEYS = 10
+DEFAULT_QUESTIONS_PER_SURVEY = 10
+DEFAULT_ANSWER_DENSITY = 0.8
+DEFAULT_SURVEY_PARTICIPATION = 0.5
+DEFAULT_REPEAT = 3
+DEFAULT_SEED = 0
+
+# Phases timed by run_benchmark, in the order they run
+PHASES = (
+    "structure_lookup",
+    "query_generation",
+    "fetch",
+    "per_survey_fetch",
+    "client_pivot_fetch",
+    "hashing",
+    "view_recreation",
+    "csv_export",
+)
+
+
+# Modules timed by run_import_time_benchmark
+IMPORT_TIME_MODULES = (
+    "DSTI_db_interface.db_connection",
+    "DSTI_db_interface.db_api",
+    "DSTI_db_interface.cli_user_interface",
+)
+
+# Libraries importing the package alone should not load
+HEAVY_LIBRARIES = ("pandas", "numpy", "pyodbc", "pyarrow")
+
+# Run by time_import in a fresh interpreter
+_IMPORT_TIME_SCRIPT = """
+import json, sys, time
+start_time = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start_time
+loaded = [name for name in {heavy_libraries!r} if name in sys.modules]
+print(json.dumps({{"seconds": seconds, "heavy_libraries_loaded": loaded}}))
+"""
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# FUNCTIONS
+def generate_survey_data(
+    users=DEFAULT_USERS,
+    surveys=DEFAULT_SURVEYS,
+    questions_per_survey=DEFAULT_QUESTIONS_PER_SURVEY,
+    answer_density=DEFAULT_ANSWER_DENSITY,
+    survey_participation=DEFAULT_SURVEY_PARTICIPATION,
+    seed=DEFAULT_SEED,
+) -> dict:
+    """
+    Builds a synthetic survey dataset, in the format taken by
+    db_backends.insert_survey_data.
+
+    Each survey asks questions_per_survey questions drawn from
+    a shared pool of twice that many, so surveys overlap and
+    every survey leaves some questions out. Each user takes
+    each survey with probability survey_participation, and
+    answers each of its questions with probability
+    answer_density. The same seed gives the same dataset.
+    """
+    rng = np.random.default_rng(seed)
+
+    question_pool = 2 * questions_per_survey
+    survey_ids = np.arange(1, surveys + 1)
+    question_ids = np.arange(1, question_pool + 1)
+    user_ids = np.arange(1, users + 1)
+
+    survey_structure = []
+    answer_columns = []
+    for survey_id in survey_ids:
+        survey_question_ids = np.sort(
+            rng.choice(question_ids, size=questions_per_survey, replace=False)
+        )
+        survey_structure.extend(
+            (int(survey_id), int(question_id), ordinal + 1)
+            for ordinal, question_id in enumerate(survey_question_ids)
+        )
+
+        participants = user_ids[rng.random(users) < survey_participation]
+
+        # One row per participant and question, kept if answered
+        answer_user_ids = np.repeat(participants, questions_per_survey)
+        answer_question_ids = np.tile(survey_question_ids, len(participants))
+        answered = rng.random(len(answer_user_ids)) < answer_density
+
+        answer_columns.append(
+            (
+                answer_question_ids[answered],
+                np.full(answered.sum(), survey_id),
+                answer_user_ids[answered],
+                rng.integers(0, 11, size=answered.sum()),
+            )
+        )
+
+    answers = []
+    for columns in answer_columns:
+        answers.extend(zip(*(column.tolist() for column in columns)))
+
+    return {
+        "Survey": [(int(survey_id), f"Survey {survey_id}") for survey_id in survey_ids],
+        "Question": [
+            (int(question_id), f"Question {question_id}")
+            for question_id in question_ids
+        ],
+        "SurveyStructure": survey_structure,
+        "User": [
+            (int(user_id), f"User {user_id}", f"user{user_id}@example.com")
+            for user_id in user_ids
+        ],
+        "Answer": answers,
+    }
+
+
+def time_phase(timings, phase, func, *args, **kwargs):
+    """
+    Calls func, appends its duration in seconds
+    to timings[phase] and returns its result.
+    """
+    start_time = time.perf_counter()
+    result = func(*args, **kwargs)
+    timings.setdefault(phase, []).append(time.perf_counter() - start_time)
+    return result
+
+
+def run_pipeline_once(timings, query_generator=None, export_directory=None) -> dict:
+    """
+    Runs every phase of an AllSurveyData refresh once against
+    the current backend, recording how long each one took.
+    Returns the size of the result set.
+    """
+    matrix = time_phase(
+        timings, "structure_lookup", q.get_live_questions_in_survey_matrix
+    )
+
+    # Time the query build itself, not a memo lookup
+    q.clear_dynamic_query_memo()
+    qry = time_phase(
+        timings,
+        "query_generation",
+        q.get_dynamic_query_to_update_vw_AllSurveyData,
+        query_generator,
+        matrix,
+    )
+
+    df = time_phase(timings, "fetch", db.run_sql_select_query, qry, use_cache=False)
+    time_phase(
+        timings,
+        "per_survey_fetch",
+        db.get_all_survey_data_in_parallel,
+        query_generator,
+        matrix,
+    )
+    time_phase(
+        timings, "client_pivot_fetch", db.get_all_survey_data_by_client_pivot, matrix
+    )
+    time_phase(timings, "hashing", db.get_dataframe_hash_id, df)
+
+    def recreate_view():
+        db.drop_vw_AllSurveyData()
+        db.create_vw_AllSurveyData(query_generator, matrix)
+
+    time_phase(timings, "view_recreation", recreate_view)
+
+    time_phase(
+        timings,
+        "csv_export",
+        db.export_sql_select_query,
+        qry,
+        filepath=os.path.join(export_directory, "all_survey_data.csv"),
+        report_progress=False,
+    )
+
+    return {"rows": len(df), "columns": len(df.columns)}
+
+
+def run_benchmark(
+    users=DEFAULT_USERS,
+    surveys=DEFAULT_SURVEYS,
+    questions_per_survey=DEFAULT_QUESTIONS_PER_SURVEY,
+    answer_density=DEFAULT_ANSWER_DENSITY,
+    survey_participation=DEFAULT_SURVEY_PARTICIPATION,
+    query_generator=None,
+    repeat=DEFAULT_REPEAT,
+    seed=DEFAULT_SEED,
+) -> dict:
+    """
+    Loads a synthetic dataset (see generate_survey_data) into
+    an in-memory SQLite backend and runs the AllSurveyData
+    pipeline repeat times on it, timing each of PHASES.
+
+    Returns a JSON serialisable record of the run: parameters,
+    environment, result set size and, per phase, every
+    duration in seconds with their minimum and median.
+    """
+    parameters = {
+        "users": users,
+        "surveys": surveys,
+        "questions_per_survey": questions_per_survey,
+        "answer_density": answer_density,
+        "survey_participation": survey_participation,
+        "query_generator": query_generator or q.get_configured_query_generator(),
+        "repeat": repeat,
+        "seed": seed,
+    }
+
+    survey_data = generate_survey_data(
+        users, surveys, questions_per_survey, answer_density, survey_participation, seed
+    )
+    backend = db_backends.SQLiteBackend(survey_data=survey_data)
+    configure_backend(backend)
+
+    timings = {}
+    statement_counters = (
+        "dsti_statement_prepares_total",
+        "dsti_statement_executions_total",
+    )
+    statements_before = [metrics.get_counter_total(name) for name in statement_counters]
+    try:
+        with tempfile.TemporaryDirectory() as export_directory:
+            for _ in range(repeat):
+                result_size = run_pipeline_once(
+                    timings, parameters["query_generator"], export_directory
+                )
+    finally:
+        configure_backend(None)
+        backend.close()
+
+    prepares, executions = (
+        metrics.get_counter_total(name) - before
+        for name, before in zip(statement_counters, statements_before)
+    )
+
+    return {
+        "benchmark": "pipeline",
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "commit": get_git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "backend": backend.name,
+        "parameters": parameters,
+        "answers": len(survey_data["Answer"]),
+        "result": result_size,
+        "statements": {"prepares": prepares, "executions": executions},
+        "phases": {
+            phase: {
+                "seconds": timings[phase],
+                "min": min(timings[phase]),
+                "median": statistics.median(timings[phase]),
+            }
+            for phase in PHASES
+        },
+    }
+
+
+def time_import(module) -> dict:
+    """
+    Imports module in a fresh interpreter, so nothing is already
+    loaded, and returns the seconds the import took and which
+    of HEAVY_LIBRARIES it loaded.
+    """
+    script = _IMPORT_TIME_SCRIPT.format(module=module, heavy_libraries=HEAVY_LIBRARIES)
+    completed_process = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    # Anything printed during the import comes first
+    return json.loads(completed_process.stdout.strip().splitlines()[-1])
+
+
+def run_import_time_benchmark(
+    modules=IMPORT_TIME_MODULES, repeat=DEFAULT_REPEAT
+) -> dict:
+    """
+    Times the import of each of modules repeat times, each in
+    a fresh interpreter, to track startup cost across commits.
+
+    Returns a JSON serialisable record of the run, in the
+    same layout as run_benchmark's.
+    """
+    imports = {}
+    for module in modules:
+        timings = [time_import(module) for _ in range(repeat)]
+        seconds = [timing["seconds"] for timing in timings]
+        imports[module] = {
+            "seconds": seconds,
+            "min": min(seconds),
+            "median": statistics.median(seconds),
+            "heavy_libraries_loaded": timings[-1]["heavy_libraries_loaded"],
+        }
+
+    return {
+        "benchmark": "import_time",
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "commit": get_git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {"repeat": repeat},
+        "imports": imports,
+    }
+
+
+def get_git_commit() -> str:
+    """
+    Returns the commit the package is checked out at,
+    or None outside a git repository.
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_benchmark_result(result: dict, filepath=DEFAULT_RESULTS_PATH) -> None:
+    """
+    Appends result to filepath as one line of JSON, so the
+    results of runs on different commits can be compared.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+    with open(filepath, "a") as file:
+        file.write(json.dumps(result) + "\n")
+
+
+def stdout_benchmark_result(result: dict) -> None:
+    print(
+        f"{result['answers']} answers -> "
+        f"{result['result']['rows']} rows x {result['result']['columns']} columns"
+    )
+    for phase, timing in result["phases"].items():
+        print(f"{phase:<20} median {timing['median']:.4f}s  min {timing['min']:.4f}s")
+    print(
+        f"{result['statements']['executions']} parameterized statement executions, "
+        f"{result['statements']['prepares']} prepares"
+    )
+
+
+def stdout_import_time_result(result: dict) -> None:
+    for module, timing in result["imports"].items():
+        loaded = ", ".join(timing["heavy_libraries_loaded"]) or "none"
+        print(
+            f"{module:<40} median {timing['median']:.4f}s  min {timing['min']:.4f}s"
+            f"  heavy libraries loaded: {loaded}"
+        )
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Times each phase of the AllSurveyData pipeline on synthetic data"
+    )
+    parser.add_argument("--users", type=int, default=DEFAULT_USERS)
+    parser.add_argument("--surveys", type=int, default=DEFAULT_SURVEYS)
+    parser.add_argument(
+        "--questions-per-survey", type=int, default=DEFAULT_QUESTIONS_PER_SURVEY
+    )
+    parser.add_argument("--answer-density", type=float, default=DEFAULT_ANSWER_DENSITY)
+    parser.add_argument(
+        "--survey-participation", type=float, default=DEFAULT_SURVEY_PARTICIPATION
+    )
+    parser.add_argument(
+        "--query-generator", choices=sorted(q.QUERY_GENERATORS), default=None
+    )
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--output", default=DEFAULT_RESULTS_PATH)
+    parser.add_argument(
+        "--import-time",
+        action="store_true",
+        help="Time the import of the package's modules instead",
+    )
+    args = parser.parse_args(argv)
+
+    if args.import_time:
+        result = run_import_time_benchmark(repeat=args.repeat)
+        save_benchmark_result(result, args.output)
+        stdout_import_time_result(result)
+        print(f"Results appended to {args.output}")
+        return
+
+    result = run_benchmark(
+        users=args.users,
+        surveys=args.surveys,
+        questions_per_survey=args.questions_per_survey,
+        answer_density=args.answer_density,
+        survey_participation=args.survey_participation,
+        query_generator=args.query_generator,
+        repeat=args.repeat,
+        seed=args.seed,
+    )
+
+    save_benchmark_result(result, args.output)
+    stdout_benchmark_result(result)
+    print(f"Results appended to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 # Standard Library Imports
+import argparse
 import functools
 import os
 import signal
@@ -7,10 +8,22 @@ import sys
 
 # Local Imports
 import DSTI_db_interface.db_api as db
-
-# import DSTI_db_interface.db_connection as db_conn
+import DSTI_db_interface.db_connection as db_conn
 import DSTI_db_interface.dependency_installation as di
 import DSTI_db_interface.file_utilities as futils
+import DSTI_db_interface.metrics as metrics
+import DSTI_db_interface.queries_and_dynamic_queries as q
+import DSTI_db_interface.watch as watch
+
+
+# SHARED VARIABLES
+
+# Exit codes of the batch commands, see run_batch_command
+EXIT_SUCCESS = 0
+EXIT_FAILURE = 1  # The operation failed, e.g. a query error
+EXIT_USAGE_ERROR = 2  # Invalid arguments, as argparse exits with
+EXIT_NON_PERMITTED_QUERY = 3
+EXIT_DB_CONNECTION_FAILED = 4
 
 
 # DECORATORS
@@ -48,6 +61,7 @@ class UserCLI:
 
     def __init__(self):
 
+        di.check_dependencies()
         print("\n\n\n")  # Clear some space in the stdout
         self.feature_map = self.get_cli_feature_map()
 
@@ -154,7 +168,8 @@ class UserCLI:
     def run_select_query(self, SELECT_query=None, save_file_path=None):
         """
         Runs a custom SELECT query from the user
-        against the db, saving the results to a local csv file.
+        against the db, saving the results to a local csv,
+        Parquet, Feather or Arrow IPC file.
 
         Non SELECT queries are not executed.
         """
@@ -196,25 +211,39 @@ class UserCLI:
 
         try:
 
-            results = db.run_sql_select_query(SELECT_query)
+            if db.is_view_ddl_query(SELECT_query):
+                with metrics.timer("dsti_cli_action_seconds", action="view_ddl"):
+                    db.run_sql_select_query(SELECT_query)
+                print(f"\nExecuted Query:\n\n{SELECT_query}\n")
 
-            if any(results):
-                save_file_path = futils.get_target_filepath_to_save(".csv")
-
-                results.to_csv(save_file_path)
-
-                results_summary = f"\nExecuted Query:\n\n{SELECT_query}\n\nResults saved to\n{save_file_path}\n"
-                print(results_summary)
             else:
-                results_summary = f"\nSuccessful query but no results retrieved\n"
+                save_file_path = futils.get_target_filepath_to_save(
+                    futils.EXPORT_FILE_EXTENSIONS
+                )
 
-                print(results_summary)
+                with metrics.timer("dsti_cli_action_seconds", action="select_query"):
+                    # Results are streamed to the file chunk by chunk,
+                    # bypassing the result cache, which would hold them
+                    # all in memory
+                    export_summary = db.export_sql_select_query(
+                        SELECT_query, filepath=save_file_path
+                    )
+                    rows = export_summary["rows"] if export_summary else 0
+
+                if rows:
+                    results_summary = f"\nExecuted Query:\n\n{SELECT_query}\n\nResults saved to\n{save_file_path}\n"
+                    print(results_summary)
+                else:
+                    results_summary = f"\nSuccessful query but no results retrieved\n"
+
+                    print(results_summary)
 
         except Exception as e:
             print("The following error occured:\n")
             print(e)
             print("Sorry about it.")
 
+        self.export_metrics()
         self.application_cycle()
 
     @_delineate_stdout
@@ -228,8 +257,10 @@ class UserCLI:
         results hash.
         """
 
-        db.update_vw_AllSurveyData_if_obsolete()
+        with metrics.timer("dsti_cli_action_seconds", action="update_view"):
+            db.update_vw_AllSurveyData_if_obsolete()
         print("\n")
+        self.export_metrics()
         self.application_cycle()
 
         self.application_cycle()
@@ -237,12 +268,15 @@ class UserCLI:
     @_delineate_stdout
     def download_all_survey_data(self, save_file_path=None):
         """
-        Queries the latest AllSurveyData and saves the results
-        to a local csv.
+        Queries the latest AllSurveyData and streams the results
+        to a local csv, Parquet, Feather or Arrow IPC file
+        depending on the file extension.
 
         Optionally updates vw_AllSurveyData (user input requested)
         """
-        save_file_path = futils.get_target_filepath_to_save("csv")
+        save_file_path = futils.get_target_filepath_to_save(
+            futils.EXPORT_FILE_EXTENSIONS
+        )
 
         print("\nYou want to update vw_AllSurveyData too? [y/n]\n")
 
@@ -252,10 +286,11 @@ class UserCLI:
 
         update_view = True if update_view == "y" else False
 
-        all_survey_data = db.get_all_survey_data(update_view=update_view)
-
         try:
-            all_survey_data.to_csv(save_file_path)
+            with metrics.timer("dsti_cli_action_seconds", action="download"):
+                db.export_all_survey_data(
+                    filepath=save_file_path, update_view=update_view
+                )
         except Exception as e:
             print(e)
 
@@ -272,8 +307,281 @@ class UserCLI:
 
             print(results_str + "\n\n")
 
+            self.export_metrics()
             self.application_cycle()
 
+    def export_metrics(self):
+        """
+        Writes the metrics files set in the [METRICS]
+        section of config.ini, if any, after each action
+        """
+        try:
+            metrics.export_configured_metrics()
+        except OSError as e:
+            print(f"Could not export metrics:\n{e}\n")
+
     def get_function_and_desc_from_choice(self, choice: str):
         function, function_desc = self.feature_map[choice]
         return function, function_desc
+
+
+# BATCH COMMANDS
+# Non-interactive counterparts of the UserCLI features, for
+# cron jobs and schedulers: one operation per run, no prompts,
+# and the outcome reported by the exit code.
+
+
+def get_batch_argument_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="app.py",
+        description=f"{UserCLI.APP_NAME} v{UserCLI.VERSION}. "
+        "Runs a single operation without prompts. "
+        "Run without arguments for the interactive menu.",
+    )
+    parser.add_argument(
+        "--quiet", action="store_true", help="Don't print export progress"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser(
+        "export", help="Export the latest AllSurveyData to a file"
+    )
+    add_output_arguments(export_parser, required=True)
+    export_parser.add_argument(
+        "--update-view",
+        action="store_true",
+        help="Also update vw_AllSurveyData if it is obsolete",
+    )
+    add_view_arguments(export_parser)
+    export_parser.set_defaults(batch_command=batch_export)
+
+    refresh_parser = subparsers.add_parser(
+        "refresh-view", help="Update vw_AllSurveyData if it is obsolete"
+    )
+    add_view_arguments(refresh_parser)
+    refresh_parser.set_defaults(batch_command=batch_refresh_view)
+
+    watch_parser = subparsers.add_parser(
+        "watch",
+        help="Keep running, recreating vw_AllSurveyData when the survey "
+        "structure changes",
+    )
+    watch_parser.add_argument(
+        "--interval", type=float, help="Seconds between polls, see [WATCH]"
+    )
+    watch_parser.add_argument(
+        "--jitter", type=float, help="Fraction of the interval to vary it by"
+    )
+    watch_parser.add_argument(
+        "--max-backoff", type=float, help="Longest wait after failed polls"
+    )
+    watch_parser.add_argument(
+        "--max-polls", type=int, help="Stop after this many polls"
+    )
+    watch_parser.add_argument(
+        "--query-generator",
+        choices=sorted(q.QUERY_GENERATORS),
+        help="Defaults to query_generator in config.ini",
+    )
+    watch_parser.set_defaults(batch_command=batch_watch)
+
+    query_parser = subparsers.add_parser(
+        "query",
+        help="Run a SELECT query, exporting its results, or a view DDL query",
+    )
+    query_source = query_parser.add_mutually_exclusive_group(required=True)
+    query_source.add_argument("--query-file", help="Text file holding the query")
+    query_source.add_argument("--sql", help="The query itself")
+    add_output_arguments(query_parser, required=False)
+    query_parser.set_defaults(batch_command=batch_query)
+
+    return parser
+
+
+def add_output_arguments(parser, required) -> None:
+    parser.add_argument(
+        "--output",
+        required=required,
+        help="File to write the results to, "
+        f"ending in one of {', '.join(futils.EXPORT_FILE_EXTENSIONS)}",
+    )
+    parser.add_argument(
+        "--format",
+        choices=sorted(futils.EXPORT_FORMATS),
+        help="Export format, chosen from the --output extension if omitted",
+    )
+    parser.add_argument("--compression", help="Compression of columnar formats")
+
+
+def add_view_arguments(parser) -> None:
+    parser.add_argument(
+        "--query-generator",
+        choices=sorted(q.QUERY_GENERATORS),
+        help="Defaults to query_generator in config.ini",
+    )
+    parser.add_argument(
+        "--checkpoint-mode",
+        choices=db.CHECKPOINT_MODES,
+        help="Defaults to checkpoint_mode in config.ini",
+    )
+
+
+def get_output_filepath_error(args) -> str:
+    """
+    Returns why the results can't be written to args.output,
+    or None if they can
+    """
+    if not futils.is_valid_write_filepath(os.path.abspath(args.output)):
+        return f"The directory of {args.output} does not exist"
+    try:
+        futils.get_export_format(args.output, args.format)
+    except futils.UnsupportedExportFormat as e:
+        return str(e)
+    return None
+
+
+def batch_export(args) -> int:
+    output_error = get_output_filepath_error(args)
+    if output_error:
+        print(output_error, file=sys.stderr)
+        return EXIT_USAGE_ERROR
+
+    export_summary = db.export_all_survey_data(
+        filepath=args.output,
+        update_view=args.update_view,
+        query_generator=args.query_generator,
+        checkpoint_mode=args.checkpoint_mode,
+        report_progress=not args.quiet,
+        file_format=args.format,
+        compression=args.compression,
+    )
+    if export_summary is None:
+        return EXIT_FAILURE
+
+    print(f"{export_summary['rows']} rows of AllSurveyData saved to {args.output}")
+    return EXIT_SUCCESS
+
+
+def batch_refresh_view(args) -> int:
+    db.update_vw_AllSurveyData_if_obsolete(
+        query_generator=args.query_generator, checkpoint_mode=args.checkpoint_mode
+    )
+    return EXIT_SUCCESS
+
+
+def batch_watch(args) -> int:
+    """
+    Runs a watch.ViewWatcher until interrupted (Ctrl+C or SIGTERM)
+    """
+    settings = watch.get_watch_settings()
+    for setting, value in (
+        ("poll_interval", args.interval),
+        ("jitter", args.jitter),
+        ("max_backoff", args.max_backoff),
+    ):
+        if value is not None:
+            settings[setting] = value
+
+    watcher = watch.ViewWatcher(query_generator=args.query_generator, **settings)
+
+    def stop_watcher(signal_number, frame):
+        watcher.stop()
+
+    signal.signal(signal.SIGTERM, stop_watcher)
+    print(
+        f"Watching the survey structure every {settings['poll_interval']}s, "
+        "Ctrl+C to stop"
+    )
+    try:
+        watcher.run(max_polls=args.max_polls)
+    except KeyboardInterrupt:
+        pass
+
+    if watcher.consecutive_failures:
+        return EXIT_FAILURE
+    return EXIT_SUCCESS
+
+
+def batch_query(args) -> int:
+    if args.query_file:
+        if not os.path.isfile(args.query_file):
+            print(f"Query file {args.query_file} not found", file=sys.stderr)
+            return EXIT_USAGE_ERROR
+        sql_query = futils.get_sql_from_text_file_as_text(args.query_file)
+    else:
+        sql_query = args.sql
+
+    if not db.is_non_empty_select_query(sql_query):
+        raise db.NonPermittedQuery
+
+    if db.is_view_ddl_query(sql_query):
+        db.run_sql_select_query(sql_query)
+        print("View query executed")
+        return EXIT_SUCCESS
+
+    if not args.output:
+        print("--output is required for SELECT queries", file=sys.stderr)
+        return EXIT_USAGE_ERROR
+
+    output_error = get_output_filepath_error(args)
+    if output_error:
+        print(output_error, file=sys.stderr)
+        return EXIT_USAGE_ERROR
+
+    export_summary = db.export_sql_select_query(
+        sql_query,
+        filepath=args.output,
+        report_progress=not args.quiet,
+        file_format=args.format,
+        compression=args.compression,
+    )
+    if export_summary is None:
+        return EXIT_FAILURE
+
+    print(f"{export_summary['rows']} rows saved to {args.output}")
+    return EXIT_SUCCESS
+
+
+def run_batch_command(argv=None) -> int:
+    """
+    Parses argv (the command line arguments, e.g.
+    ["export", "--output", "survey_data.csv"]) and runs the
+    requested operation, without any prompt.
+
+    Errors which the db_api functions report and swallow are
+    detected from the dsti_query_errors_total metric.
+
+    Returns the exit code: EXIT_SUCCESS or one of the EXIT_*
+    failure codes. Invalid arguments exit with EXIT_USAGE_ERROR.
+    """
+    args = get_batch_argument_parser().parse_args(argv)
+
+    query_errors = metrics.get_counter_total("dsti_query_errors_total")
+    try:
+        with metrics.timer("dsti_cli_action_seconds", action=f"batch_{args.command}"):
+            exit_code = args.batch_command(args)
+    except db.NonPermittedQuery as e:
+        print("Only SELECT queries and view DDL queries are permitted", file=sys.stderr)
+        exit_code = EXIT_NON_PERMITTED_QUERY
+    except db_conn.DBConnectionFailed as e:
+        print(e, file=sys.stderr)
+        exit_code = EXIT_DB_CONNECTION_FAILED
+    except Exception as e:
+        print(f"The following error occured:\n{e}", file=sys.stderr)
+        exit_code = EXIT_FAILURE
+
+    if exit_code == EXIT_SUCCESS and (
+        metrics.get_counter_total("dsti_query_errors_total") > query_errors
+    ):
+        exit_code = EXIT_FAILURE
+
+    try:
+        metrics.export_configured_metrics()
+    except OSError as e:
+        print(f"Could not export metrics:\n{e}", file=sys.stderr)
+
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(run_batch_command())
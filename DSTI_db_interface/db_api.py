@@ -1,15 +1,32 @@
+from __future__ import annotations
+
 # Standard library imports
+import concurrent.futures
 import configparser
 import hashlib
+import json
 import os
+import time
 
 # Local Imports
-from .db_connection import provide_db_connection
-from .queries_and_dynamic_queries import get_dynamic_query_to_update_vw_AllSurveyData
+from .dependency_installation import lazy_import
+from .db_connection import (
+    execute_prepared,
+    get_backend,
+    get_config,
+    provide_db_connection,
+    render_sql,
+)
+from . import file_utilities as futils
+from . import metrics
+from . import queries_and_dynamic_queries as q
+from . import query_plans
+from . import result_cache
+from . import survey_blocks
 
-# External library imports
-import pandas as pd
-import pyodbc
+# External library imports, imported on first use
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
 
 # EXCEPTIONS
 class NonPermittedQuery(Exception):
@@ -26,12 +43,82 @@ class NonPermittedQuery(Exception):
             return "NonPermittedQuery has been raised"
 
 
+class UnknownCheckpointMode(Exception):
+    def __init__(self, *args):
+        if args:
+            self.message = args[0]
+        else:
+            self.message = None
+
+    def __str__(self):
+        if self.message:
+            return "UnknownCheckpointMode, {0} ".format(self.message)
+        else:
+            return "UnknownCheckpointMode has been raised"
+
+
 # SHARED VARIABLES
 
 CHECKPOINT_PATH = os.path.join(
-    os.path.join(os.path.dirname(__file__)), "data", "survey_data_last_checkpoint.txt"
+    os.path.join(os.path.dirname(__file__)), "Data", "survey_data_last_checkpoint.txt"
+)
+
+# What the checkpoint hash is computed from:
+#   data: the full AllSurveyData result set
+#   structure: only the Survey, Question and SurveyStructure tables,
+#              which are all the view definition depends on
+#   checksum: row counts and checksums of the tables the view reads,
+#             computed on the server, so no rows are downloaded
+CHECKPOINT_MODES = ("data", "structure", "checksum")
+DEFAULT_CHECKPOINT_MODE = "data"
+
+# Structure checkpoints are stored with this prefix so they
+# can never be mistaken for a data checkpoint
+STRUCTURE_CHECKPOINT_PREFIX = "structure:"
+
+# Checksum checkpoints hold the server's checksums as JSON after this prefix
+CHECKSUM_CHECKPOINT_PREFIX = "checksum:"
+
+# Data checkpoints written by get_dataframe_hash_id carry this prefix.
+# Bare md5 checkpoints were written by the former to_string() based hash.
+DATAFRAME_HASH_PREFIX = "rows:"
+
+ROW_HASH_INDEX_PATH = os.path.join(
+    os.path.join(os.path.dirname(__file__)), "Data", "survey_data_row_hash_index.csv"
 )
 
+# AllSurveyData rows are identified by these columns in the row hash index
+ROW_KEY_COLUMNS = ["UserId", "SurveyId"]
+
+# Column added to delta exports, holding one of CHANGE_TYPES
+CHANGE_TYPE_COLUMN = "ChangeType"
+CHANGE_TYPES = ("insert", "update", "delete")
+
+# How get_all_survey_data fetches AllSurveyData:
+#   single: one UNION query
+#   parallel: one query per survey, run on a thread pool
+#   client_pivot: Answer read in long format and pivoted
+#                 here rather than on the database server
+FETCH_MODES = ("single", "parallel", "client_pivot")
+DEFAULT_FETCH_MODE = "single"
+DEFAULT_FETCH_WORKERS = 4
+
+# Rows fetched and written per chunk by the streaming exports
+DEFAULT_EXPORT_CHUNKSIZE = 50000
+
+# Rows fetched, then narrowed, at a time by compact fetches
+DEFAULT_COMPACT_FETCH_CHUNKSIZE = 50000
+
+# Narrowest first. Answer columns, which hold NULLs for questions
+# outside a survey, get the nullable ones, other integer columns
+# (UserId, SurveyId) the numpy ones.
+COMPACT_NULLABLE_INTEGER_DTYPES = ("Int8", "Int16", "Int32", "Int64")
+COMPACT_INTEGER_DTYPES = ("int8", "int16", "int32", "int64")
+ANSWER_COLUMN_PREFIX = "ANS_Q"
+
+# Mixes column hashes into row hashes in get_dataframe_row_hashes_sum
+_ROW_HASH_MULTIPLIER = 1099511628211
+
 
 # FUNCTIONS
 def is_non_empty_select_query(qry: str) -> bool:
@@ -57,41 +144,440 @@ def is_non_empty_select_query(qry: str) -> bool:
     return permitted_qry
 
 
-@provide_db_connection
-def run_sql_select_query(sql_query=None, connection=None) -> pd.DataFrame:
+def is_view_ddl_query(qry: str) -> bool:
+    """
+    Returns True if the passed query creates or alters a view
     """
-    Runs passed query against database using connection object.
+    qry = qry.lower()
+    return "create view" in qry or "alter view" in qry
+
+
+def run_sql_select_query(
+    sql_query=None,
+    params=None,
+    use_cache=None,
+    cache_ttl=None,
+    explain=False,
+    compact=False,
+) -> pd.DataFrame:
+    """
+    Runs passed query against database.
     It will not run any destructive or modicative qry,
     instead raising a NonPermittedQuery exception.
 
-    @provide_db_connection provides the connection object.
+    params, if given, are bound to the ? placeholders of
+    sql_query, which then runs as a prepared statement reused
+    across calls (see db_connection.execute_prepared).
+
+    With use_cache=True, results are served from and saved
+    to the disk-backed result cache (see result_cache), for
+    cache_ttl seconds or the configured default. use_cache
+    defaults to the enabled option of the [RESULT_CACHE]
+    section of config.ini. Views are never cached.
+
+    With explain=True, the query bypasses the cache and its
+    execution plan and statistics are captured and saved
+    (see query_plans.explain_sql_select_query).
+
+    With compact=True, integer columns are narrowed to the
+    smallest integer dtype holding their values, chunk by chunk
+    as rows arrive (see get_compact_dataframe).
 
     Returns a pandas dataframe.
     """
     if not is_non_empty_select_query(sql_query):
         raise NonPermittedQuery
 
-    create_view = "create view" in sql_query.lower()
-    alter_view = "alter view" in sql_query.lower()
+    if explain and not is_view_ddl_query(sql_query):
+        df, _ = query_plans.explain_sql_select_query(sql_query, params=params)
+        return get_compact_dataframe(df) if compact and df is not None else df
+
+    if use_cache is None:
+        use_cache = result_cache.is_result_cache_enabled()
+
+    use_cache = use_cache and not is_view_ddl_query(sql_query)
+
+    if use_cache:
+        cached_df = result_cache.get_result_cache().get(sql_query, params)
+        metrics.increment(
+            "dsti_result_cache_requests_total",
+            result="miss" if cached_df is None else "hit",
+        )
+        if cached_df is not None:
+            return get_compact_dataframe(cached_df) if compact else cached_df
+
+    df = _run_sql_select_query(sql_query, params, compact=compact)
+
+    if use_cache and df is not None:
+        result_cache.get_result_cache().put(sql_query, df, ttl=cache_ttl, params=params)
+
+    return df
+
+
+@provide_db_connection
+def _run_sql_select_query(
+    sql_query=None, params=None, compact=False, connection=None
+) -> pd.DataFrame:
+    """
+    Runs passed query against database using connection object,
+    bypassing the result cache.
+
+    With compact=True the rows are fetched
+    DEFAULT_COMPACT_FETCH_CHUNKSIZE at a time, and each chunk is
+    narrowed before the next is fetched, so the full result set
+    never exists with its default dtypes.
+
+    @provide_db_connection provides the connection object.
+
+    Returns a pandas dataframe.
+    """
+    if not is_non_empty_select_query(sql_query):
+        raise NonPermittedQuery
 
     if sql_query and connection:
         try:
-            if create_view or alter_view:
-                cur = connection.execute(sql_query)
-                cur.commit()
-                cur.close()
+            if is_view_ddl_query(sql_query):
+                with metrics.timer("dsti_view_ddl_seconds", statement="custom"):
+                    cur = connection.execute(render_sql(sql_query))
+                    connection.commit()
+                    cur.close()
                 return None
 
+            elif params is not None:
+                with metrics.timer("dsti_query_execution_seconds"):
+                    cur = execute_prepared(connection, render_sql(sql_query), params)
+                    columns = [column[0] for column in cur.description]
+                    if compact:
+                        df = concat_compact_chunks(
+                            get_cursor_chunks(cur, columns), columns
+                        )
+                    else:
+                        rows = [tuple(row) for row in cur.fetchall()]
+                if not compact:
+                    df = pd.DataFrame.from_records(
+                        rows, columns=columns, coerce_float=True
+                    )
+                record_fetched_dataframe(df)
+                return df
+
+            elif compact:
+                with metrics.timer("dsti_query_execution_seconds"):
+                    chunks = pd.read_sql(
+                        render_sql(sql_query),
+                        connection,
+                        chunksize=DEFAULT_COMPACT_FETCH_CHUNKSIZE,
+                    )
+                    df = concat_compact_chunks(chunks)
+                record_fetched_dataframe(df)
+                return df
+
             else:
-                df = pd.read_sql(sql_query, connection)
+                with metrics.timer("dsti_query_execution_seconds"):
+                    df = pd.read_sql(render_sql(sql_query), connection)
+                record_fetched_dataframe(df)
                 return df
         except Exception as e:
+            metrics.increment("dsti_query_errors_total")
             print(f"There seems to be a problem. The query wasn't executed correctly\n")
             print(f"The following error occured:\n{e}\n")
             print("Sorry about it...")
 
 
-def create_checkpoint_file():
+@provide_db_connection
+def export_sql_select_query(
+    sql_query=None,
+    filepath=None,
+    chunksize=DEFAULT_EXPORT_CHUNKSIZE,
+    report_progress=True,
+    file_format=None,
+    compression=None,
+    connection=None,
+) -> dict:
+    """
+    Runs passed SELECT query against database and writes
+    the results to filepath as they arrive, chunksize
+    rows at a time, so memory use does not grow with the size
+    of the result set. Rows written and throughput are printed
+    after each chunk unless report_progress=False.
+
+    The file is written as csv, Parquet, Feather or Arrow IPC
+    depending on file_format, or on the extension of filepath
+    if file_format is None. compression applies to the columnar
+    formats, see file_utilities.get_chunk_writer.
+
+    filepath is only replaced once the export is complete, a
+    failed export leaves it as it was.
+
+    Like run_sql_select_query, raises NonPermittedQuery for
+    destructive or modicative queries.
+
+    @provide_db_connection provides the connection object.
+
+    Returns a summary dict with the number of rows written,
+    the elapsed seconds, the throughput and the
+    get_dataframe_hash_id of the whole result set.
+    """
+    if not is_non_empty_select_query(sql_query) or is_view_ddl_query(sql_query):
+        raise NonPermittedQuery
+
+    if not filepath:
+        raise ValueError("A filepath to export the results to is required")
+
+    # Raises for unsupported formats before running the query
+    file_format = futils.get_export_format(filepath, file_format)
+
+    # Written next to filepath and moved over it once complete,
+    # so a failed export never leaves a truncated file behind
+    temporary_filepath = f"{filepath}.tmp"
+    writer = futils.get_chunk_writer(temporary_filepath, file_format, compression)
+
+    start_time = time.perf_counter()
+    columns = None
+    rows_sum = 0
+
+    try:
+        with writer:
+            for chunk in pd.read_sql(
+                render_sql(sql_query), connection, chunksize=chunksize
+            ):
+                if columns is None:
+                    columns = list(chunk.columns)
+
+                rows_sum = (rows_sum + get_dataframe_row_hashes_sum(chunk)) % 2**64
+                writer.write(chunk)
+                record_fetched_dataframe(chunk)
+
+                if report_progress:
+                    stdout_export_progress(
+                        writer.rows_written, time.perf_counter() - start_time
+                    )
+
+            rows_written = writer.rows_written
+
+        if os.path.exists(temporary_filepath):
+            os.replace(temporary_filepath, filepath)
+
+    except Exception as e:
+        if os.path.exists(temporary_filepath):
+            os.remove(temporary_filepath)
+        metrics.increment("dsti_query_errors_total")
+        print(f"There seems to be a problem. The query wasn't executed correctly\n")
+        print(f"The following error occured:\n{e}\n")
+        print("Sorry about it...")
+        return None
+
+    elapsed_seconds = time.perf_counter() - start_time
+
+    metrics.observe(
+        "dsti_export_seconds",
+        elapsed_seconds,
+        format=file_format,
+    )
+    metrics.increment("dsti_export_rows_total", rows_written)
+    if os.path.exists(filepath):
+        metrics.increment("dsti_export_bytes_total", os.path.getsize(filepath))
+
+    return {
+        "filepath": filepath,
+        "rows": rows_written,
+        "seconds": elapsed_seconds,
+        "rows_per_second": rows_written / elapsed_seconds if elapsed_seconds else 0.0,
+        "hash_id": format_dataframe_hash_id(columns or [], rows_written, rows_sum),
+    }
+
+
+def record_fetched_dataframe(df: pd.DataFrame) -> None:
+    """
+    Adds the rows and in-memory bytes of df to the fetch metrics
+    """
+    if df is None:
+        return
+    metrics.increment("dsti_rows_fetched_total", len(df))
+    metrics.increment(
+        "dsti_bytes_fetched_total", int(df.memory_usage(index=False, deep=True).sum())
+    )
+
+
+def get_cursor_chunks(cur, columns, chunksize=DEFAULT_COMPACT_FETCH_CHUNKSIZE):
+    """
+    Yields the remaining rows of cur as dataframes
+    of at most chunksize rows
+    """
+    while True:
+        rows = cur.fetchmany(chunksize)
+        if not rows:
+            return
+        yield pd.DataFrame.from_records(
+            [tuple(row) for row in rows], columns=columns, coerce_float=True
+        )
+
+
+def concat_compact_chunks(chunks, columns=None) -> pd.DataFrame:
+    """
+    Narrows each dataframe of chunks with get_compact_dataframe as
+    it arrives, and concatenates them. Where chunks were narrowed to
+    different dtypes, the concatenation takes the widest.
+
+    columns names the columns of an empty result set.
+    """
+    compact_chunks = [get_compact_dataframe(chunk) for chunk in chunks]
+
+    if not compact_chunks:
+        return pd.DataFrame(columns=columns)
+    if len(compact_chunks) == 1:
+        return compact_chunks[0]
+    return pd.concat(compact_chunks, ignore_index=True)
+
+
+def get_compact_dtype(values: pd.Series, nullable=False):
+    """
+    Returns the narrowest integer dtype holding every value of
+    values, nullable if nullable=True or if values has NULLs.
+
+    Returns None if values holds anything but whole numbers,
+    or only NULLs without nullable=True.
+    """
+    if not pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+        if not (nullable and values.isna().all()):
+            return None
+
+    non_null_values = values.dropna()
+    if len(non_null_values) < len(values):
+        nullable = True
+
+    if len(non_null_values) == 0:
+        minimum = maximum = 0
+    else:
+        if (
+            pd.api.types.is_float_dtype(non_null_values)
+            and not (non_null_values % 1 == 0).all()
+        ):
+            return None
+        minimum, maximum = non_null_values.min(), non_null_values.max()
+
+    dtypes = COMPACT_NULLABLE_INTEGER_DTYPES if nullable else COMPACT_INTEGER_DTYPES
+    for dtype in dtypes:
+        bounds = np.iinfo(dtype.lower())
+        if bounds.min <= minimum and maximum <= bounds.max:
+            return dtype
+    return None
+
+
+def get_compact_dataframe(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns df with each whole number column narrowed to
+    get_compact_dtype. Answer columns (see ANSWER_COLUMN_PREFIX)
+    always get a nullable dtype, so all the chunks of a result set
+    agree whether or not they happen to hold NULLs.
+
+    Other columns are returned as they are.
+    """
+    compact_dtypes = {}
+    for column in df.columns:
+        dtype = get_compact_dtype(
+            df[column], nullable=str(column).startswith(ANSWER_COLUMN_PREFIX)
+        )
+        if dtype is not None and dtype != df[column].dtype:
+            compact_dtypes[column] = dtype
+
+    if not compact_dtypes:
+        return df
+    return df.astype(compact_dtypes)
+
+
+def get_compact_dtypes_bytes_saved(df: pd.DataFrame) -> int:
+    """
+    Returns how many bytes the compact integer columns of df take
+    less than they would as the 8 byte float64 or int64 columns
+    they are read as by default.
+    """
+    compact_dtypes = set(COMPACT_NULLABLE_INTEGER_DTYPES + COMPACT_INTEGER_DTYPES)
+    return int(
+        sum(
+            8 * len(df) - df[column].memory_usage(index=False, deep=True)
+            for column in df.columns
+            if str(df[column].dtype) in compact_dtypes
+        )
+    )
+
+
+def stdout_compact_dtypes_report(df: pd.DataFrame) -> None:
+    if df is None:
+        return
+    memory_bytes = int(df.memory_usage(index=False, deep=True).sum())
+    bytes_saved = get_compact_dtypes_bytes_saved(df)
+    print(
+        f"Compact dtypes: {memory_bytes:,} bytes in memory, {bytes_saved:,} "
+        f"bytes saved ({bytes_saved / max(memory_bytes + bytes_saved, 1):.0%})"
+    )
+
+
+def stdout_survey_blocks_report(blocks) -> None:
+    memory_bytes = blocks.memory_usage_bytes()
+    # Every cell of the dense DataFrame as 8 bytes
+    dense_bytes = len(blocks) * len(blocks.columns) * 8
+    print(
+        f"AllSurveyData in {len(blocks.blocks)} survey blocks: {memory_bytes:,} "
+        f"bytes in memory, about {dense_bytes:,} bytes dense"
+    )
+
+
+def stdout_export_progress(rows_written, elapsed_seconds) -> None:
+    rows_per_second = rows_written / elapsed_seconds if elapsed_seconds else 0.0
+    print(
+        f"  -> {rows_written:,} rows written in {elapsed_seconds:.1f}s ({rows_per_second:,.0f} rows/s)"
+    )
+
+
+def export_all_survey_data(
+    filepath=None,
+    update_view=True,
+    query_generator=None,
+    checkpoint_mode=None,
+    chunksize=DEFAULT_EXPORT_CHUNKSIZE,
+    report_progress=True,
+    file_format=None,
+    compression=None,
+) -> dict:
+    """
+    Streaming counterpart of get_all_survey_data: writes
+    AllSurveyData to filepath chunk by chunk instead of
+    returning it as a DataFrame. file_format and compression
+    are passed on to export_sql_select_query.
+
+    By default, vw_AllSurveyData is updated but can be
+    skipped with update_view=False. The checkpoint hash is
+    computed chunk by chunk while exporting.
+
+    Returns the summary dict of export_sql_select_query.
+    """
+    questions_in_survey_matrix = q.get_live_questions_in_survey_matrix()
+
+    qry = q.get_dynamic_query_to_update_vw_AllSurveyData(
+        query_generator, questions_in_survey_matrix
+    )
+
+    export_summary = export_sql_select_query(
+        qry,
+        filepath=filepath,
+        chunksize=chunksize,
+        report_progress=report_progress,
+        file_format=file_format,
+        compression=compression,
+    )
+
+    if update_view and export_summary is not None:
+        update_vw_AllSurveyData_if_obsolete(
+            live_survey_data_hash=export_summary["hash_id"],
+            query_generator=query_generator,
+            checkpoint_mode=checkpoint_mode,
+            questions_in_survey_matrix=questions_in_survey_matrix,
+        )
+
+    return export_summary
+
+
+def create_checkpoint_file(checkpoint_path=None):
     """
     The checkpoint file at CHECKPOINT_PATH
     may not exist if its the 1st time the 
@@ -100,64 +586,137 @@ def create_checkpoint_file():
     This function creates teh file but with
     nothing inside.
     """
-    with open(CHECKPOINT_PATH, "w") as file:
+    with open(checkpoint_path or CHECKPOINT_PATH, "w") as file:
         # Only create file, don't write anything
         pass
 
 
-def get_checkpoint_hash():
+def get_checkpoint_hash(checkpoint_path=None):
     """
     Reads the hash representing the most recent
     contents of vw_AllSurveyData, from a local 
-    CHECKPOINT_PATH and returns it to the caller.
+    CHECKPOINT_PATH (or checkpoint_path) and returns
+    it to the caller.
 
     If the CHECKPOINT_PATH doesn't exist, a blank file is 
     created and None is returned.
     """
+    checkpoint_path = checkpoint_path or CHECKPOINT_PATH
 
     checkpoint_hash = None
     # Create checkpoint file if one isn't found
-    if not os.path.exists(CHECKPOINT_PATH):
-        create_checkpoint_file()
+    if not os.path.exists(checkpoint_path):
+        create_checkpoint_file(checkpoint_path)
 
-    with open(CHECKPOINT_PATH, "r") as file:
+    with open(checkpoint_path, "r") as file:
         checkpoint_hash = file.read()
 
     return checkpoint_hash
 
 
-def update_vw_AllSurveyData_if_obsolete(live_survey_data: pd.DataFrame = None) -> bool:
+def update_vw_AllSurveyData_if_obsolete(
+    live_survey_data: pd.DataFrame = None,
+    query_generator=None,
+    checkpoint_mode=None,
+    questions_in_survey_matrix=None,
+    live_survey_data_hash=None,
+    checkpoint_path=None,
+) -> bool:
     """
     live_survey_data is the result of
      a call to get_all_survey_data()
 
+    live_survey_data_hash may be passed instead of
+    live_survey_data if its get_dataframe_hash_id is
+    already known, e.g. from a streaming export.
+
+    query_generator is passed on to
+    get_dynamic_query_to_update_vw_AllSurveyData
+
+    questions_in_survey_matrix is the survey structure
+    live_survey_data was fetched with, if already known,
+    so it is not fetched again.
+
     This function compares the hash the
     last dataset (stored in a checkpoint file locally)
     to the latest. 
 
+    With checkpoint_mode="structure" only the survey
+    structure is hashed, so live_survey_data is neither
+    needed nor downloaded. With checkpoint_mode="checksum"
+    the server checksums the tables the view reads, which
+    also catches changed answers, and only a few numbers
+    are downloaded. checkpoint_mode defaults to the
+    checkpoint_mode option in config.ini.
+
+    The checkpoint is kept at checkpoint_path, default
+    CHECKPOINT_PATH. Callers using a checkpoint_mode of their
+    own, like the watcher, keep it in a file of their own.
+
     In case of any difference, a new checkpoint is created
     and the view is updated.
+
+    Returns True if the view was recreated.
     """
+    if checkpoint_mode is None:
+        checkpoint_mode = get_configured_checkpoint_mode()
 
-    if live_survey_data is None:
-        live_survey_data = get_all_survey_data(update_view=False)
+    if checkpoint_mode not in CHECKPOINT_MODES:
+        raise UnknownCheckpointMode(checkpoint_mode)
 
-    checkpoint_hash = get_checkpoint_hash()
-    live_survey_data_hash = get_dataframe_hash_id(live_survey_data)
+    checkpoint_hash = get_checkpoint_hash(checkpoint_path)
+
+    if checkpoint_mode == "structure":
+        if questions_in_survey_matrix is None:
+            questions_in_survey_matrix = q.get_live_questions_in_survey_matrix()
+
+        live_survey_data_hash = get_survey_structure_hash_id(questions_in_survey_matrix)
+        result_cache.invalidate_if_survey_structure_changed(live_survey_data_hash)
+
+    elif checkpoint_mode == "checksum":
+        live_survey_data_hash = get_live_table_checksums_hash_id()
+
+    elif live_survey_data_hash is not None:
+        # Data hash computed by the caller. Legacy checkpoints can't
+        # be migrated without the data, the view is simply recreated.
+        pass
+
+    else:
+        if live_survey_data is None:
+            if questions_in_survey_matrix is None:
+                questions_in_survey_matrix = q.get_live_questions_in_survey_matrix()
+
+            live_survey_data = get_all_survey_data(
+                update_view=False,
+                query_generator=query_generator,
+                questions_in_survey_matrix=questions_in_survey_matrix,
+            )
+
+        live_survey_data_hash = get_dataframe_hash_id(live_survey_data)
+
+        if is_legacy_dataframe_hash_id(checkpoint_hash):
+            checkpoint_hash = migrate_legacy_checkpoint_hash(
+                checkpoint_hash, live_survey_data, checkpoint_path
+            )
 
     # vw_AllSurveyData must be updated if obsolete
     obsolete = checkpoint_hash and (live_survey_data_hash != checkpoint_hash)
 
     if obsolete or not checkpoint_hash:
         drop_vw_AllSurveyData()
-        create_vw_AllSurveyData()
+        create_vw_AllSurveyData(
+            query_generator=query_generator,
+            questions_in_survey_matrix=questions_in_survey_matrix,
+        )
 
         # Record new checkpoint_hash
-        persist_checkpoint_hash(live_survey_data_hash)
+        persist_checkpoint_hash(live_survey_data_hash, checkpoint_path)
 
     # Print action taken for the user to conveniently see
     stdout_vw_AllSurveyData_actions(obsolete, checkpoint_hash, live_survey_data_hash)
 
+    return bool(obsolete or not checkpoint_hash)
+
 
 def stdout_vw_AllSurveyData_actions(
     obsolete, checkpoint_hash, live_survey_data_hash
@@ -176,50 +735,701 @@ def stdout_vw_AllSurveyData_actions(
         )
 
 
-def persist_checkpoint_hash(live_survey_data_hash):
+def persist_checkpoint_hash(live_survey_data_hash, checkpoint_path=None):
     """
     Writes the passed hash to the checkpoint file at
-    CHECKPOINT_PATH. Destroys any pre-existing data
-    in the file
+    CHECKPOINT_PATH (or checkpoint_path). Destroys any
+    pre-existing data in the file
     """
-    if not os.path.exists(CHECKPOINT_PATH):
-        create_checkpoint_file()
+    checkpoint_path = checkpoint_path or CHECKPOINT_PATH
+
+    if not os.path.exists(checkpoint_path):
+        create_checkpoint_file(checkpoint_path)
 
     # Record new checkpoint_hash
-    with open(CHECKPOINT_PATH, "w") as file:
+    with open(checkpoint_path, "w") as file:
         file.write(live_survey_data_hash)
 
 
-def get_all_survey_data(update_view=True) -> pd.DataFrame:
+def get_all_survey_data(
+    update_view=True,
+    query_generator=None,
+    checkpoint_mode=None,
+    questions_in_survey_matrix=None,
+    fetch_mode=None,
+    fetch_workers=None,
+    explain=False,
+    compact=None,
+    blocked=False,
+) -> pd.DataFrame:
     """
     Querys database and for specific result set
     AllSurveyData.
 
     By default, vw_AllSurveyData is updated but can be
     skipped with update_view=False.
+
+    query_generator selects how the AllSurveyData query is
+    written (see queries_and_dynamic_queries.QUERY_GENERATORS).
+
+    checkpoint_mode is passed on to update_vw_AllSurveyData_if_obsolete.
+
+    The survey structure is fetched once and shared by the data
+    fetch, the checkpoint and the view DDL of this refresh.
+
+    With fetch_mode="parallel", each survey's rows are fetched
+    by a separate query on fetch_workers threads (see
+    get_all_survey_data_in_parallel). With fetch_mode="client_pivot",
+    answers are fetched in long format and pivoted in memory (see
+    get_all_survey_data_by_client_pivot). Both default to the
+    [ALL_SURVEY_DATA] section of config.ini.
+
+    If AllSurveyData has more columns than max_view_columns in
+    config.ini, the single and parallel fetch modes fetch it in
+    column partitions instead (see
+    get_all_survey_data_in_column_partitions).
+
+    With explain=True, the execution plan of each AllSurveyData
+    query is captured and saved (see run_sql_select_query).
+
+    With compact=True, the answer columns are fetched as nullable
+    Int8/Int16 and the id columns as the narrowest integers (see
+    get_compact_dataframe), and the memory saved is reported.
+    compact defaults to the compact_dtypes option of the
+    [ALL_SURVEY_DATA] section of config.ini. The checkpoint hash
+    is the same either way.
+
+    With blocked=True, a survey_blocks.SurveyBlocks is returned
+    instead of a DataFrame: one block per survey holding only that
+    survey's answer columns, with the dense DataFrame built on
+    demand. With fetch_mode="client_pivot" the blocks are pivoted
+    directly, and with fetch_mode="parallel" each is cut from its
+    survey's result as it arrives, so the dense DataFrame is never
+    allocated. The single fetch, and column partitioned fetches,
+    split the fetched dense DataFrame into blocks instead.
     """
+    if fetch_mode is None:
+        fetch_mode = get_configured_fetch_mode()
+
+    if compact is None:
+        compact = get_configured_compact_dtypes()
+
+    if fetch_mode not in FETCH_MODES:
+        raise ValueError(f"fetch_mode must be one of {FETCH_MODES}, not {fetch_mode}")
+
+    if questions_in_survey_matrix is None:
+        questions_in_survey_matrix = q.get_live_questions_in_survey_matrix()
+
     # Latest data from live DB tables
-    qry = get_dynamic_query_to_update_vw_AllSurveyData()
+    if fetch_mode != "client_pivot" and (
+        len(q.get_question_id_partitions(questions_in_survey_matrix)) > 1
+    ):
+        live_survey_data = get_all_survey_data_in_column_partitions(
+            query_generator, questions_in_survey_matrix, fetch_workers, explain, compact
+        )
+
+    elif fetch_mode == "parallel":
+        live_survey_data = get_all_survey_data_in_parallel(
+            query_generator,
+            questions_in_survey_matrix,
+            fetch_workers,
+            explain,
+            compact,
+            blocked,
+        )
+
+    elif fetch_mode == "client_pivot":
+        live_survey_data = get_all_survey_data_by_client_pivot(
+            questions_in_survey_matrix, explain, blocked, compact
+        )
+
+    else:
+        qry = q.get_dynamic_query_to_update_vw_AllSurveyData(
+            query_generator, questions_in_survey_matrix
+        )
+
+        # No ORDER BY needed, get_dataframe_hash_id
+        # does not depend on the order of the rows
+        live_survey_data = run_sql_select_query(
+            qry, use_cache=False, explain=explain, compact=compact
+        )
+
+    if compact and isinstance(live_survey_data, pd.DataFrame):
+        metrics.increment(
+            "dsti_compact_dtypes_bytes_saved_total",
+            get_compact_dtypes_bytes_saved(live_survey_data),
+        )
+        stdout_compact_dtypes_report(live_survey_data)
+
+    if blocked and isinstance(live_survey_data, pd.DataFrame):
+        live_survey_data = survey_blocks.SurveyBlocks.from_dataframe(
+            live_survey_data, questions_in_survey_matrix
+        )
 
-    # ORDER BY essential to ensure same hash even if
-    # the order of the result set is different
-    live_survey_data = run_sql_select_query(f"{qry} ORDER BY UserId")
+    if blocked and live_survey_data is not None:
+        stdout_survey_blocks_report(live_survey_data)
 
-    if update_view:
-        update_vw_AllSurveyData_if_obsolete(live_survey_data=live_survey_data)
+    if update_view and blocked:
+        # Hashed block by block, without building the dense DataFrame
+        update_vw_AllSurveyData_if_obsolete(
+            live_survey_data_hash=(
+                None if live_survey_data is None else live_survey_data.get_hash_id()
+            ),
+            query_generator=query_generator,
+            checkpoint_mode=checkpoint_mode,
+            questions_in_survey_matrix=questions_in_survey_matrix,
+        )
+
+    elif update_view:
+        update_vw_AllSurveyData_if_obsolete(
+            live_survey_data=live_survey_data,
+            query_generator=query_generator,
+            checkpoint_mode=checkpoint_mode,
+            questions_in_survey_matrix=questions_in_survey_matrix,
+        )
 
     # Return result as a Pandas DataFrame
     return live_survey_data
 
 
+def get_all_survey_data_in_parallel(
+    query_generator=None,
+    questions_in_survey_matrix=None,
+    fetch_workers=None,
+    explain=False,
+    compact=False,
+    blocked=False,
+) -> pd.DataFrame:
+    """
+    Fetches AllSurveyData as one query per survey, run
+    concurrently on fetch_workers threads, each with its own
+    pooled connection, so independent surveys can use several
+    server cores at once.
+
+    The survey id is a bound parameter of each query, so
+    surveys asking the same questions share one statement.
+
+    The results are concatenated ordered by UserId
+    (then SurveyId). Returns None if any query failed.
+
+    With blocked=True, each worker keeps only its survey's block
+    of its result (see survey_blocks.get_survey_block), and a
+    survey_blocks.SurveyBlocks is returned.
+    """
+    if fetch_workers is None:
+        fetch_workers = get_configured_fetch_workers()
+
+    if blocked and questions_in_survey_matrix is None:
+        questions_in_survey_matrix = q.get_live_questions_in_survey_matrix()
+
+    survey_queries = q.get_per_survey_queries_to_update_vw_AllSurveyData(
+        query_generator, questions_in_survey_matrix
+    )
+
+    def fetch_survey(survey_id):
+        survey_data = run_sql_select_query(
+            *survey_queries[survey_id],
+            use_cache=False,
+            explain=explain,
+            compact=compact,
+        )
+        if blocked and survey_data is not None:
+            return survey_blocks.get_survey_block(
+                survey_data, survey_id, questions_in_survey_matrix
+            )
+        return survey_data
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=fetch_workers) as executor:
+        survey_results = list(executor.map(fetch_survey, survey_queries))
+
+    if any(result is None for result in survey_results):
+        return None
+
+    if blocked:
+        return survey_blocks.SurveyBlocks(
+            {
+                survey_id: block
+                for survey_id, block in zip(survey_queries, survey_results)
+                if len(block)
+            },
+            survey_blocks.get_dense_columns(questions_in_survey_matrix),
+        )
+
+    if not survey_results:
+        return pd.DataFrame()
+
+    # Answer columns which are all NULL in some surveys come back as
+    # object, give them the dtype the single query would have
+    live_survey_data = pd.concat(
+        survey_results, ignore_index=True, sort=False
+    ).infer_objects()
+    return live_survey_data.sort_values(
+        ROW_KEY_COLUMNS, kind="stable", ignore_index=True
+    )
+
+
+def get_all_survey_data_in_column_partitions(
+    query_generator=None,
+    questions_in_survey_matrix=None,
+    fetch_workers=None,
+    explain=False,
+    compact=False,
+) -> pd.DataFrame:
+    """
+    Fetches AllSurveyData as several queries each returning
+    UserId, SurveyId and a slice of the answer columns (see
+    q.get_column_partitioned_queries_to_update_vw_AllSurveyData),
+    run concurrently on fetch_workers threads, and joins them
+    back on UserId and SurveyId (see join_column_partitions).
+
+    Returns None if any query failed.
+    """
+    if fetch_workers is None:
+        fetch_workers = get_configured_fetch_workers()
+
+    partition_queries = q.get_column_partitioned_queries_to_update_vw_AllSurveyData(
+        query_generator, questions_in_survey_matrix
+    )
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=fetch_workers) as executor:
+        partition_results = list(
+            executor.map(
+                lambda qry: run_sql_select_query(
+                    qry, use_cache=False, explain=explain, compact=compact
+                ),
+                partition_queries,
+            )
+        )
+
+    if any(result is None for result in partition_results):
+        return None
+
+    return join_column_partitions(partition_results)
+
+
+def join_column_partitions(partitions) -> pd.DataFrame:
+    """
+    Joins column partitions of AllSurveyData, each with
+    ROW_KEY_COLUMNS and its own answer columns, into one
+    DataFrame ordered by UserId then SurveyId.
+
+    The partitions normally hold the same rows: they are
+    then sorted and put side by side. If rows were added or
+    removed between their queries, they are merged instead.
+    """
+    partitions = [
+        partition.sort_values(ROW_KEY_COLUMNS, kind="stable", ignore_index=True)
+        for partition in partitions
+    ]
+    first_partition = partitions[0]
+
+    same_rows = all(
+        partition[ROW_KEY_COLUMNS].equals(first_partition[ROW_KEY_COLUMNS])
+        for partition in partitions[1:]
+    )
+    if same_rows:
+        return pd.concat(
+            [first_partition]
+            + [partition.drop(columns=ROW_KEY_COLUMNS) for partition in partitions[1:]],
+            axis=1,
+        )
+
+    joined = first_partition
+    for partition in partitions[1:]:
+        joined = joined.merge(partition, on=ROW_KEY_COLUMNS, how="outer")
+    return joined.sort_values(ROW_KEY_COLUMNS, kind="stable", ignore_index=True)
+
+
+def get_all_survey_data_by_client_pivot(
+    questions_in_survey_matrix=None, explain=False, blocked=False, compact=False
+) -> pd.DataFrame:
+    """
+    Fetches every answer in long format with a single plain
+    query, and pivots it into AllSurveyData here, so that the
+    database server only scans Answer instead of running the
+    generated AllSurveyData query.
+
+    With blocked=True, pivots into a survey_blocks.SurveyBlocks.
+
+    With compact=True, the result is narrowed as by
+    get_compact_dataframe: the dense pivot is allocated
+    with narrow integers, and the blocks one by one.
+
+    Returns None if the query failed.
+    """
+    if questions_in_survey_matrix is None:
+        questions_in_survey_matrix = q.get_live_questions_in_survey_matrix()
+
+    answers = run_sql_select_query(
+        q.get_long_format_answers_qry(), use_cache=False, explain=explain
+    )
+    if answers is None:
+        return None
+
+    with metrics.timer("dsti_client_pivot_seconds"):
+        if blocked:
+            blocks = survey_blocks.pivot_long_format_answers_to_blocks(
+                answers, questions_in_survey_matrix
+            )
+            return blocks.compact() if compact else blocks
+        return pivot_long_format_answers(answers, questions_in_survey_matrix, compact)
+
+
+def pivot_long_format_answers(
+    answers: pd.DataFrame, questions_in_survey_matrix: dict, compact=False
+) -> pd.DataFrame:
+    """
+    Pivots answers, with UserId, SurveyId, QuestionId and
+    Answer_Value columns, into the rows and columns of the
+    AllSurveyData query built from questions_in_survey_matrix:
+
+    - one row per user and survey of questions_in_survey_matrix
+      the user answered, ordered by UserId then SurveyId
+    - UserId, SurveyId, then one ANS_Q{QuestionId} column per
+      question, ordered by QuestionId
+    - cells hold the answer, -1 if the question is in the survey
+      but unanswered (or answered NULL), NULL if it is not in the
+      survey
+    - answer columns have the dtypes the query gives them (see
+      set_sql_answer_dtypes)
+
+    With compact=True the cells are allocated as the narrowest
+    integer holding every answer, with a mask of the NULL cells,
+    instead of as float64, and the result has the dtypes of
+    get_compact_dataframe.
+
+    Every step works on whole arrays, nothing loops over answers.
+    """
+    survey_ids = np.array(sorted(questions_in_survey_matrix), dtype=np.int64)
+    question_ids = np.array(
+        sorted(
+            {
+                question_id
+                for questions_in_survey in questions_in_survey_matrix.values()
+                for question_id, _ in questions_in_survey
+            }
+        ),
+        dtype=np.int64,
+    )
+
+    # in_survey[s, c]: question of column c is in survey s
+    in_survey = np.zeros((len(survey_ids), len(question_ids)), dtype=bool)
+    for survey_position, (_, questions_in_survey) in enumerate(
+        sorted(questions_in_survey_matrix.items())
+    ):
+        in_survey_question_ids = [
+            question_id
+            for question_id, is_in_survey in questions_in_survey
+            if is_in_survey
+        ]
+        in_survey[
+            survey_position, np.searchsorted(question_ids, in_survey_question_ids)
+        ] = True
+
+    answer_survey_positions, known_survey = get_sorted_positions(
+        survey_ids, answers["SurveyId"].to_numpy(dtype=np.int64)
+    )
+    answers = answers[known_survey]
+    answer_survey_positions = answer_survey_positions[known_survey]
+
+    # One row per (UserId, SurveyId), sorted by UserId then SurveyId
+    row_keys, row_codes = np.unique(
+        answers["UserId"].to_numpy(dtype=np.int64) * len(survey_ids)
+        + answer_survey_positions,
+        return_inverse=True,
+    )
+    row_user_ids, row_survey_positions = np.divmod(row_keys, max(len(survey_ids), 1))
+
+    # Answers to questions of their survey only
+    answer_question_positions, counted = get_sorted_positions(
+        question_ids, answers["QuestionId"].to_numpy(dtype=np.int64)
+    )
+    counted[counted] = in_survey[
+        answer_survey_positions[counted], answer_question_positions[counted]
+    ]
+
+    answer_values = (
+        pd.to_numeric(answers["Answer_Value"]).fillna(-1).to_numpy(dtype=np.float64)
+    )
+
+    # Integers narrow enough for every answer and the -1 of unanswered
+    # questions, or None for float64 cells with NaN for NULL
+    cell_dtype = None
+    if compact:
+        cell_dtype = get_compact_dtype(
+            pd.Series(np.append(answer_values[counted], -1.0))
+        )
+
+    # -1 for unanswered questions of the row's survey, NULL elsewhere
+    row_in_survey = in_survey[row_survey_positions]
+    if cell_dtype is None:
+        values = np.where(row_in_survey, -1.0, np.nan)
+    else:
+        # Column major, so that each answer column is contiguous
+        values = np.full(row_in_survey.shape, -1, dtype=cell_dtype, order="F")
+
+    values[row_codes[counted], answer_question_positions[counted]] = answer_values[
+        counted
+    ]
+
+    answer_columns = [
+        f"{ANSWER_COLUMN_PREFIX}{question_id}" for question_id in question_ids
+    ]
+    if cell_dtype is None:
+        df = pd.DataFrame(values, columns=answer_columns)
+    else:
+        is_null = np.asfortranarray(~row_in_survey)
+        df = pd.DataFrame(
+            {
+                column: pd.arrays.IntegerArray(
+                    values[:, position], is_null[:, position]
+                )
+                for position, column in enumerate(answer_columns)
+            },
+            index=pd.RangeIndex(len(row_user_ids)),
+            copy=False,
+        )
+    df.insert(0, "SurveyId", survey_ids[row_survey_positions])
+    df.insert(0, "UserId", row_user_ids)
+
+    if compact:
+        return get_compact_dataframe(df)
+    return set_sql_answer_dtypes(df)
+
+
+def set_sql_answer_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns df with its float64 answer columns given the dtypes
+    pandas gives the answer columns of the AllSurveyData query:
+    int64 without NULLs, object holding None if all NULL, and
+    float64 otherwise.
+
+    AllSurveyData built in memory then has the same dtypes
+    as the one fetched with the query.
+    """
+    answer_columns = [
+        column for column in df.columns if str(column).startswith(ANSWER_COLUMN_PREFIX)
+    ]
+    is_null = df[answer_columns].isna()
+    all_null = [column for column, null in is_null.all().items() if null]
+    no_null = [column for column, null in is_null.any().items() if not null]
+
+    df = df.astype(
+        {**dict.fromkeys(no_null, np.int64), **dict.fromkeys(all_null, object)}
+    )
+    if all_null:
+        df.loc[:, all_null] = None
+    return df
+
+
+def get_sorted_positions(sorted_ids: np.ndarray, ids: np.ndarray) -> tuple:
+    """
+    Returns the position of each of ids in the sorted array
+    sorted_ids, and a boolean array telling which of ids are
+    in sorted_ids at all.
+    """
+    positions = np.searchsorted(sorted_ids, ids)
+    found = np.zeros(len(ids), dtype=bool)
+    in_range = positions < len(sorted_ids)
+    found[in_range] = sorted_ids[positions[in_range]] == ids[in_range]
+    return positions, found
+
+
+def get_configured_fetch_mode() -> str:
+    config = get_config()
+    return config.get(
+        "ALL_SURVEY_DATA", "fetch_mode", fallback=DEFAULT_FETCH_MODE
+    ).strip()
+
+
+def get_configured_fetch_workers() -> int:
+    config = get_config()
+    return config.getint(
+        "ALL_SURVEY_DATA", "fetch_workers", fallback=DEFAULT_FETCH_WORKERS
+    )
+
+
+def get_configured_compact_dtypes() -> bool:
+    config = get_config()
+    return config.getboolean("ALL_SURVEY_DATA", "compact_dtypes", fallback=False)
+
+
+def get_configured_checkpoint_mode() -> str:
+    """
+    Returns the checkpoint_mode option from the [ALL_SURVEY_DATA]
+    section of config.ini, defaulting to DEFAULT_CHECKPOINT_MODE.
+    """
+    config = get_config()
+    return config.get(
+        "ALL_SURVEY_DATA", "checkpoint_mode", fallback=DEFAULT_CHECKPOINT_MODE
+    ).strip()
+
+
+def get_survey_structure_hash_id(questions_in_survey_matrix: dict) -> str:
+    """
+    Takes the output of get_questions_in_survey_matrix and returns
+    an md5 hash string of it, prefixed with STRUCTURE_CHECKPOINT_PREFIX.
+
+    The hash only changes when surveys, questions or the
+    questions in a survey change, i.e. when the
+    vw_AllSurveyData definition has to change.
+    """
+    hashable_structure = json.dumps(
+        [
+            [int(survey_id), [[int(qid), int(in_survey)] for qid, in_survey in rows]]
+            for survey_id, rows in questions_in_survey_matrix.items()
+        ]
+    ).encode("UTF-8")
+
+    m = hashlib.md5(hashable_structure).hexdigest()
+    return f"{STRUCTURE_CHECKPOINT_PREFIX}{m}"
+
+
+def get_live_survey_structure_hash_id() -> str:
+    """
+    Hashes the survey structure currently in the database.
+    Costs 3 small queries, whatever the number of answers.
+    """
+    questions_in_survey_matrix = q.get_live_questions_in_survey_matrix()
+    return get_survey_structure_hash_id(questions_in_survey_matrix)
+
+
+def get_table_checksums() -> list:
+    """
+    Runs q.get_table_checksums_query on the database server,
+    bypassing the result cache.
+
+    Returns a (table, row_count, checksum, checksum_sum) tuple
+    per table, ordered by table. Checksums of empty tables are None.
+    """
+    table_checksums_qry = q.get_table_checksums_query(get_backend().name)
+    table_checksums = run_sql_select_query(table_checksums_qry, use_cache=False)
+
+    rows = []
+    for table, *numbers in table_checksums[
+        ["TableName", "Row_Count", "Checksum", "Checksum_Sum"]
+    ].itertuples(index=False):
+        rows.append(
+            (table, *(None if pd.isna(number) else int(number) for number in numbers))
+        )
+    return sorted(rows)
+
+
+def get_table_checksums_hash_id(table_checksums: list) -> str:
+    """
+    Takes the output of get_table_checksums and returns it as a
+    checkpoint string, prefixed with CHECKSUM_CHECKPOINT_PREFIX.
+
+    The checksums are kept as they are rather than hashed again:
+    they are small, and readable in the checkpoint file.
+    """
+    return f"{CHECKSUM_CHECKPOINT_PREFIX}{json.dumps([list(row) for row in table_checksums])}"
+
+
+def get_live_table_checksums_hash_id() -> str:
+    """
+    Checksums the tables vw_AllSurveyData reads. Costs one
+    query scanning them on the server, but only a few numbers
+    are transferred, whatever the number of answers.
+    """
+    return get_table_checksums_hash_id(get_table_checksums())
+
+
+@metrics.timed("dsti_hashing_seconds")
 def get_dataframe_hash_id(df: pd.DataFrame) -> str:
     """
-    Takes a Pandas DataFrame and returns an 
-    md5 hash string of its string representation.
+    Takes a Pandas DataFrame and returns a hash string
+    of its contents, prefixed with DATAFRAME_HASH_PREFIX.
+
+    Each row is hashed with pandas' vectorized
+    hash_pandas_object and the row hashes are summed
+    (modulo 2**64), so the result does not depend on
+    the order of the rows or on the index. The column
+    names and row count are hashed in too.
 
     On failure, returns an 'UNKNOWN_HASH' string.
     """
     try:
+        rows_sum = get_dataframe_row_hashes_sum(df)
+        return format_dataframe_hash_id(df.columns, len(df), rows_sum)
+    except Exception as e:
+        return "UNKNOWN_HASH"
+
+
+def get_dataframe_row_hashes_sum(df: pd.DataFrame, columns=None) -> int:
+    """
+    Hashes each row of df and returns the sum of the row
+    hashes modulo 2**64. Sums of separate chunks of a result
+    set add up (modulo 2**64) to the sum of the whole.
+
+    See get_dataframe_row_hashes.
+    """
+    row_hashes = get_dataframe_row_hashes(df, columns)
+    return int(row_hashes.sum(dtype=np.uint64))
+
+
+def get_dataframe_row_hashes(df: pd.DataFrame, columns=None) -> np.ndarray:
+    """
+    Returns a uint64 array holding one hash per row of df.
+
+    Columns are hashed one at a time. Numeric and all-NULL
+    columns are hashed as float64 so a value hashes the same
+    whatever dtype its chunk happened to be read as.
+
+    columns, if given, are the column names to hash, in order.
+    Those missing from df are hashed as if all NULL, so a block
+    of a result set holding only some of its columns hashes as
+    its rows would in the whole result set.
+    """
+    row_hashes = np.zeros(len(df), dtype=np.uint64)
+
+    if columns is None:
+        column_values = (df.iloc[:, position] for position in range(df.shape[1]))
+    else:
+        column_values = (
+            (
+                df[column]
+                if column in df.columns
+                else pd.Series(np.nan, index=df.index, dtype="float64")
+            )
+            for column in columns
+        )
+
+    for values in column_values:
+        if pd.api.types.is_numeric_dtype(values) or values.isna().all():
+            values = values.astype("float64")
+
+        column_hashes = pd.util.hash_pandas_object(values, index=False).to_numpy()
+        # uint64 arithmetic wraps around, which is what we want
+        row_hashes = row_hashes * np.uint64(_ROW_HASH_MULTIPLIER) + column_hashes
+
+    return row_hashes
+
+
+def format_dataframe_hash_id(columns, row_count, rows_sum) -> str:
+    """
+    Combines the column names, row count and
+    get_dataframe_row_hashes_sum of a result set
+    into a get_dataframe_hash_id string.
+    """
+    shape = json.dumps([[str(column) for column in columns], int(row_count)])
+
+    m = hashlib.md5(shape.encode("UTF-8"))
+    m.update(int(rows_sum).to_bytes(8, "little"))
+    return f"{DATAFRAME_HASH_PREFIX}{m.hexdigest()}"
+
+
+def get_legacy_dataframe_hash_id(df: pd.DataFrame) -> str:
+    """
+    The former get_dataframe_hash_id: an md5 hash string of the
+    string representation of df, rows sorted by UserId as the
+    former ORDER BY UserId did.
+
+    Only used to migrate checkpoints written in that format.
+    """
+    try:
+        if "UserId" in df.columns:
+            df = df.sort_values("UserId", kind="stable").reset_index(drop=True)
         hashable_df = df.to_string().encode("UTF-8")
         m = hashlib.md5(hashable_df).hexdigest()
         return m
@@ -227,25 +1437,312 @@ def get_dataframe_hash_id(df: pd.DataFrame) -> str:
         return "UNKNOWN_HASH"
 
 
+def is_legacy_dataframe_hash_id(checkpoint_hash) -> bool:
+    """
+    Returns True if checkpoint_hash was written
+    by the former, to_string() based, data hash.
+    """
+    if not checkpoint_hash:
+        return False
+
+    return not checkpoint_hash.startswith(
+        (DATAFRAME_HASH_PREFIX, STRUCTURE_CHECKPOINT_PREFIX, CHECKSUM_CHECKPOINT_PREFIX)
+    )
+
+
+def migrate_legacy_checkpoint_hash(
+    checkpoint_hash, live_survey_data, checkpoint_path=None
+) -> str:
+    """
+    If live_survey_data still matches a legacy format checkpoint,
+    the checkpoint is rewritten in the current format and the new
+    hash is returned, so the format change alone does not make
+    vw_AllSurveyData obsolete.
+
+    Otherwise the legacy checkpoint_hash is returned unchanged.
+    """
+    if get_legacy_dataframe_hash_id(live_survey_data) != checkpoint_hash:
+        return checkpoint_hash
+
+    live_survey_data_hash = get_dataframe_hash_id(live_survey_data)
+    persist_checkpoint_hash(live_survey_data_hash, checkpoint_path)
+    print(
+        f"Checkpoint migrated to new hash format: {checkpoint_hash} -> {live_survey_data_hash}"
+    )
+    return live_survey_data_hash
+
+
+def get_row_hash_index(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns a DataFrame with the ROW_KEY_COLUMNS of df and
+    a RowHash column holding each row's hash as a hex string.
+    """
+    row_hash_index = df[ROW_KEY_COLUMNS].copy()
+    row_hash_index["RowHash"] = [
+        f"{row_hash:016x}" for row_hash in get_dataframe_row_hashes(df)
+    ]
+    return row_hash_index.reset_index(drop=True)
+
+
+def load_row_hash_index() -> pd.DataFrame:
+    """
+    Reads the row hash index persisted at ROW_HASH_INDEX_PATH
+    by the last delta export.
+
+    Returns None if there is none yet.
+    """
+    if not os.path.exists(ROW_HASH_INDEX_PATH):
+        return None
+
+    return pd.read_csv(ROW_HASH_INDEX_PATH, dtype={"RowHash": str})
+
+
+def persist_row_hash_index(row_hash_index: pd.DataFrame) -> None:
+    """
+    Writes the passed row hash index to ROW_HASH_INDEX_PATH,
+    replacing any pre-existing one
+    """
+    temporary_path = f"{ROW_HASH_INDEX_PATH}.tmp"
+    row_hash_index.to_csv(temporary_path, index=False)
+    os.replace(temporary_path, ROW_HASH_INDEX_PATH)
+
+
+def get_survey_data_delta(
+    live_survey_data: pd.DataFrame, previous_row_hash_index: pd.DataFrame = None
+) -> (pd.DataFrame, pd.DataFrame):
+    """
+    Compares live_survey_data to the row hash index of the
+    previous run, matching rows on ROW_KEY_COLUMNS.
+
+    Returns 2 DataFrames:
+        - the delta: inserted and changed rows of live_survey_data,
+          plus the keys of deleted rows, with a CHANGE_TYPE_COLUMN
+          saying which is which
+        - the row hash index of live_survey_data, to be persisted
+          once the delta has been safely written
+
+    With no previous index, every row is an insert.
+    """
+    live_survey_data = live_survey_data.reset_index(drop=True)
+    live_row_hash_index = get_row_hash_index(live_survey_data)
+
+    if previous_row_hash_index is None:
+        previous_row_hash_index = live_row_hash_index.iloc[0:0]
+
+    # A left merge keeps the rows aligned with live_survey_data
+    previous_row_hashes = live_row_hash_index[ROW_KEY_COLUMNS].merge(
+        previous_row_hash_index, on=ROW_KEY_COLUMNS, how="left"
+    )["RowHash"]
+
+    inserted = previous_row_hashes.isna().to_numpy()
+    updated = ~inserted & (
+        previous_row_hashes.to_numpy() != live_row_hash_index["RowHash"].to_numpy()
+    )
+
+    upserted = live_survey_data[inserted | updated].copy()
+    upserted[CHANGE_TYPE_COLUMN] = np.where(
+        inserted[inserted | updated], "insert", "update"
+    )
+
+    still_live = previous_row_hash_index[ROW_KEY_COLUMNS].merge(
+        live_row_hash_index[ROW_KEY_COLUMNS],
+        on=ROW_KEY_COLUMNS,
+        how="left",
+        indicator=True,
+    )["_merge"]
+    deleted_rows = previous_row_hash_index.loc[
+        (still_live == "left_only").to_numpy(), ROW_KEY_COLUMNS
+    ].copy()
+    deleted_rows[CHANGE_TYPE_COLUMN] = "delete"
+
+    delta = pd.concat([upserted, deleted_rows], ignore_index=True, sort=False)
+
+    return delta, live_row_hash_index
+
+
+def get_all_survey_data_delta(
+    update_view=True, query_generator=None, checkpoint_mode=None, persist_index=True
+) -> pd.DataFrame:
+    """
+    Like get_all_survey_data, but only returns the rows inserted,
+    changed or deleted since the last delta run (see
+    get_survey_data_delta).
+
+    The row hash index is updated unless persist_index=False,
+    so the next call only returns later changes.
+
+    Returns None, leaving the row hash index untouched,
+    if AllSurveyData could not be fetched.
+    """
+    live_survey_data = get_all_survey_data(
+        update_view=update_view,
+        query_generator=query_generator,
+        checkpoint_mode=checkpoint_mode,
+    )
+    if live_survey_data is None:
+        return None
+
+    delta, live_row_hash_index = get_survey_data_delta(
+        live_survey_data, load_row_hash_index()
+    )
+
+    if persist_index:
+        persist_row_hash_index(live_row_hash_index)
+
+    return delta
+
+
+def export_all_survey_data_delta(
+    filepath=None,
+    merge_into=None,
+    update_view=True,
+    query_generator=None,
+    checkpoint_mode=None,
+    file_format=None,
+    compression=None,
+) -> dict:
+    """
+    Writes only the AllSurveyData rows inserted, changed or
+    deleted since the last delta run, either:
+
+        - to a delta file at filepath, keeping CHANGE_TYPE_COLUMN, or
+        - merged in place into the previous export at merge_into:
+          deleted rows are removed, changed rows replaced and
+          inserted rows appended
+
+    The row hash index is only updated once the file
+    has been written.
+
+    Returns a summary dict with the number of rows per change type,
+    or None, writing nothing, if AllSurveyData could not be fetched.
+    """
+    if not filepath and not merge_into:
+        raise ValueError("Either a delta filepath or a file to merge into is required")
+
+    live_survey_data = get_all_survey_data(
+        update_view=update_view,
+        query_generator=query_generator,
+        checkpoint_mode=checkpoint_mode,
+    )
+    if live_survey_data is None:
+        return None
+
+    delta, live_row_hash_index = get_survey_data_delta(
+        live_survey_data, load_row_hash_index()
+    )
+
+    if merge_into:
+        merge_survey_data_delta(merge_into, delta, file_format, compression)
+    else:
+        futils.save_dataframe(delta, filepath, file_format, compression)
+
+    persist_row_hash_index(live_row_hash_index)
+
+    export_summary = {"filepath": merge_into or filepath}
+    for change_type in CHANGE_TYPES:
+        export_summary[change_type] = int(
+            (delta[CHANGE_TYPE_COLUMN] == change_type).sum()
+        )
+    return export_summary
+
+
+def merge_survey_data_delta(
+    filepath, delta: pd.DataFrame, file_format=None, compression=None
+) -> None:
+    """
+    Applies a delta from get_survey_data_delta to the
+    AllSurveyData export at filepath, rewriting it in place.
+    """
+    previous_export = futils.read_export(filepath, file_format)
+
+    delta_rows = pd.MultiIndex.from_frame(delta[ROW_KEY_COLUMNS])
+    kept = previous_export[
+        ~pd.MultiIndex.from_frame(previous_export[ROW_KEY_COLUMNS]).isin(delta_rows)
+    ]
+    upserted = delta[delta[CHANGE_TYPE_COLUMN] != "delete"].drop(
+        columns=CHANGE_TYPE_COLUMN
+    )
+
+    merged = pd.concat([kept, upserted], ignore_index=True, sort=False)
+
+    # Write next to the original first so a failure leaves it intact
+    export_format = futils.get_export_format(filepath, file_format)
+    temporary_path = f"{filepath}.tmp"
+    futils.save_dataframe(merged, temporary_path, export_format, compression)
+    os.replace(temporary_path, filepath)
+
+
 @provide_db_connection
 def drop_vw_AllSurveyData(connection=None) -> None:
     """
     @provide_db_connection provides db connection object
     and closes it after the function completes
+
+    Also drops the column partition views of a previous
+    create_vw_AllSurveyData, if any.
     """
-    qry = "DROP VIEW IF EXISTS [dbo].[vw_AllSurveyData]"
-    cur = connection.execute(qry)
-    cur.commit()
+    cur = connection.execute(render_sql(q.get_partition_views_qry(get_backend().name)))
+    partition_view_names = [row[0] for row in cur.fetchall()]
     cur.close()
 
+    view_names = ["vw_AllSurveyData"] + sorted(partition_view_names)
+    with metrics.timer("dsti_view_ddl_seconds", statement="drop"):
+        for view_name in view_names:
+            cur = connection.execute(
+                render_sql(f"DROP VIEW IF EXISTS [dbo].[{view_name}]")
+            )
+            cur.close()
+        connection.commit()
+
 
 @provide_db_connection
-def create_vw_AllSurveyData(connection=None) -> None:
+def create_vw_AllSurveyData(
+    query_generator=None, questions_in_survey_matrix=None, connection=None
+) -> None:
     """
     @provide_db_connection provides db connection object
     and closes it after the function completes
+
+    The view query comes from the memo kept by
+    get_dynamic_query_to_update_vw_AllSurveyData, so it
+    is not rebuilt if it was generated for the same survey
+    structure earlier in the refresh.
+
+    If AllSurveyData has more columns than a view can hold
+    (see queries_and_dynamic_queries.get_question_id_partitions),
+    the columns are split across vw_AllSurveyData_Part1,
+    vw_AllSurveyData_Part2, ... instead, each with UserId and
+    SurveyId, and vw_AllSurveyData is not created.
     """
-    qry = get_dynamic_query_to_update_vw_AllSurveyData()
-    cur = connection.execute(qry)
-    cur.commit()
-    cur.close()
+    if questions_in_survey_matrix is None:
+        questions_in_survey_matrix = q.get_live_questions_in_survey_matrix()
+
+    if len(q.get_question_id_partitions(questions_in_survey_matrix)) > 1:
+        view_queries = q.get_column_partitioned_queries_to_update_vw_AllSurveyData(
+            query_generator, questions_in_survey_matrix
+        )
+        views = {
+            get_partition_view_name(partition): view_qry
+            for partition, view_qry in enumerate(view_queries, start=1)
+        }
+    else:
+        views = {
+            "vw_AllSurveyData": q.get_dynamic_query_to_update_vw_AllSurveyData(
+                query_generator, questions_in_survey_matrix
+            )
+        }
+
+    with metrics.timer("dsti_view_ddl_seconds", statement="create"):
+        for view_name, view_qry in views.items():
+            qry = q.get_strQueryTemplateCreateView(f"[dbo].[{view_name}]", view_qry)
+            cur = connection.execute(render_sql(qry))
+            cur.close()
+        connection.commit()
+
+
+def get_partition_view_name(partition) -> str:
+    """
+    Name of the view holding the partition-th
+    (from 1) column partition of AllSurveyData
+    """
+    return f"vw_AllSurveyData_Part{partition}"
@@ -0,0 +1,276 @@
+# Standard library imports
+import abc
+import itertools
+import pathlib
+import re
+import sqlite3
+
+# Local Imports
+
+# External library imports
+
+
+# EXCEPTIONS
+class UnknownDBBackend(Exception):
+    def __init__(self, *args):
+        if args:
+            self.message = args[0]
+        else:
+            self.message = None
+
+    def __str__(self):
+        if self.message:
+            return "UnknownDBBackend, {0} ".format(self.message)
+        else:
+            return "UnknownDBBackend has been raised"
+
+
+# SHARED VARIABLES
+
+# Tables of the survey database, as created on SQL Server
+SURVEY_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS Survey (
+    SurveyId INTEGER PRIMARY KEY,
+    SurveyDescription TEXT
+);
+CREATE TABLE IF NOT EXISTS Question (
+    QuestionId INTEGER PRIMARY KEY,
+    Question_Text TEXT
+);
+CREATE TABLE IF NOT EXISTS SurveyStructure (
+    SurveyId INTEGER NOT NULL,
+    QuestionId INTEGER NOT NULL,
+    OrdinalValue INTEGER,
+    PRIMARY KEY (SurveyId, QuestionId)
+);
+CREATE TABLE IF NOT EXISTS [User] (
+    UserId INTEGER PRIMARY KEY,
+    User_Name TEXT,
+    User_Email TEXT
+);
+CREATE TABLE IF NOT EXISTS Answer (
+    QuestionId INTEGER NOT NULL,
+    SurveyId INTEGER NOT NULL,
+    UserId INTEGER NOT NULL,
+    Answer_Value INTEGER,
+    PRIMARY KEY (QuestionId, SurveyId, UserId)
+);
+CREATE INDEX IF NOT EXISTS IX_Answer_UserId_SurveyId ON Answer (UserId, SurveyId);
+"""
+
+# Column order of each table, used when inserting rows
+SURVEY_SCHEMA_COLUMNS = {
+    "Survey": ("SurveyId", "SurveyDescription"),
+    "Question": ("QuestionId", "Question_Text"),
+    "SurveyStructure": ("SurveyId", "QuestionId", "OrdinalValue"),
+    "User": ("UserId", "User_Name", "User_Email"),
+    "Answer": ("QuestionId", "SurveyId", "UserId", "Answer_Value"),
+}
+
+# Small dataset seeded into empty SQLite databases. Question 4
+# is in no survey, user 5 answered nothing and user 2 left a
+# question of survey 1 unanswered.
+SAMPLE_SURVEY_DATA = {
+    "Survey": [(1, "Survey 1"), (2, "Survey 2"), (3, "Survey 3")],
+    "Question": [
+        (1, "Question 1"),
+        (2, "Question 2"),
+        (3, "Question 3"),
+        (4, "Question 4"),
+    ],
+    "SurveyStructure": [(1, 1, 1), (1, 2, 2), (2, 2, 1), (2, 3, 2), (3, 1, 1)],
+    "User": [
+        (1, "User 1", "user1@example.com"),
+        (2, "User 2", "user2@example.com"),
+        (3, "User 3", "user3@example.com"),
+        (4, "User 4", "user4@example.com"),
+        (5, "User 5", "user5@example.com"),
+    ],
+    "Answer": [
+        (1, 1, 1, 5),
+        (2, 1, 1, 3),
+        (1, 1, 2, 4),
+        (2, 2, 2, 1),
+        (3, 2, 2, 2),
+        (2, 2, 3, 7),
+        (1, 3, 4, 8),
+    ],
+}
+
+DEFAULT_BACKEND = "mssql"
+
+# T-SQL schema qualification and [bracketed] identifiers
+_DBO_SCHEMA_PATTERN = re.compile(r"\[dbo\]\.", re.IGNORECASE)
+_BRACKETED_IDENTIFIER_PATTERN = re.compile(r"\[([^\]]+)\]")
+
+# Names distinct in-memory SQLite databases
+_memory_database_ids = itertools.count(1)
+
+
+# CLASSES
+class DBBackend(abc.ABC):
+    """
+    Where connections come from and which SQL dialect they speak.
+
+    connect() opens a new DB-API connection, and render_sql()
+    translates the T-SQL written throughout the package into
+    the backend's dialect.
+
+    cache_results says whether the result cache may serve
+    this backend's queries. Cache entries are keyed on the
+    connection string, so it must name the same data in
+    every process.
+    """
+
+    name = None
+    cache_results = True
+
+    def __init__(self, connection_string=None):
+        self.connection_string = connection_string
+
+    @abc.abstractmethod
+    def connect(self, connection_string=None):
+        """
+        Opens a new DB-API connection to connection_string,
+        or to the backend's own if not given
+        """
+
+    def render_sql(self, sql_query: str) -> str:
+        return sql_query
+
+    def close(self) -> None:
+        pass
+
+
+class MSSQLBackend(DBBackend):
+    """
+    The live SQL Server, through pyodbc
+    """
+
+    name = "mssql"
+
+    def connect(self, connection_string=None):
+        # Imported here so SQLite-only runs do not need an ODBC driver
+        import pyodbc
+
+        return pyodbc.connect(connection_string or self.connection_string)
+
+
+class SQLiteBackend(DBBackend):
+    """
+    Embedded SQLite stand-in for the survey database, so the
+    package, its tests and benchmarks can run without a server.
+
+    With no database path the data lives in a shared in-memory
+    database, kept alive for as long as the backend is. Unless
+    seed=False, the survey schema is created and, if empty,
+    filled with survey_data (default SAMPLE_SURVEY_DATA).
+    """
+
+    name = "sqlite"
+    cache_results = False
+
+    def __init__(self, database=None, seed=True, survey_data=None):
+        if database:
+            connection_string = pathlib.Path(database).absolute().as_uri()
+        else:
+            connection_string = (
+                f"file:dsti_db_interface_{next(_memory_database_ids)}"
+                "?mode=memory&cache=shared"
+            )
+
+        super().__init__(connection_string)
+        self.database = database
+
+        # An in-memory database is dropped with its last connection
+        self._keep_alive_connection = self.connect()
+
+        if seed:
+            seed_survey_schema(self._keep_alive_connection, survey_data)
+
+    def connect(self, connection_string=None):
+        # Pooled connections are handed between threads
+        return sqlite3.connect(
+            connection_string or self.connection_string,
+            uri=True,
+            check_same_thread=False,
+        )
+
+    def render_sql(self, sql_query: str) -> str:
+        return render_sql_for_sqlite(sql_query)
+
+    def close(self) -> None:
+        if self._keep_alive_connection is not None:
+            self._keep_alive_connection.close()
+            self._keep_alive_connection = None
+
+
+# FUNCTIONS
+def render_sql_for_sqlite(sql_query: str) -> str:
+    """
+    Returns the T-SQL sql_query in SQLite's dialect: the [dbo]
+    schema is dropped and [bracketed] identifiers become "quoted"
+    ones. Single-quoted string literals are left untouched.
+    """
+    if not sql_query:
+        return sql_query
+
+    # Odd items of the split are the quoted literals
+    parts = re.split(r"('(?:[^']|'')*')", sql_query)
+
+    rendered_parts = []
+    for position, part in enumerate(parts):
+        if not position % 2:
+            part = _DBO_SCHEMA_PATTERN.sub("", part)
+            part = _BRACKETED_IDENTIFIER_PATTERN.sub(r'"\1"', part)
+        rendered_parts.append(part)
+
+    return "".join(rendered_parts)
+
+
+def get_backend_class(name: str):
+    """
+    Returns the DBBackend subclass called name
+    """
+    backends = {backend.name: backend for backend in (MSSQLBackend, SQLiteBackend)}
+
+    if name not in backends:
+        raise UnknownDBBackend(f"{name} is not one of {sorted(backends)}")
+
+    return backends[name]
+
+
+def create_survey_schema(connection) -> None:
+    connection.executescript(SURVEY_SCHEMA_SQL)
+    connection.commit()
+
+
+def insert_survey_data(connection, survey_data: dict) -> None:
+    """
+    Inserts rows into the survey tables. survey_data maps
+    table names to lists of row tuples, in the column order
+    of SURVEY_SCHEMA_COLUMNS.
+    """
+    for table, rows in survey_data.items():
+        columns = SURVEY_SCHEMA_COLUMNS[table]
+        placeholders = ", ".join("?" for _ in columns)
+        connection.executemany(
+            f"INSERT INTO [{table}] ({', '.join(columns)}) VALUES ({placeholders})",
+            rows,
+        )
+    connection.commit()
+
+
+def seed_survey_schema(connection, survey_data=None) -> None:
+    """
+    Creates the survey tables and, if the Survey table is
+    empty, inserts survey_data (default SAMPLE_SURVEY_DATA).
+    """
+    create_survey_schema(connection)
+
+    (survey_count,) = connection.execute("SELECT COUNT(*) FROM Survey").fetchone()
+    if survey_count == 0:
+        insert_survey_data(connection, survey_data or SAMPLE_SURVEY_DATA)
+        # Table statistics for the query planner
+        connection.execute("ANALYZE")
+        connection.commit()
@@ -1,12 +1,17 @@
 # Standard library imports
+import collections
 import configparser
+import contextlib
 import functools
 import os
+import threading
+import time
 
 # Local Imports
+from . import db_backends
+from . import metrics
 
 # External library imports
-import pyodbc
 
 # EXCEPTIONS
 class DBConnectionFailed(Exception):
@@ -25,38 +30,318 @@ class DBConnectionFailed(Exception):
                     and correct, and that the databse is running."""
 
 
+# SHARED VARIABLES
+
+CONFIG_FILE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), "config.ini"
+)
+
+# Used when config.ini has no [CONNECTION_POOL] section
+DEFAULT_POOL_SIZE = 5
+DEFAULT_IDLE_TIMEOUT_SECONDS = 300
+DEFAULT_LIVENESS_CHECK = True
+
+# Prepared cursors kept open per connection by PreparedStatementCache
+DEFAULT_MAX_PREPARED_STATEMENTS = 32
+
+# Overrides the [DB_CONNECTION] backend option of config.ini
+BACKEND_ENVIRONMENT_VARIABLE = "DSTI_DB_BACKEND"
+
+# Parsed config.ini, reused until the file's mtime changes
+_config_cache = {"mtime": None, "config": None}
+_config_cache_lock = threading.Lock()
+
+# Backend built from config.ini by get_backend(), and the
+# settings it was built from. _backend_override is set by
+# configure_backend() and takes precedence.
+_backend = {"settings": None, "backend": None}
+_backend_override = None
+_backend_lock = threading.Lock()
+
+# Connection used by every @provide_db_connection call of a
+# thread while it is inside pinned_connection()
+_pinned = threading.local()
+
+# Single process wide pool, created lazily by get_connection_pool()
+_connection_pool = None
+_connection_pool_lock = threading.Lock()
+
+
+# CLASSES
+class PreparedStatementCache:
+    """
+    Keeps one open cursor per connection and SQL text, so a
+    parameterized statement executed again on the same connection
+    reuses its prepared handle (and the server's cached plan)
+    instead of being prepared again.
+
+    Up to max_statements cursors are kept per connection, the
+    least recently used one being closed beyond that. A connection
+    is only used by one thread at a time, its cursors likewise.
+    """
+
+    def __init__(self, max_statements=DEFAULT_MAX_PREPARED_STATEMENTS):
+        self.max_statements = max_statements
+
+        # connection -> OrderedDict of SQL text -> cursor
+        self._cursors = {}
+        self._lock = threading.Lock()
+
+    def execute(self, connection, sql_query, params=()):
+        """
+        Executes sql_query with params bound on the cursor prepared
+        for it on connection, creating that cursor if needed.
+        Returns the cursor, ready to be fetched from.
+        """
+        evicted_cursors = []
+
+        with self._lock:
+            cursors = self._cursors.setdefault(connection, collections.OrderedDict())
+            cursor = cursors.pop(sql_query, None)
+            is_new_statement = cursor is None
+            if is_new_statement:
+                cursor = connection.cursor()
+                while len(cursors) >= self.max_statements:
+                    evicted_cursors.append(cursors.popitem(last=False)[1])
+            # Most recently used last
+            cursors[sql_query] = cursor
+
+        for evicted_cursor in evicted_cursors:
+            _close_quietly(evicted_cursor)
+
+        if is_new_statement:
+            metrics.increment("dsti_statement_prepares_total")
+        metrics.increment("dsti_statement_executions_total")
+
+        cursor.execute(sql_query, params)
+        return cursor
+
+    def forget(self, connection) -> None:
+        """
+        Closes the cursors prepared on connection, e.g.
+        because the connection itself is being closed.
+        """
+        with self._lock:
+            cursors = self._cursors.pop(connection, {})
+
+        for cursor in cursors.values():
+            _close_quietly(cursor)
+
+    def statement_count(self, connection=None) -> int:
+        with self._lock:
+            if connection is not None:
+                return len(self._cursors.get(connection, ()))
+            return sum(len(cursors) for cursors in self._cursors.values())
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of reusable database connections.
+
+    Connections are checked out with acquire() and handed
+    back with release(). Up to pool_size idle connections are
+    kept open between calls. If more connections are needed at
+    once (e.g. nested decorated calls) extra ones are opened and
+    closed again on release rather than blocking the caller.
+
+    Idle connections older than idle_timeout seconds are evicted,
+    and when liveness_check is on each connection is probed
+    with a trivial SELECT before being handed out.
+    """
+
+    LIVENESS_QUERY = "SELECT 1"
+
+    def __init__(
+        self,
+        connection_string=None,
+        pool_size=DEFAULT_POOL_SIZE,
+        idle_timeout=DEFAULT_IDLE_TIMEOUT_SECONDS,
+        liveness_check=DEFAULT_LIVENESS_CHECK,
+        connect=None,
+    ):
+        self.connection_string = connection_string
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.liveness_check = liveness_check
+        self._connect = connect or db_backends.MSSQLBackend().connect
+
+        # List of (connection, time_returned_to_pool) tuples
+        self._idle = []
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Returns a live connection, reusing an idle one
+        when possible and opening a new one otherwise.
+        """
+        while True:
+            with self._lock:
+                self._evict_expired_connections()
+                if not self._idle:
+                    break
+                # Most recently used connection is the likeliest to be alive
+                connection, _ = self._idle.pop()
+
+            if self.is_alive(connection):
+                return connection
+
+            self._discard(connection)
+
+        return self._open_connection()
+
+    def release(self, connection) -> None:
+        """
+        Hands a connection back to the pool. Any open
+        transaction is rolled back so the next user gets
+        a clean connection.
+        """
+        try:
+            connection.rollback()
+        except Exception as e:
+            # Broken connections are not worth keeping
+            self._discard(connection)
+            return
+
+        with self._lock:
+            if not self._closed and len(self._idle) < self.pool_size:
+                self._idle.append((connection, time.monotonic()))
+                return
+
+        self._discard(connection)
+
+    def is_alive(self, connection) -> bool:
+        """
+        Returns False if the connection can no longer be used
+        """
+        if not self.liveness_check:
+            return True
+        try:
+            cur = connection.execute(ConnectionPool.LIVENESS_QUERY)
+            cur.fetchall()
+            cur.close()
+            return True
+        except Exception as e:
+            return False
+
+    def close_all(self) -> None:
+        """
+        Closes every idle connection held by the pool.
+        Connections currently checked out are closed on release.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._closed = True
+
+        for connection, _ in idle:
+            self._discard(connection)
+
+    def idle_count(self) -> int:
+        with self._lock:
+            return len(self._idle)
+
+    def _evict_expired_connections(self) -> None:
+        """
+        Closes idle connections unused for longer than idle_timeout.
+        Must be called with self._lock held.
+        """
+        if self.idle_timeout is None:
+            return
+
+        now = time.monotonic()
+        still_fresh = []
+        for connection, returned_at in self._idle:
+            if now - returned_at > self.idle_timeout:
+                self._discard(connection)
+            else:
+                still_fresh.append((connection, returned_at))
+        self._idle = still_fresh
+
+    def _open_connection(self):
+        metrics.increment("dsti_connections_opened_total")
+        try:
+            return self._connect(self.connection_string)
+        except Exception as e:
+            raise DBConnectionFailed
+
+    @staticmethod
+    def _discard(connection) -> None:
+        """
+        Closes connection along with its prepared statements
+        """
+        get_prepared_statement_cache().forget(connection)
+        _close_quietly(connection)
+
+
 # DECORATORS
 def provide_db_connection(func):
     """
-    Decorator which creates aq db connection object
-    and passes it to the decorated function which
-    uses it to connect with the db.
+    Decorator which checks out a db connection object
+    from the shared connection pool and passes it to
+    the decorated function which uses it to connect with the db.
+
+    After the decorated function is complete, the connection is
+    returned to the pool, even if the function raised.
 
-    After the decorated function is complete, the connection is closed.
+    Inside pinned_connection(), the pinned connection
+    is passed instead.
     """
 
     @functools.wraps(func)
     def wrapper_provide_db_connection(*args, **kwargs):
-        connection = get_db_connection()
-        function_return = func(*args, **kwargs, connection=connection)
-        connection.close()
+        pinned_connection = getattr(_pinned, "connection", None)
+        if pinned_connection is not None:
+            return func(*args, **kwargs, connection=pinned_connection)
+
+        pool = get_connection_pool()
+        with metrics.timer("dsti_connection_acquire_seconds"):
+            connection = pool.acquire()
+        try:
+            function_return = func(*args, **kwargs, connection=connection)
+        finally:
+            pool.release(connection)
         return function_return
 
     return wrapper_provide_db_connection
 
 
 # FUNCTIONS
+def _close_quietly(closeable) -> None:
+    try:
+        closeable.close()
+    except Exception as e:
+        pass
+
+
+def get_config() -> configparser.ConfigParser:
+    """
+    Returns the parsed config.ini from the project root.
+
+    The parsed file is cached and only re-read when
+    the modification time of config.ini changes.
+    """
+    try:
+        mtime = os.path.getmtime(CONFIG_FILE_PATH)
+    except OSError:
+        mtime = None
+
+    with _config_cache_lock:
+        if _config_cache["config"] is None or _config_cache["mtime"] != mtime:
+            config = configparser.ConfigParser()
+            config.read(CONFIG_FILE_PATH)
+            _config_cache["config"] = config
+            _config_cache["mtime"] = mtime
+
+        return _config_cache["config"]
+
+
 def get_db_connection_string() -> str:
     """
     Builds a database connection string using the configuration
-    parameters in config.txt.
+    parameters in config.ini.
     """
     try:
-        config_file_pth = os.path.join(
-            os.path.dirname(os.path.dirname(__file__)), "config.ini"
-        )
-        config = configparser.ConfigParser()
-        config.read(config_file_pth)
+        config = get_config()
 
         driver = config["DB_CONNECTION"]["obdc_driver"]
         server = config["DB_CONNECTION"]["db_server"]
@@ -72,11 +357,213 @@ def get_db_connection_string() -> str:
         )
 
 
+def get_backend_settings() -> dict:
+    """
+    Reads the backend options of the [DB_CONNECTION] section
+    of config.ini. The DSTI_DB_BACKEND environment variable,
+    if set, overrides the backend option.
+    """
+    config = get_config()
+
+    backend = os.environ.get(BACKEND_ENVIRONMENT_VARIABLE) or config.get(
+        "DB_CONNECTION", "backend", fallback=db_backends.DEFAULT_BACKEND
+    )
+
+    return {
+        "backend": backend.strip().lower() or db_backends.DEFAULT_BACKEND,
+        "sqlite_database": config.get(
+            "DB_CONNECTION", "sqlite_database", fallback=""
+        ).strip(),
+        "sqlite_seed": config.getboolean("DB_CONNECTION", "sqlite_seed", fallback=True),
+    }
+
+
+def get_backend() -> db_backends.DBBackend:
+    """
+    Returns the DBBackend connections are opened with: the one
+    passed to configure_backend() if any, otherwise the one
+    chosen in config.ini, rebuilt if its settings have changed.
+    """
+    if _backend_override is not None:
+        return _backend_override
+
+    settings = get_backend_settings()
+    if settings["backend"] == db_backends.MSSQLBackend.name:
+        settings["connection_string"] = get_db_connection_string()
+
+    with _backend_lock:
+        if _backend["settings"] != settings:
+            if _backend["backend"] is not None:
+                _backend["backend"].close()
+
+            backend_class = db_backends.get_backend_class(settings["backend"])
+            if backend_class is db_backends.SQLiteBackend:
+                backend = backend_class(
+                    database=settings["sqlite_database"] or None,
+                    seed=settings["sqlite_seed"],
+                )
+            else:
+                backend = backend_class(settings["connection_string"])
+
+            _backend["settings"] = settings
+            _backend["backend"] = backend
+
+        return _backend["backend"]
+
+
+def configure_backend(backend=None) -> None:
+    """
+    Makes every connection come from backend, whatever
+    config.ini says, e.g. a SQLiteBackend for offline runs.
+    configure_backend(None) goes back to config.ini.
+    """
+    global _backend_override
+
+    _backend_override = backend
+    close_connection_pool()
+
+
+def render_sql(sql_query: str) -> str:
+    """
+    Returns sql_query in the SQL dialect of the current backend
+    """
+    return get_backend().render_sql(sql_query)
+
+
+def get_connection_pool_settings() -> dict:
+    """
+    Reads the optional [CONNECTION_POOL] section of config.ini,
+    falling back to the module defaults for anything missing.
+    """
+    config = get_config()
+
+    if not config.has_section("CONNECTION_POOL"):
+        return {
+            "pool_size": DEFAULT_POOL_SIZE,
+            "idle_timeout": DEFAULT_IDLE_TIMEOUT_SECONDS,
+            "liveness_check": DEFAULT_LIVENESS_CHECK,
+        }
+
+    section = config["CONNECTION_POOL"]
+    return {
+        "pool_size": section.getint("pool_size", fallback=DEFAULT_POOL_SIZE),
+        "idle_timeout": section.getfloat(
+            "idle_timeout_seconds", fallback=DEFAULT_IDLE_TIMEOUT_SECONDS
+        ),
+        "liveness_check": section.getboolean(
+            "liveness_check", fallback=DEFAULT_LIVENESS_CHECK
+        ),
+    }
+
+
+def get_connection_pool() -> ConnectionPool:
+    """
+    Returns the shared ConnectionPool, drawing connections
+    from the current backend (see get_backend).
+
+    The pool is rebuilt if the backend or pool settings in
+    config.ini have changed since it was created, so edits
+    to config.ini are picked up without a restart.
+    """
+    global _connection_pool
+
+    backend = get_backend()
+    connection_string = backend.connection_string
+    settings = get_connection_pool_settings()
+
+    with _connection_pool_lock:
+        pool = _connection_pool
+        pool_is_current = (
+            pool is not None
+            and pool.connection_string == connection_string
+            and pool.pool_size == settings["pool_size"]
+            and pool.idle_timeout == settings["idle_timeout"]
+            and pool.liveness_check == settings["liveness_check"]
+        )
+
+        if not pool_is_current:
+            if pool is not None:
+                pool.close_all()
+            _connection_pool = ConnectionPool(
+                connection_string, connect=backend.connect, **settings
+            )
+
+        return _connection_pool
+
+
+def close_connection_pool() -> None:
+    """
+    Closes all idle pooled connections. The pool is
+    recreated on the next request for a connection.
+    """
+    global _connection_pool
+
+    with _connection_pool_lock:
+        if _connection_pool is not None:
+            _connection_pool.close_all()
+        _connection_pool = None
+
+
+@contextlib.contextmanager
+def pinned_connection(connection=None):
+    """
+    Until the block exits, passes connection to every
+    @provide_db_connection call made by the current thread.
+
+    If connection is None, a pooled connection is checked out
+    for the block and returned to the pool on exit. Otherwise
+    the caller keeps ownership of connection, e.g. a long
+    running watcher holding a warm connection between polls.
+
+    Yields the pinned connection.
+    """
+    if getattr(_pinned, "connection", None) is not None:
+        # Already pinned by an enclosing block
+        yield _pinned.connection
+        return
+
+    pool = None
+    if connection is None:
+        pool = get_connection_pool()
+        with metrics.timer("dsti_connection_acquire_seconds"):
+            connection = pool.acquire()
+
+    _pinned.connection = connection
+    try:
+        yield connection
+    finally:
+        _pinned.connection = None
+        if pool is not None:
+            pool.release(connection)
+
+
+def get_prepared_statement_cache() -> PreparedStatementCache:
+    return _prepared_statements
+
+
+def execute_prepared(connection, sql_query, params=()):
+    """
+    Executes the parameterized sql_query (with ? placeholders)
+    on connection, binding params, and returns the cursor to
+    fetch the results from.
+
+    The cursor is kept and reused the next time the same SQL
+    text runs on the same connection, so the statement is only
+    prepared once per connection and the server can reuse its
+    plan for any parameter values.
+    """
+    return get_prepared_statement_cache().execute(connection, sql_query, params)
+
+
 def get_db_connection():
-    # Get db connection object
-    sql_conn_str = get_db_connection_string()
+    # Get a new, unpooled db connection object
+    backend = get_backend()
     try:
-        sql_conn = pyodbc.connect(sql_conn_str)
+        sql_conn = backend.connect()
     except Exception as e:
         raise DBConnectionFailed
     return sql_conn
+
+
+# Single process wide cache of prepared cursors, see execute_prepared()
+_prepared_statements = PreparedStatementCache()
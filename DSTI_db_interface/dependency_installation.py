@@ -1,22 +1,155 @@
 # Standard library imports
+import importlib
 import os
+import re
 import subprocess
 import sys
+import threading
+import types
+
+
+# SHARED VARIABLES
+
+# By convention, requirements.txt is at project root
+REQUIREMENTS_TXT_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), "requirements.txt"
+)
+
+# Name of a requirement line, before any extras, version or marker
+_REQUIREMENT_NAME_PATTERN = re.compile(r"^\s*([A-Za-z0-9][A-Za-z0-9._-]*)")
+
+# Result of the first check_dependencies() call of the process
+_missing_dependencies = None
+
+
+# CLASSES
+class LazyModule(types.ModuleType):
+    """
+    Stand-in for a module which is only imported the first
+    time one of its attributes is used, so that heavy libraries
+    (pandas, numpy) do not slow down importing this package.
+
+    Once imported, the module's attributes are copied onto the
+    stand-in, so later lookups cost no more than on the module.
+    """
+
+    def __init__(self, name):
+        super().__init__(name)
+        self._lazy_module_lock = threading.Lock()
+
+    def __getattr__(self, attribute):
+        # Only called for attributes not copied over yet
+        with self._lazy_module_lock:
+            if attribute.startswith("__"):
+                # e.g. probes by copy or inspect
+                module = sys.modules.get(self.__name__)
+                if module is None:
+                    raise AttributeError(attribute)
+            else:
+                module = importlib.import_module(self.__name__)
+
+            self.__dict__.update(
+                (name, value)
+                for name, value in vars(module).items()
+                if name not in self.__dict__
+            )
+
+        return getattr(module, attribute)
+
+
+# FUNCTIONS
+def lazy_import(name) -> types.ModuleType:
+    """
+    Returns the module name if it has already been imported,
+    otherwise a LazyModule importing it on first use.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return LazyModule(name)
+
+
+def get_requirements(requirements_txt_pth=REQUIREMENTS_TXT_PATH) -> list:
+    """
+    Returns the names of the packages listed in requirements.txt
+    """
+    with open(requirements_txt_pth, "rb") as file:
+        content = file.read()
+
+    # requirements.txt may have been saved as UTF-16 on Windows
+    if content.startswith((b"\xff\xfe", b"\xfe\xff")):
+        text = content.decode("utf-16")
+    else:
+        text = content.decode("utf-8-sig")
+
+    requirements = []
+    for line in text.splitlines():
+        line = line.split("#", 1)[0]
+        match = _REQUIREMENT_NAME_PATTERN.match(line)
+        if match:
+            requirements.append(match.group(1))
+    return requirements
+
+
+def get_missing_dependencies(requirements=None) -> list:
+    """
+    Returns the requirements which are not installed, from the
+    installed distributions' metadata. Nothing is imported.
+    """
+    # Only needed here, and slower to import than the check itself
+    import importlib.metadata
+
+    if requirements is None:
+        requirements = get_requirements()
+
+    missing = []
+    for requirement in requirements:
+        try:
+            importlib.metadata.version(requirement)
+        except importlib.metadata.PackageNotFoundError:
+            missing.append(requirement)
+    return missing
+
+
+def check_dependencies() -> list:
+    """
+    Warns about any requirement missing from the current
+    python environment, without installing anything.
+    Cheap enough to run on every import, and only
+    checks and warns once per process.
+
+    Returns the missing requirements.
+    """
+    global _missing_dependencies
+
+    if _missing_dependencies is not None:
+        return _missing_dependencies
+
+    try:
+        missing = get_missing_dependencies()
+    except Exception as e:
+        # Never prevent the package from being imported
+        missing = []
+
+    _missing_dependencies = missing
+    if missing:
+        print(
+            f"Missing dependencies: {', '.join(missing)}. Install them with:\n"
+            f"    {sys.executable} -m DSTI_db_interface.dependency_installation"
+        )
+    return missing
 
 
 def install_dependencies() -> None:
     """
     Use the local environment Python executables pip
     to install all dependencies in the requirement.txt file.
+
+    Only run on request, see main().
     """
     try:
-        requirements_txt_pth = os.path.join(
-            # By convention, requirements.txt is at project root
-            os.path.dirname(os.path.dirname(__file__)),
-            "requirements.txt",
-        )
         subprocess.check_call(
-            [sys.executable, "-m", "pip", "install", "-r", requirements_txt_pth]
+            [sys.executable, "-m", "pip", "install", "-r", REQUIREMENTS_TXT_PATH]
         )
         print("Dependencies ok!")
 
@@ -25,3 +158,11 @@ def install_dependencies() -> None:
             "    -> This could lead to missing dependencies"
             + ",unexpected behaviour and program failure."
         )
+
+
+def main() -> None:
+    install_dependencies()
+
+
+if __name__ == "__main__":
+    main()
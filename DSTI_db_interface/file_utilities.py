@@ -1,8 +1,67 @@
 # Standard library imports
+import abc
 import os
 import re
 
 
+# EXCEPTIONS
+class UnsupportedExportFormat(Exception):
+    def __init__(self, *args):
+        if args:
+            self.message = args[0]
+        else:
+            self.message = None
+
+    def __str__(self):
+        if self.message:
+            return "UnsupportedExportFormat, {0} ".format(self.message)
+        else:
+            return f"""Results can only be exported to the following
+                    formats: {", ".join(EXPORT_FORMATS)}"""
+
+
+class ExportDependencyMissing(Exception):
+    def __init__(self, *args):
+        if args:
+            self.message = args[0]
+        else:
+            self.message = None
+
+    def __str__(self):
+        if self.message:
+            return "ExportDependencyMissing, {0} ".format(self.message)
+        else:
+            return """Parquet, Feather and Arrow IPC exports need the
+                    pyarrow package. Install it with: pip install pyarrow"""
+
+
+# SHARED VARIABLES
+
+# Export format -> file extensions it is chosen by
+EXPORT_FORMATS = {
+    "csv": (".csv",),
+    "parquet": (".parquet",),
+    "feather": (".feather",),
+    "arrow_ipc": (".arrow", ".ipc"),
+}
+
+EXPORT_FILE_EXTENSIONS = tuple(
+    extension for extensions in EXPORT_FORMATS.values() for extension in extensions
+)
+
+# Compression used when none is requested
+DEFAULT_EXPORT_COMPRESSION = {
+    "csv": None,
+    "parquet": "snappy",
+    "feather": "lz4",
+    "arrow_ipc": None,
+}
+
+# Rows an ArrowChunkWriter holds back, waiting for chunks
+# fixing the type of columns which were only NULL so far
+DEFAULT_MAX_BUFFERED_ARROW_ROWS = 200000
+
+
 def is_permitted_filename(filename: str) -> bool:
     """
     Returns True if passed filename is compatible 
@@ -11,7 +70,7 @@ def is_permitted_filename(filename: str) -> bool:
     # Any patterns of characters a-z, _ or 0-9
     permitted_filename_regex_pattern = r"^[A-Za-z0-9_.]+$"
 
-    file_extention_ok = filename.lower().endswith(".csv")
+    file_extention_ok = filename.lower().endswith(EXPORT_FILE_EXTENSIONS)
 
     filename_characterset_ok = re.match(permitted_filename_regex_pattern, filename)
 
@@ -58,7 +117,7 @@ def get_target_filepath_to_save(target_file_type):
     filepath = None
 
     while not filepath:
-        print("\nPlease enter a full path and csv filename to save the results to...\n")
+        print("\nPlease enter a full path and filename to save the results to...\n")
 
         filepath = input()
         is_valid_path = is_valid_write_filepath(filepath)
@@ -68,6 +127,8 @@ def get_target_filepath_to_save(target_file_type):
             return filepath
         else:
             print("Sorry, that filepath doesn't seem quite right...\n")
+            if isinstance(target_file_type, tuple):
+                target_file_type = " or ".join(target_file_type)
             print(
                 f"Make sure the directory exists and it's a {target_file_type} file\n"
             )
@@ -92,3 +153,327 @@ def is_valid_read_filepath(filepath, file_type=".txt"):
     target_path_exists = os.path.exists(filepath)
 
     return file_type_ok and target_path_exists
+
+
+class CsvChunkWriter:
+    """
+    Writes a result set to a csv file one DataFrame
+    chunk at a time, so the whole result set never
+    needs to be held in memory.
+
+    The output is the same as calling to_csv on the
+    concatenated chunks: a single header line and a
+    running row index. Float columns holding only whole
+    numbers are written as integers (see
+    get_integral_floats_as_int64), so a column does not
+    switch between 3 and 3.0 depending on whether its
+    chunk had a NULL.
+
+    The file is only created when the first chunk arrives.
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.rows_written = 0
+        self._file = None
+
+    def write(self, df) -> None:
+        if self._file is None:
+            self._file = open(self.filepath, "w", newline="")
+            header = True
+        else:
+            header = False
+
+        # Continue the index where the previous chunk stopped
+        df = df.set_axis(range(self.rows_written, self.rows_written + len(df)), axis=0)
+        get_integral_floats_as_int64(df).to_csv(self._file, header=header)
+        self.rows_written += len(df)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ArrowChunkWriter(abc.ABC):
+    """
+    Base class for writers of the Arrow based columnar
+    formats. Like CsvChunkWriter, takes DataFrame chunks
+    and only creates the file when its schema is known.
+
+    Columns entirely NULL so far have no type yet, so chunks
+    are held back until every column got one, or
+    max_buffered_rows are held, or the writer is closed.
+    Columns still without a type are then stored as float64.
+    Until the file is created, a column whose chunks disagree
+    is widened: integers to float64 if a chunk has fractions,
+    anything else to string.
+
+    Chunks written after that are cast to the file's schema, so
+    integer columns stay integers even in chunks where NULLs
+    turned them into floats on the pandas side.
+
+    The DataFrame index is not written.
+    """
+
+    def __init__(
+        self,
+        filepath,
+        compression=None,
+        max_buffered_rows=DEFAULT_MAX_BUFFERED_ARROW_ROWS,
+    ):
+        self.filepath = filepath
+        self.compression = compression
+        self.max_buffered_rows = max_buffered_rows
+        self.rows_written = 0
+        self.schema = None
+        self._writer = None
+        self._buffered_tables = []
+
+    def write(self, df) -> None:
+        pa = import_pyarrow()
+
+        if self._writer is not None:
+            self._writer.write_table(get_arrow_table(df, self.schema))
+            self.rows_written += len(df)
+            return
+
+        table = pa.Table.from_pandas(df, preserve_index=False).replace_schema_metadata()
+        self.schema = get_widened_arrow_schema(self.schema, table)
+        self._buffered_tables.append(table)
+        self.rows_written += len(df)
+
+        buffered_rows = sum(table.num_rows for table in self._buffered_tables)
+        if buffered_rows >= self.max_buffered_rows or not any(
+            pa.types.is_null(field.type) for field in self.schema
+        ):
+            self._open_with_buffered_tables()
+
+    def close(self) -> None:
+        if self._writer is None and self._buffered_tables:
+            self._open_with_buffered_tables()
+
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def _open_with_buffered_tables(self) -> None:
+        pa = import_pyarrow()
+
+        self.schema = pa.schema(
+            [
+                field.with_type(pa.float64()) if pa.types.is_null(field.type) else field
+                for field in self.schema
+            ]
+        )
+        self._writer = self._open(self.schema)
+
+        for table in self._buffered_tables:
+            self._writer.write_table(table.cast(self.schema))
+        self._buffered_tables = []
+
+    @abc.abstractmethod
+    def _open(self, schema):
+        """
+        Creates the file and returns a writer
+        with a write_table method
+        """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ParquetChunkWriter(ArrowChunkWriter):
+    """
+    Writes chunks as row groups of a single Parquet file
+    """
+
+    def _open(self, schema):
+        import_pyarrow()
+        import pyarrow.parquet as pq
+
+        return pq.ParquetWriter(self.filepath, schema, compression=self.compression)
+
+
+class ArrowIpcChunkWriter(ArrowChunkWriter):
+    """
+    Writes chunks as record batches of an Arrow IPC file.
+    Feather (version 2) files are Arrow IPC files, so the
+    same writer is used for both.
+    """
+
+    def _open(self, schema):
+        pa = import_pyarrow()
+
+        options = pa.ipc.IpcWriteOptions(compression=self.compression)
+        return pa.ipc.new_file(self.filepath, schema, options=options)
+
+
+def get_integral_floats_as_int64(df):
+    """
+    Returns df with its float columns holding only whole numbers
+    and NULLs converted to the nullable Int64, the dtype the
+    database column has when a NULL didn't turn it into floats
+    """
+    integral_columns = []
+    for column, dtype in df.dtypes.items():
+        if dtype.kind != "f":
+            continue
+        values = df[column].dropna().to_numpy()
+        if ((values % 1 == 0) & (abs(values) < 2**53)).all():
+            integral_columns.append(column)
+
+    if not integral_columns:
+        return df
+    return df.astype(dict.fromkeys(integral_columns, "Int64"))
+
+
+def import_pyarrow():
+    """
+    pyarrow is only needed for the columnar export formats,
+    so it is imported on first use rather than with this module.
+    """
+    try:
+        import pyarrow
+    except ImportError:
+        raise ExportDependencyMissing
+
+    return pyarrow
+
+
+def get_widened_arrow_schema(schema, table):
+    """
+    Returns schema, the schema of the chunks seen so far,
+    widened to also hold table (see ArrowChunkWriter).
+    """
+    pa = import_pyarrow()
+
+    if schema is None:
+        return table.schema
+
+    fields = []
+    for field in schema:
+        column = table.column(field.name)
+        if pa.types.is_null(column.type) or column.type == field.type:
+            fields.append(field)
+        elif pa.types.is_null(field.type):
+            fields.append(field.with_type(column.type))
+        elif is_arrow_numeric(field.type) and is_arrow_numeric(column.type):
+            try:
+                column.cast(field.type)
+                fields.append(field)
+            except pa.ArrowInvalid:
+                fields.append(field.with_type(pa.float64()))
+        else:
+            fields.append(field.with_type(pa.string()))
+
+    return pa.schema(fields)
+
+
+def is_arrow_numeric(arrow_type) -> bool:
+    pa = import_pyarrow()
+    return pa.types.is_integer(arrow_type) or pa.types.is_floating(arrow_type)
+
+
+def get_arrow_table(df, schema):
+    """
+    Returns df as a pyarrow Table with the given schema, casting
+    the columns pandas can't convert to it directly, e.g.
+    numbers to a string column
+    """
+    pa = import_pyarrow()
+
+    try:
+        return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        return table.replace_schema_metadata().cast(schema)
+
+
+def get_export_format(filepath, file_format=None) -> str:
+    """
+    Returns file_format if given, otherwise the export
+    format matching the extension of filepath.
+
+    Raises UnsupportedExportFormat for anything else.
+    """
+    if file_format is not None:
+        if file_format not in EXPORT_FORMATS:
+            raise UnsupportedExportFormat(file_format)
+        return file_format
+
+    lower_filepath = filepath.lower()
+    for export_format, extensions in EXPORT_FORMATS.items():
+        if lower_filepath.endswith(extensions):
+            return export_format
+
+    raise UnsupportedExportFormat(filepath)
+
+
+def get_chunk_writer(filepath, file_format=None, compression=None):
+    """
+    Returns the chunk writer for the requested export format
+    (see get_export_format), using the format's default
+    compression unless one is passed.
+
+    Compression applies to the columnar formats: "snappy",
+    "gzip", "brotli", "lz4", "zstd" or "none" for Parquet,
+    "lz4", "zstd" or "none" for Feather and Arrow IPC.
+    """
+    export_format = get_export_format(filepath, file_format)
+
+    if compression is None:
+        compression = DEFAULT_EXPORT_COMPRESSION[export_format]
+    elif compression == "none":
+        compression = None
+
+    if export_format == "csv":
+        if compression is not None:
+            raise UnsupportedExportFormat("compressed csv")
+        return CsvChunkWriter(filepath)
+
+    if export_format == "parquet":
+        return ParquetChunkWriter(filepath, compression=compression)
+
+    return ArrowIpcChunkWriter(filepath, compression=compression)
+
+
+def save_dataframe(df, filepath, file_format=None, compression=None) -> None:
+    """
+    Saves a whole DataFrame, e.g. the result of
+    get_all_survey_data, in the requested export format.
+    """
+    with get_chunk_writer(filepath, file_format, compression) as writer:
+        writer.write(df)
+
+
+def read_export(filepath, file_format=None):
+    """
+    Reads back a file written by save_dataframe or a
+    chunk writer, returning a DataFrame.
+    """
+    import pandas as pd
+
+    export_format = get_export_format(filepath, file_format)
+
+    if export_format == "csv":
+        return pd.read_csv(filepath, index_col=0)
+
+    pa = import_pyarrow()
+    if export_format == "parquet":
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(filepath)
+    else:
+        table = pa.ipc.open_file(filepath).read_all()
+
+    return table.to_pandas()
@@ -0,0 +1,398 @@
+# Standard library imports
+import bisect
+import contextlib
+import datetime
+import functools
+import json
+import math
+import os
+import threading
+import time
+
+# Local Imports
+from . import db_connection
+
+# External library imports
+
+
+# SHARED VARIABLES
+
+# Upper bounds, in seconds, of the latency histogram buckets
+DEFAULT_LATENCY_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+# Every metric recorded by the package: name -> (type, help text)
+METRIC_DESCRIPTIONS = {
+    "dsti_connection_acquire_seconds": (
+        "histogram",
+        "Time to check a connection out of the pool",
+    ),
+    "dsti_connections_opened_total": (
+        "counter",
+        "New database connections opened",
+    ),
+    "dsti_structure_lookup_seconds": (
+        "histogram",
+        "Time to read the Survey, Question and SurveyStructure tables",
+    ),
+    "dsti_query_generation_seconds": (
+        "histogram",
+        "Time to build the AllSurveyData query",
+    ),
+    "dsti_query_memo_requests_total": (
+        "counter",
+        "AllSurveyData query requests, by memo hit or miss",
+    ),
+    "dsti_query_execution_seconds": (
+        "histogram",
+        "Time to run a SELECT query and fetch its results",
+    ),
+    "dsti_query_errors_total": (
+        "counter",
+        "Queries which failed",
+    ),
+    "dsti_result_cache_requests_total": (
+        "counter",
+        "Result cache lookups, by hit or miss",
+    ),
+    "dsti_statement_prepares_total": (
+        "counter",
+        "Parameterized statements prepared on a new cursor",
+    ),
+    "dsti_statement_executions_total": (
+        "counter",
+        "Parameterized statement executions, on new or reused cursors",
+    ),
+    "dsti_rows_fetched_total": (
+        "counter",
+        "Rows fetched from the database",
+    ),
+    "dsti_bytes_fetched_total": (
+        "counter",
+        "In-memory size of the DataFrames fetched from the database",
+    ),
+    "dsti_compact_dtypes_bytes_saved_total": (
+        "counter",
+        "Memory saved by fetching AllSurveyData with compact dtypes",
+    ),
+    "dsti_client_pivot_seconds": (
+        "histogram",
+        "Time to pivot long format answers into AllSurveyData in memory",
+    ),
+    "dsti_hashing_seconds": (
+        "histogram",
+        "Time to compute a DataFrame hash id",
+    ),
+    "dsti_view_ddl_seconds": (
+        "histogram",
+        "Time to drop or create a view",
+    ),
+    "dsti_export_seconds": (
+        "histogram",
+        "Time to run a query and export its results to a file",
+    ),
+    "dsti_export_rows_total": (
+        "counter",
+        "Rows written to export files",
+    ),
+    "dsti_export_bytes_total": (
+        "counter",
+        "Bytes written to export files",
+    ),
+    "dsti_watch_polls_total": (
+        "counter",
+        "Polls of the view watcher, by decision",
+    ),
+    "dsti_watch_poll_seconds": (
+        "histogram",
+        "Time taken by a poll of the view watcher, including any view refresh",
+    ),
+    "dsti_cli_action_seconds": (
+        "histogram",
+        "Time taken by a CLI menu action",
+    ),
+}
+
+
+# CLASSES
+class Histogram:
+    """
+    Counts of observed values per bucket, with their sum.
+    bucket_counts are per bucket, not cumulative, and the
+    last one counts values above every bucket bound.
+    """
+
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value) -> None:
+        self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative_bucket_counts(self) -> list:
+        """
+        Returns (upper bound, count of values <= bound) pairs,
+        ending with math.inf as Prometheus expects
+        """
+        cumulative_counts = []
+        running_count = 0
+        for bound, bucket_count in zip(self.buckets + (math.inf,), self.bucket_counts):
+            running_count += bucket_count
+            cumulative_counts.append((bound, running_count))
+        return cumulative_counts
+
+
+class MetricsRegistry:
+    """
+    Thread-safe store of counters and histograms, each
+    identified by a metric name and a set of labels.
+    """
+
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name, amount=1, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def snapshot(self) -> dict:
+        """
+        Returns every metric as a JSON serialisable dict:
+        name -> type, help and one sample per label set.
+        """
+        metrics = {}
+
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items()):
+                metric = _get_snapshot_metric(metrics, name, "counter")
+                metric["samples"].append({"labels": dict(labels), "value": value})
+
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                metric = _get_snapshot_metric(metrics, name, "histogram")
+                metric["samples"].append(
+                    {
+                        "labels": dict(labels),
+                        "buckets": {
+                            _format_bucket_bound(bound): count
+                            for bound, count in histogram.cumulative_bucket_counts()
+                        },
+                        "sum": histogram.sum,
+                        "count": histogram.count,
+                    }
+                )
+
+        return metrics
+
+
+# FUNCTIONS
+def _get_snapshot_metric(metrics, name, metric_type) -> dict:
+    if name not in metrics:
+        _, help_text = METRIC_DESCRIPTIONS.get(name, (metric_type, name))
+        metrics[name] = {"type": metric_type, "help": help_text, "samples": []}
+    return metrics[name]
+
+
+def _format_bucket_bound(bound) -> str:
+    return "+Inf" if bound == math.inf else repr(float(bound))
+
+
+def _format_labels(labels, extra_label=None) -> str:
+    label_pairs = list(labels.items())
+    if extra_label:
+        label_pairs.append(extra_label)
+
+    if not label_pairs:
+        return ""
+
+    formatted_pairs = []
+    for label, value in label_pairs:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+        value = value.replace("\n", "\\n")
+        formatted_pairs.append(f'{label}="{value}"')
+
+    return "{" + ",".join(formatted_pairs) + "}"
+
+
+def increment(name, amount=1, **labels) -> None:
+    """
+    Adds amount to the counter name{labels}
+    """
+    _registry.increment(name, amount, **labels)
+
+
+def observe(name, value, **labels) -> None:
+    """
+    Records value in the histogram name{labels}
+    """
+    _registry.observe(name, value, **labels)
+
+
+@contextlib.contextmanager
+def timer(name, **labels):
+    """
+    Context manager recording the seconds spent
+    in its block in the histogram name{labels},
+    even if the block raises.
+    """
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        _registry.observe(name, time.perf_counter() - start_time, **labels)
+
+
+def timed(name, **labels):
+    """
+    Decorator recording the duration of every call of the
+    decorated function in the histogram name{labels}
+    """
+
+    def decorator_timed(func):
+        @functools.wraps(func)
+        def wrapper_timed(*args, **kwargs):
+            with timer(name, **labels):
+                return func(*args, **kwargs)
+
+        return wrapper_timed
+
+    return decorator_timed
+
+
+def get_counter_total(name):
+    """
+    Returns the value of the counter name summed over
+    all its label sets, 0 if it was never incremented
+    """
+    samples = _registry.snapshot().get(name, {"samples": []})["samples"]
+    return sum(sample["value"] for sample in samples)
+
+
+def get_metrics_snapshot() -> dict:
+    return _registry.snapshot()
+
+
+def reset_metrics() -> None:
+    _registry.reset()
+
+
+def get_prometheus_text() -> str:
+    """
+    Returns every metric in the Prometheus text exposition format
+    """
+    lines = []
+
+    for name, metric in get_metrics_snapshot().items():
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+
+        for sample in metric["samples"]:
+            labels = sample["labels"]
+
+            if metric["type"] == "counter":
+                lines.append(f"{name}{_format_labels(labels)} {sample['value']}")
+                continue
+
+            for bound, count in sample["buckets"].items():
+                lines.append(
+                    f"{name}_bucket{_format_labels(labels, ('le', bound))} {count}"
+                )
+            lines.append(f"{name}_sum{_format_labels(labels)} {sample['sum']}")
+            lines.append(f"{name}_count{_format_labels(labels)} {sample['count']}")
+
+    return "\n".join(lines) + "\n"
+
+
+def _write_file_atomically(filepath, text) -> None:
+    """
+    Scrapers never see a half written file
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+    temporary_path = f"{filepath}.tmp"
+    with open(temporary_path, "w") as file:
+        file.write(text)
+    os.replace(temporary_path, filepath)
+
+
+def export_metrics_json(filepath) -> None:
+    """
+    Writes every metric recorded so far to filepath as JSON
+    """
+    metrics = {
+        "generated_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "metrics": get_metrics_snapshot(),
+    }
+    _write_file_atomically(filepath, json.dumps(metrics, indent=2))
+
+
+def export_metrics_prometheus(filepath) -> None:
+    """
+    Writes every metric recorded so far to filepath in the
+    Prometheus text format, e.g. a .prom file in the directory
+    of the node exporter's textfile collector.
+    """
+    _write_file_atomically(filepath, get_prometheus_text())
+
+
+def get_metrics_settings() -> dict:
+    """
+    Reads the optional [METRICS] section of config.ini.
+    Paths left empty are not exported.
+    """
+    config = db_connection.get_config()
+    return {
+        "json_path": config.get("METRICS", "json_path", fallback="").strip(),
+        "prometheus_path": config.get(
+            "METRICS", "prometheus_path", fallback=""
+        ).strip(),
+    }
+
+
+def export_configured_metrics() -> None:
+    """
+    Exports the metrics to the files set in config.ini, if any
+    """
+    settings = get_metrics_settings()
+
+    if settings["json_path"]:
+        export_metrics_json(settings["json_path"])
+
+    if settings["prometheus_path"]:
+        export_metrics_prometheus(settings["prometheus_path"])
+
+
+# Single process wide registry
+_registry = MetricsRegistry()
@@ -1,12 +1,18 @@
+from __future__ import annotations
+
 # Standard library imports
 import os
+import threading
 
 # Local Imports
+from .dependency_installation import lazy_import
 from . import db_api as db
-from .db_connection import provide_db_connection
+from .db_connection import get_config, provide_db_connection
+from . import metrics
+from . import result_cache
 
-# External library imports
-import pandas as pd
+# External library imports, imported on first use
+pd = lazy_import("pandas")
 
 # EXCEPTIONS
 class DynamicQueryMissingParameters(Exception):
@@ -27,15 +33,49 @@ class DynamicQueryMissingParameters(Exception):
                    storage and performance costs."""
 
 
+class UnknownQueryGenerator(Exception):
+    def __init__(self, *args):
+        if args:
+            self.message = args[0]
+        else:
+            self.message = None
+
+    def __str__(self):
+        if self.message:
+            return "UnknownQueryGenerator, {0} ".format(self.message)
+        else:
+            return "UnknownQueryGenerator has been raised"
+
+
 # DYNAMIC QUERY FUNCTIONS
 
 
-def get_strQueryTemplateForAnswerColumn(survey_id=None, question_id=None) -> str:
+def bind_parameter(value, params=None) -> str:
+    """
+    Returns the SQL text standing for value in a query.
+
+    Without params, that is value itself. When params is a list,
+    value is appended to it and SQL_PARAMETER_MARKER is returned,
+    so params lists the bound values in the order of their markers.
+    """
+    if params is None:
+        return str(value)
+
+    params.append(value)
+    return SQL_PARAMETER_MARKER
+
+
+def get_strQueryTemplateForAnswerColumn(
+    survey_id=None, question_id=None, params=None
+) -> str:
     """
     Builds and returns an SQL query string using the passed parameters.
 
     This query is used to add a column to AllSurveyData representing the
     answer to a particular question.
+
+    When params is a list, survey_id is bound as a parameter
+    appended to it (see bind_parameter).
     """
     if not survey_id or not question_id:
         raise DynamicQueryMissingParameters
@@ -47,7 +87,7 @@ def get_strQueryTemplateForAnswerColumn(survey_id=None, question_id=None) -> str
 					FROM Answer as a
 					WHERE
 						a.UserId = u.UserId
-						AND a.SurveyId = {survey_id}
+						AND a.SurveyId = {bind_parameter(survey_id, params)}
 						AND a.QuestionId = {question_id}
 				), -1) AS ANS_Q{question_id}
             """
@@ -69,7 +109,10 @@ def get_strQueryTemplateForNullColumn(question_id=None) -> str:
 
 
 def get_strQueryTemplateOuterUnionQuery(
-    survey_id=None, dynamic_question_answers=None
+    survey_id=None,
+    dynamic_question_answers=None,
+    params=None,
+    dynamic_question_params=(),
 ) -> str:
     """
     Builds and returns an SQL query string 
@@ -77,13 +120,22 @@ def get_strQueryTemplateOuterUnionQuery(
 
     This query is selects answers to the questions
     which a user has been asked.
+
+    When params is a list, survey_id is bound as a parameter
+    appended to it, around dynamic_question_params: the
+    parameters of dynamic_question_answers.
     """
     if not survey_id or not dynamic_question_answers:
         raise DynamicQueryMissingParameters
 
+    survey_id_column = bind_parameter(survey_id, params)
+    if params is not None:
+        params.extend(dynamic_question_params)
+    survey_id_filter = bind_parameter(survey_id, params)
+
     return f"""SELECT
 					UserId
-					, {survey_id} as SurveyId
+					, {survey_id_column} as SurveyId
 					  {dynamic_question_answers}
 			FROM
 				[User] as u
@@ -92,22 +144,96 @@ def get_strQueryTemplateOuterUnionQuery(
 					SELECT *
 					FROM Answer as a
 					WHERE u.UserId = a.UserId
-					AND a.SurveyId = {survey_id} 
+					AND a.SurveyId = {survey_id_filter} 
 			)"""
 
 
+def get_strQueryTemplateForConditionalAnswerColumn(
+    question_id=None, survey_ids=None, params=None
+) -> str:
+    """
+    Builds and returns an SQL query string using the passed parameters.
+
+    Conditional aggregation equivalent of get_strQueryTemplateForAnswerColumn
+    and get_strQueryTemplateForNullColumn combined: inside a pass over Answer
+    grouped by UserId and SurveyId, the column holds the user's answer (or -1
+    if unanswered) for the surveys in survey_ids, and NULL for other surveys.
+
+    When params is a list, the survey ids are bound as
+    parameters appended to it (see bind_parameter).
+    """
+    if not question_id or survey_ids is None:
+        raise DynamicQueryMissingParameters
+
+    if not survey_ids:
+        # Question not in any survey
+        return get_strQueryTemplateForNullColumn(question_id)
+
+    survey_id_list = ", ".join(
+        bind_parameter(survey_id, params) for survey_id in survey_ids
+    )
+
+    return f"""
+			,CASE WHEN a.SurveyId IN ({survey_id_list})
+				THEN COALESCE(
+					MAX(CASE WHEN a.QuestionId = {question_id} THEN a.Answer_Value END)
+				, -1)
+			END AS ANS_Q{question_id}
+            """
+
+
+def get_strQueryTemplateConditionalAggregationQuery(
+    survey_ids=None, dynamic_question_answers=None, params=None
+) -> str:
+    """
+    Builds and returns an SQL query string
+    using the passed parameters.
+
+    Single scan alternative to the UNION of
+    get_strQueryTemplateOuterUnionQuery queries: one row per
+    user and survey they answered, for users present in [User].
+
+    When params is a list, the survey ids are bound as parameters
+    appended to it, after those of dynamic_question_answers.
+    """
+    if not survey_ids or not dynamic_question_answers:
+        raise DynamicQueryMissingParameters
+
+    survey_id_list = ", ".join(
+        bind_parameter(survey_id, params) for survey_id in survey_ids
+    )
+
+    return f"""SELECT
+					a.UserId
+					, a.SurveyId
+					  {dynamic_question_answers}
+			FROM
+				Answer as a
+			WHERE
+				a.SurveyId IN ({survey_id_list})
+				AND EXISTS
+				(
+					SELECT *
+					FROM [User] as u
+					WHERE u.UserId = a.UserId
+				)
+			GROUP BY
+				a.UserId
+				, a.SurveyId"""
+
+
 @provide_db_connection
-def get_survey_ids(connection=None) -> list:
+def get_survey_ids(use_cache=False, connection=None) -> list:
     qry = "SELECT SurveyId FROM Survey ORDER BY SurveyId"
-    surveyIds = db.run_sql_select_query(qry)
+    surveyIds = db.run_sql_select_query(qry, use_cache=use_cache)
     surveyIds_as_list = surveyIds["SurveyId"].to_list()
     return surveyIds_as_list
 
 
 @provide_db_connection
-def get_question_ids(connection=None) -> list:
+def get_question_ids(use_cache=False, connection=None) -> list:
     qry = "SELECT QuestionId FROM Question ORDER BY QuestionId"
-    questionIds = db.run_sql_select_query(qry)
+    questionIds = db.run_sql_select_query(qry, use_cache=use_cache)
     questionIds_as_list = questionIds["QuestionId"].to_list()
     return questionIds_as_list
 
@@ -152,7 +278,98 @@ def get_questions_in_survey_qry(survey_id=None) -> str:
                 ORDER BY QuestionId"""
 
 
-def get_dynamic_query_to_update_vw_AllSurveyData() -> str:
+def get_long_format_answers_qry() -> str:
+    """
+    Returns the query reading every answer of the users present
+    in [User] in long format, one row per answer, for
+    db_api.pivot_long_format_answers to pivot client-side.
+    """
+    return """SELECT
+					a.UserId
+					, a.SurveyId
+					, a.QuestionId
+					, a.Answer_Value
+			FROM
+				Answer as a
+			WHERE EXISTS
+			(
+					SELECT *
+					FROM [User] as u
+					WHERE u.UserId = a.UserId
+			)"""
+
+
+@provide_db_connection
+def get_survey_structure(use_cache=False, connection=None) -> pd.DataFrame:
+    """
+    Returns every (SurveyId, QuestionId) pair
+    recorded in the SurveyStructure table.
+    """
+    qry = "SELECT SurveyId, QuestionId FROM SurveyStructure"
+    survey_structure = db.run_sql_select_query(qry, use_cache=use_cache)
+    return survey_structure
+
+
+def get_questions_in_survey_matrix(
+    survey_ids=None, question_ids=None, survey_structure=None
+) -> dict:
+    """
+    Builds, in memory, what get_questions_in_survey_qry selects
+    for each survey, from the bulk contents of the Survey,
+    Question and SurveyStructure tables.
+
+    Returns a dict keyed by survey id, ordered as survey_ids,
+    where each value is a list of (QuestionId, InSurvey) tuples
+    ordered by QuestionId:
+
+        {1: [(1, 1), (2, 0), (3, 1)], 2: [...]}
+
+    As with the UNION in get_questions_in_survey_qry, questions
+    listed in SurveyStructure but missing from Question are
+    still included for the surveys which reference them.
+    """
+    if survey_ids is None or question_ids is None or survey_structure is None:
+        raise DynamicQueryMissingParameters
+
+    all_question_ids = {int(question_id) for question_id in question_ids}
+
+    questions_by_survey = {}
+    for row in survey_structure.itertuples():
+        questions_by_survey.setdefault(int(row.SurveyId), set()).add(
+            int(row.QuestionId)
+        )
+
+    matrix = {}
+    for survey_id in survey_ids:
+        in_survey = questions_by_survey.get(int(survey_id), set())
+        matrix[survey_id] = [
+            (question_id, 1 if question_id in in_survey else 0)
+            for question_id in sorted(all_question_ids | in_survey)
+        ]
+
+    return matrix
+
+
+@metrics.timed("dsti_structure_lookup_seconds")
+def get_live_questions_in_survey_matrix(use_cache=False) -> dict:
+    """
+    Fetches Survey, Question and SurveyStructure in bulk
+    and returns get_questions_in_survey_matrix for them.
+
+    use_cache is passed on to run_sql_select_query. It
+    defaults to False, a cached structure would hide the
+    very changes the checkpoints are looking for.
+    """
+    return get_questions_in_survey_matrix(
+        survey_ids=get_survey_ids(use_cache=use_cache),
+        question_ids=get_question_ids(use_cache=use_cache),
+        survey_structure=get_survey_structure(use_cache=use_cache),
+    )
+
+
+def get_dynamic_query_to_update_vw_AllSurveyData(
+    query_generator=None, questions_in_survey_matrix=None
+) -> str:
     """
     This function build a dynamic query string, based on
     the contents of live database tables.
@@ -170,78 +387,515 @@ def get_dynamic_query_to_update_vw_AllSurveyData() -> str:
     |    _   |     _    |   _   | ... |   _   |
     +--------+----------+-------+-----+-------+
 
+    The survey structure is fetched once in bulk (3 queries
+    whatever the number of surveys) rather than once per survey.
+
+    query_generator picks how the query is written, see
+    QUERY_GENERATORS. Defaults to the query_generator option in
+    the [ALL_SURVEY_DATA] section of config.ini, or "correlated_subqueries".
+
+    questions_in_survey_matrix may be passed if the caller has
+    already fetched it, to avoid fetching the structure again.
+
+    Generated queries are memoized per survey structure version
+    (see get_survey_structure_hash_id), so repeated calls during
+    one refresh build the query string only once. The memo is
+    dropped as soon as a different structure is seen.
+    """
+    if query_generator is None:
+        query_generator = get_configured_query_generator()
+
+    if query_generator not in QUERY_GENERATORS:
+        raise UnknownQueryGenerator(query_generator)
+
+    if questions_in_survey_matrix is None:
+        questions_in_survey_matrix = get_live_questions_in_survey_matrix()
+
+    return get_memoized_query(
+        query_generator, QUERY_GENERATORS[query_generator], questions_in_survey_matrix
+    )
+
+
+def get_per_survey_queries_to_update_vw_AllSurveyData(
+    query_generator=None, questions_in_survey_matrix=None
+) -> dict:
+    """
+    Same as get_dynamic_query_to_update_vw_AllSurveyData, but
+    returns one independent query per survey instead of their
+    UNION, as a dict of survey id -> (query, params), the survey
+    id being a bound parameter (see bind_survey_id). Each query
+    returns the same columns, so their results can be fetched
+    separately (e.g. in parallel) and concatenated.
     """
+    if query_generator is None:
+        query_generator = get_configured_query_generator()
+
+    if query_generator not in PER_SURVEY_QUERY_GENERATORS:
+        raise UnknownQueryGenerator(query_generator)
+
+    if questions_in_survey_matrix is None:
+        questions_in_survey_matrix = get_live_questions_in_survey_matrix()
+
+    return get_memoized_query(
+        ("per_survey", query_generator),
+        PER_SURVEY_QUERY_GENERATORS[query_generator],
+        questions_in_survey_matrix,
+    )
 
-    # Appended to during the function
-    # and finally returned to caller
-    wip_query = ""
-
-    # The latest set of all surveys from
-    # the Survey table
-    all_survey_ids = get_survey_ids()
-
-    # OUTER LOOP
-    for survey_id in all_survey_ids:
-
-        # New questions and answers may have been
-        # added to the live databse tables so
-        # we create a dynamic string to append
-        # a column for each question with a value of
-        # NULL (question not in survey),
-        # -1 (question not answered) or the recorded answer
-        answer_columns_qry = ""
-
-        # INNER LOOP
-        """
-        Iterate over questions, adding
-        the appropriate dynamic query part 
-        for this row depending on whether 
-        the question was part of the current survey.
-        """
-        questions_in_survey = get_questions_in_survey(survey_id)
-
-        """
-        questions_in_survey looks like this:
-            +----------+------------+----------+
-            | SurveyId | QuestionId | InSurvey |
-            +----------+------------+----------+
-            |     1    |      1     |     1    | # Question 1 in Survey 1
-            +----------+------------+----------+
-            |     1    |      2     |     0    | # Question 2 not in Survey 1
-            +----------+------------+----------+
-            |     1    |      3     |     1    |
-            +----------+------------+----------+
-        """
-        for row in questions_in_survey.itertuples():
-            question_id = row.QuestionId
-            if row.InSurvey == 0:
-                # Question not in survey so add NULL as column
-                answer_columns_qry += get_strQueryTemplateForNullColumn(question_id)
-
-            else:
-                # Question is in survey so add the
-                # value based on the users answer
-                answer_columns_qry += get_strQueryTemplateForAnswerColumn(
-                    survey_id, question_id
+
+def get_column_partitioned_queries_to_update_vw_AllSurveyData(
+    query_generator=None, questions_in_survey_matrix=None, max_view_columns=None
+) -> list:
+    """
+    Same as get_dynamic_query_to_update_vw_AllSurveyData, but
+    split by columns into as many queries as needed for each to
+    return at most max_view_columns columns: UserId, SurveyId and
+    the answer columns of one get_question_id_partitions partition.
+
+    All the queries return the same rows, so their results
+    can be joined back on UserId and SurveyId. A single query
+    is returned if every column fits.
+    """
+    if query_generator is None:
+        query_generator = get_configured_query_generator()
+
+    if query_generator not in QUERY_GENERATORS:
+        raise UnknownQueryGenerator(query_generator)
+
+    if max_view_columns is None:
+        max_view_columns = get_configured_max_view_columns()
+
+    if questions_in_survey_matrix is None:
+        questions_in_survey_matrix = get_live_questions_in_survey_matrix()
+
+    build_query = QUERY_GENERATORS[query_generator]
+
+    def build_column_partitioned_queries(questions_in_survey_matrix):
+        return [
+            build_query(
+                get_questions_in_survey_matrix_partition(
+                    questions_in_survey_matrix, question_ids
                 )
+            )
+            for question_ids in get_question_id_partitions(
+                questions_in_survey_matrix, max_view_columns
+            )
+        ]
+
+    return get_memoized_query(
+        ("column_partitioned", query_generator, str(max_view_columns)),
+        build_column_partitioned_queries,
+        questions_in_survey_matrix,
+    )
+
+
+def get_question_id_partitions(
+    questions_in_survey_matrix, max_view_columns=None
+) -> list:
+    """
+    Splits the questions of questions_in_survey_matrix, in column
+    order, into as few partitions as needed for UserId, SurveyId
+    and a partition's answer columns to fit in max_view_columns
+    (SQL Server's limit by default).
+
+    Returns a list of lists of question ids, a single
+    one if every column fits.
+    """
+    if max_view_columns is None:
+        max_view_columns = get_configured_max_view_columns()
+
+    answer_columns_per_view = max_view_columns - VIEW_KEY_COLUMN_COUNT
+    if answer_columns_per_view < 1:
+        raise ValueError(
+            f"max_view_columns must be over {VIEW_KEY_COLUMN_COUNT}, "
+            f"not {max_view_columns}"
+        )
+
+    question_ids = sorted(
+        {
+            question_id
+            for questions_in_survey in questions_in_survey_matrix.values()
+            for question_id, _ in questions_in_survey
+        }
+    )
+    if not question_ids:
+        return [[]]
+
+    return [
+        question_ids[start : start + answer_columns_per_view]
+        for start in range(0, len(question_ids), answer_columns_per_view)
+    ]
+
+
+def get_questions_in_survey_matrix_partition(
+    questions_in_survey_matrix, question_ids
+) -> dict:
+    """
+    Returns questions_in_survey_matrix restricted to question_ids,
+    to build the queries of one column partition
+    """
+    partition = set(question_ids)
+    return {
+        survey_id: [
+            (question_id, in_survey)
+            for question_id, in_survey in questions_in_survey
+            if question_id in partition
+        ]
+        for survey_id, questions_in_survey in questions_in_survey_matrix.items()
+    }
+
+
+def get_configured_max_view_columns() -> int:
+    """
+    Returns the max_view_columns option from the [ALL_SURVEY_DATA]
+    section of config.ini, defaulting to DEFAULT_MAX_VIEW_COLUMNS.
+    """
+    config = get_config()
+    return config.getint(
+        "ALL_SURVEY_DATA", "max_view_columns", fallback=DEFAULT_MAX_VIEW_COLUMNS
+    )
+
+
+def get_partition_views_qry(backend_name) -> str:
+    """
+    Returns the query listing the names of the existing
+    column partition views of vw_AllSurveyData
+    """
+    if backend_name == "mssql":
+        return "SELECT name FROM sys.views WHERE name LIKE 'vw[_]AllSurveyData[_]Part%'"
+    return (
+        "SELECT name FROM sqlite_master "
+        "WHERE type = 'view' AND name LIKE 'vw!_AllSurveyData!_Part%' ESCAPE '!'"
+    )
+
+
+def get_memoized_query(memo_key, build_query, questions_in_survey_matrix):
+    """
+    Returns build_query(questions_in_survey_matrix), memoized
+    under memo_key for the survey structure version of
+    questions_in_survey_matrix (see get_survey_structure_hash_id).
+
+    The whole memo is dropped as soon as a different
+    structure version is seen.
+    """
+    structure_version = db.get_survey_structure_hash_id(questions_in_survey_matrix)
 
-        # Before moving on to next survey, add
-        # this survey to the final query string
-        current_survey_select_qry = get_strQueryTemplateOuterUnionQuery(
-            survey_id=survey_id, dynamic_question_answers=answer_columns_qry
+    with _dynamic_query_memo_lock:
+        structure_changed = (
+            _dynamic_query_memo["structure_version"] != structure_version
         )
+        if structure_changed:
+            _dynamic_query_memo["structure_version"] = structure_version
+            _dynamic_query_memo["queries"] = {}
+
+        qry = _dynamic_query_memo["queries"].get(memo_key)
+
+    if structure_changed:
+        # Cached results of survey table queries may be stale too
+        result_cache.invalidate_if_survey_structure_changed(structure_version)
+
+    metrics.increment(
+        "dsti_query_memo_requests_total", result="miss" if qry is None else "hit"
+    )
+
+    if qry is None:
+        generator = memo_key if isinstance(memo_key, str) else ":".join(memo_key)
+        with metrics.timer("dsti_query_generation_seconds", generator=generator):
+            qry = build_query(questions_in_survey_matrix)
+
+        with _dynamic_query_memo_lock:
+            if _dynamic_query_memo["structure_version"] == structure_version:
+                _dynamic_query_memo["queries"][memo_key] = qry
+
+    return qry
+
+
+def clear_dynamic_query_memo() -> None:
+    """
+    Forgets every memoized AllSurveyData query string
+    """
+    with _dynamic_query_memo_lock:
+        _dynamic_query_memo["structure_version"] = None
+        _dynamic_query_memo["queries"] = {}
+
+
+def get_strQueryTemplateCreateView(view_name=None, view_query=None) -> str:
+    """
+    Builds and returns the DDL creating view_name from view_query
+    """
+    if not view_name or not view_query:
+        raise DynamicQueryMissingParameters
+
+    return f"CREATE VIEW {view_name} AS {view_query}"
+
+
+def get_dynamic_query_from_questions_in_survey_matrix(
+    questions_in_survey_matrix=None,
+) -> str:
+    """
+    Builds the AllSurveyData query string from the output
+    of get_questions_in_survey_matrix. No database access.
+    """
+    if questions_in_survey_matrix is None:
+        raise DynamicQueryMissingParameters
+
+    # Joined once at the end: repeated string concatenation
+    # copies the query so far for every survey
+    survey_select_queries = [
+        get_survey_select_query(survey_id, questions_in_survey)
+        for survey_id, questions_in_survey in questions_in_survey_matrix.items()
+    ]
+
+    return " UNION ".join(survey_select_queries)
 
-        wip_query += f"{current_survey_select_qry} UNION "
 
-    # Remove final unecessary ' UNION '
-    final_query_string = wip_query[:-7]
+def get_survey_select_query(
+    survey_id=None, questions_in_survey=None, params=None
+) -> str:
+    """
+    Builds the SELECT returning the AllSurveyData rows of a single
+    survey, one of the branches of the UNION built by
+    get_dynamic_query_from_questions_in_survey_matrix.
+
+    questions_in_survey is the survey's entry in the
+    get_questions_in_survey_matrix output.
+
+    When params is a list, survey_id is bound as a parameter
+    appended to it, once per placeholder.
+    """
+    if not survey_id or questions_in_survey is None:
+        raise DynamicQueryMissingParameters
+
+    # New questions and answers may have been
+    # added to the live databse tables so
+    # we create a dynamic string to append
+    # a column for each question with a value of
+    # NULL (question not in survey),
+    # -1 (question not answered) or the recorded answer
+    answer_columns = []
+    answer_params = None if params is None else []
+
+    # INNER LOOP
+    """
+    Iterate over questions, adding
+    the appropriate dynamic query part 
+    for this row depending on whether 
+    the question was part of the current survey.
+
+    questions_in_survey looks like this:
+        [
+            (1, 1), # Question 1 in Survey
+            (2, 0), # Question 2 not in Survey
+            (3, 1),
+        ]
+    """
+    for question_id, in_survey in questions_in_survey:
+        if in_survey == 0:
+            # Question not in survey so add NULL as column
+            answer_columns.append(get_strQueryTemplateForNullColumn(question_id))
+
+        else:
+            # Question is in survey so add the
+            # value based on the users answer
+            answer_columns.append(
+                get_strQueryTemplateForAnswerColumn(
+                    survey_id, question_id, answer_params
+                )
+            )
+
+    answer_columns_qry = "".join(answer_columns)
+
+    return get_strQueryTemplateOuterUnionQuery(
+        survey_id=survey_id,
+        dynamic_question_answers=answer_columns_qry,
+        params=params,
+        dynamic_question_params=answer_params or (),
+    )
+
+
+def get_conditional_aggregation_query_from_questions_in_survey_matrix(
+    questions_in_survey_matrix=None, params=None
+) -> str:
+    """
+    Builds an AllSurveyData query string from the output of
+    get_questions_in_survey_matrix. No database access.
+
+    Produces the same columns and rows as
+    get_dynamic_query_from_questions_in_survey_matrix, but reads
+    Answer once, pivoting it with MAX(CASE ...) conditional
+    aggregation instead of one correlated subquery per cell.
+
+    When params is a list, the survey ids are bound as
+    parameters appended to it.
+    """
+    if questions_in_survey_matrix is None:
+        raise DynamicQueryMissingParameters
+
+    # QuestionId -> surveys the question is part of
+    surveys_by_question = {}
+    for survey_id, questions_in_survey in questions_in_survey_matrix.items():
+        for question_id, in_survey in questions_in_survey:
+            surveys = surveys_by_question.setdefault(question_id, [])
+            if in_survey != 0:
+                surveys.append(survey_id)
+
+    answer_columns_qry = "".join(
+        get_strQueryTemplateForConditionalAnswerColumn(question_id, survey_ids, params)
+        for question_id, survey_ids in sorted(surveys_by_question.items())
+    )
 
-    return final_query_string
+    return get_strQueryTemplateConditionalAggregationQuery(
+        survey_ids=list(questions_in_survey_matrix),
+        dynamic_question_answers=answer_columns_qry,
+        params=params,
+    )
 
 
-def get_questions_in_survey(survey_id) -> pd.DataFrame:
-    questions_in_survey_qry = get_questions_in_survey_qry(survey_id)
+def get_configured_query_generator() -> str:
+    """
+    Returns the query_generator option from the [ALL_SURVEY_DATA]
+    section of config.ini, defaulting to DEFAULT_QUERY_GENERATOR.
+    """
+    config = get_config()
+    return config.get(
+        "ALL_SURVEY_DATA", "query_generator", fallback=DEFAULT_QUERY_GENERATOR
+    ).strip()
 
-    questions_in_survey = db.run_sql_select_query(questions_in_survey_qry)
 
-    return questions_in_survey
+def bind_survey_id(build_query, survey_id) -> tuple:
+    """
+    Builds a query with build_query(params), where params is
+    the list the query templates append their bound values to,
+    so that the survey id is a ? placeholder instead of being
+    part of the SQL text.
+
+    Queries built this way for different surveys share their
+    text, and so their prepared statement and cached plan.
+
+    Returns a (query, params) tuple.
+    """
+    if not survey_id:
+        raise DynamicQueryMissingParameters
+
+    params = []
+    qry = build_query(params)
+    return qry, tuple(params)
+
+
+def get_strQueryTemplateForTableChecksum(backend_name, table, columns) -> str:
+    """
+    Builds and returns an SQL query string using the passed parameters.
+
+    This query returns a single row for table: its row count and
+    two order independent aggregates of its rows' columns.
+    """
+    if backend_name == "mssql":
+        row_checksum = f"BINARY_CHECKSUM({', '.join(columns)})"
+        checksum = f"CHECKSUM_AGG({row_checksum})"
+        checksum_sum = f"SUM(CAST({row_checksum} AS BIGINT))"
+    else:
+        # SQLite has no row checksum: each row is reduced to a polynomial
+        # of its columns, kept below 2^31 so that sums can't overflow.
+        # Each column adds a NULL flag term then its value, so
+        # that NULL and any value, 0 or -1 included, differ.
+        row_checksum = "0"
+        for column in columns:
+            row_checksum = (
+                f"(({row_checksum}) * {CHECKSUM_POLYNOMIAL_BASE} "
+                f"+ CASE WHEN {column} IS NULL THEN 1 ELSE 0 END) "
+                f"% {CHECKSUM_POLYNOMIAL_MODULUS}"
+            )
+            row_checksum = (
+                f"(({row_checksum}) * {CHECKSUM_POLYNOMIAL_BASE} "
+                f"+ COALESCE({column}, 0)) % {CHECKSUM_POLYNOMIAL_MODULUS}"
+            )
+        checksum = f"SUM({row_checksum})"
+        checksum_sum = (
+            f"SUM(({row_checksum}) * ({row_checksum}) % {CHECKSUM_POLYNOMIAL_MODULUS})"
+        )
+
+    return f"""
+			SELECT
+				'{table}' AS TableName
+				, COUNT(*) AS Row_Count
+				, {checksum} AS Checksum
+				, {checksum_sum} AS Checksum_Sum
+			FROM [dbo].[{table}]"""
+
+
+def get_table_checksums_query(backend_name) -> str:
+    """
+    Returns the query computing, on the database server, one
+    row of checksums per table of CHECKSUM_TABLES: a handful
+    of numbers whatever the number of answers.
+
+    SQL Server aggregates the BINARY_CHECKSUM of every row with
+    both CHECKSUM_AGG and SUM. Other backends get a portable
+    polynomial checksum instead.
+    """
+    return "\n\t\t\tUNION ALL".join(
+        get_strQueryTemplateForTableChecksum(backend_name, table, columns)
+        for table, columns in CHECKSUM_TABLES.items()
+    )
+
+
+# SHARED VARIABLES
+
+# Ways of writing the AllSurveyData query, selectable by name.
+# Each builds the query from get_questions_in_survey_matrix output.
+QUERY_GENERATORS = {
+    "correlated_subqueries": get_dynamic_query_from_questions_in_survey_matrix,
+    "conditional_aggregation": get_conditional_aggregation_query_from_questions_in_survey_matrix,
+}
+
+# Placeholder of bound parameters, understood by pyodbc and sqlite3
+SQL_PARAMETER_MARKER = "?"
+
+# Same as QUERY_GENERATORS, but building one (query, params)
+# per survey, with the survey id bound as a parameter
+PER_SURVEY_QUERY_GENERATORS = {
+    "correlated_subqueries": lambda questions_in_survey_matrix: {
+        survey_id: bind_survey_id(
+            lambda params: get_survey_select_query(
+                survey_id, questions_in_survey, params
+            ),
+            survey_id,
+        )
+        for survey_id, questions_in_survey in questions_in_survey_matrix.items()
+    },
+    "conditional_aggregation": lambda questions_in_survey_matrix: {
+        survey_id: bind_survey_id(
+            lambda params: get_conditional_aggregation_query_from_questions_in_survey_matrix(
+                {survey_id: questions_in_survey}, params
+            ),
+            survey_id,
+        )
+        for survey_id, questions_in_survey in questions_in_survey_matrix.items()
+    },
+}
+
+DEFAULT_QUERY_GENERATOR = "correlated_subqueries"
+
+# Columns of a SQL Server SELECT or view, at most
+DEFAULT_MAX_VIEW_COLUMNS = 1024
+# UserId and SurveyId, repeated in every column partition
+VIEW_KEY_COLUMN_COUNT = 2
+
+# Tables, and columns, vw_AllSurveyData depends on. Their
+# checksums change whenever the view's rows could change.
+CHECKSUM_TABLES = {
+    "Answer": ("QuestionId", "SurveyId", "UserId", "Answer_Value"),
+    "SurveyStructure": ("SurveyId", "QuestionId", "OrdinalValue"),
+    "Question": ("QuestionId",),
+    "Survey": ("SurveyId",),
+    "User": ("UserId",),
+}
+
+# Portable row checksum of get_strQueryTemplateForTableChecksum
+CHECKSUM_POLYNOMIAL_BASE = 1000003
+CHECKSUM_POLYNOMIAL_MODULUS = 2147483647
+
+# Last generated query string per query generator,
+# valid for a single survey structure version
+_dynamic_query_memo = {"structure_version": None, "queries": {}}
+_dynamic_query_memo_lock = threading.Lock()
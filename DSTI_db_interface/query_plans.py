@@ -0,0 +1,495 @@
+from __future__ import annotations
+
+# Standard library imports
+import datetime
+import hashlib
+import json
+import os
+import re
+import time
+import xml.etree.ElementTree as ET
+
+# Local Imports
+from .dependency_installation import lazy_import
+from .db_connection import get_backend, provide_db_connection
+
+# External library imports, imported on first use
+pd = lazy_import("pandas")
+
+
+# SHARED VARIABLES
+
+DEFAULT_QUERY_PLAN_DIRECTORY = os.path.join(
+    os.path.join(os.path.dirname(__file__)), "Data", "query_plans"
+)
+
+# Operators listed in the summary of a report
+DEFAULT_TOP_OPERATORS = 10
+
+# SQL Server session options capturing the actual plan and IO/time statistics
+MSSQL_STATISTICS_ON = (
+    "SET STATISTICS IO ON",
+    "SET STATISTICS TIME ON",
+    "SET STATISTICS XML ON",
+)
+MSSQL_STATISTICS_OFF = (
+    "SET STATISTICS XML OFF",
+    "SET STATISTICS TIME OFF",
+    "SET STATISTICS IO OFF",
+)
+
+# Server wide plan compilation counters. Despite their names these
+# are running totals, so the difference between two reads counts
+# the batches and compilations in between.
+MSSQL_COMPILATION_COUNTERS_QUERY = """SELECT
+        RTRIM(counter_name) AS counter_name,
+        cntr_value
+    FROM sys.dm_os_performance_counters
+    WHERE
+        object_name LIKE '%SQL Statistics%'
+        AND counter_name IN (
+            'Batch Requests/sec',
+            'SQL Compilations/sec',
+            'SQL Re-Compilations/sec'
+        )"""
+
+MSSQL_COMPILATION_COUNTER_NAMES = {
+    "Batch Requests/sec": "batch_requests",
+    "SQL Compilations/sec": "compilations",
+    "SQL Re-Compilations/sec": "recompilations",
+}
+
+SHOWPLAN_NAMESPACE = "http://schemas.microsoft.com/sqlserver/2004/07/showplan"
+
+_SHOWPLAN = {"sp": SHOWPLAN_NAMESPACE}
+
+# e.g. "Table 'Answer'. Scan count 5, logical reads 120, physical reads 0, ..."
+_MSSQL_IO_STATISTICS_PATTERN = re.compile(
+    r"Table '(?P<table>[^']+)'\. Scan count (?P<scan_count>\d+), "
+    r"logical reads (?P<logical_reads>\d+), physical reads (?P<physical_reads>\d+)"
+)
+
+# e.g. "SQL Server Execution Times: CPU time = 15 ms,  elapsed time = 20 ms."
+_MSSQL_TIME_STATISTICS_PATTERN = re.compile(
+    r"Execution Times:\s*CPU time = (?P<cpu_ms>\d+) ms,\s*"
+    r"elapsed time = (?P<elapsed_ms>\d+) ms"
+)
+
+# ODBC driver prefixes of server messages, e.g. "[Microsoft][ODBC ...]"
+_ODBC_MESSAGE_PREFIX_PATTERN = re.compile(r"^(\[[^\]]*\]\s*)+")
+
+# SQLite instructions between two calls of the progress handler
+SQLITE_PROGRESS_INTERVAL = 1000
+
+
+# FUNCTIONS
+@provide_db_connection
+def explain_sql_select_query(
+    sql_query=None, directory=DEFAULT_QUERY_PLAN_DIRECTORY, params=None, connection=None
+) -> (pd.DataFrame, dict):
+    """
+    Runs sql_query, with params bound to its ? placeholders
+    if given, while capturing its execution plan and
+    run time statistics with the current backend (see
+    QUERY_PLAN_CAPTURERS), saves the report next to the
+    query text in directory and prints its summary.
+
+    @provide_db_connection provides the connection object.
+
+    Returns the query results and the report.
+    """
+    backend = get_backend()
+    capture_query_plan = QUERY_PLAN_CAPTURERS[backend.name]
+
+    df, report = capture_query_plan(connection, backend.render_sql(sql_query), params)
+
+    report["backend"] = backend.name
+    report["sql"] = sql_query
+    report["params"] = None if params is None else list(params)
+    report["rows"] = len(df)
+    report["summary"] = get_query_plan_summary(report["operators"])
+
+    save_query_plan_report(report, directory)
+    stdout_query_plan_summary(report)
+
+    return df, report
+
+
+def capture_mssql_query_plan(
+    connection, sql_query, params=None
+) -> (pd.DataFrame, dict):
+    """
+    Runs sql_query on SQL Server with STATISTICS IO, TIME and
+    XML on. The actual plan comes back as an extra result set
+    and the IO/time statistics as informational messages.
+    """
+    cursor = connection.cursor()
+    messages = []
+    plan_xml = None
+
+    try:
+        for statement in MSSQL_STATISTICS_ON:
+            cursor.execute(statement)
+
+        start_time = time.perf_counter()
+        if params is None:
+            cursor.execute(sql_query)
+        else:
+            cursor.execute(sql_query, params)
+        columns = [column[0] for column in cursor.description]
+        rows = [tuple(row) for row in cursor.fetchall()]
+        elapsed_seconds = time.perf_counter() - start_time
+        messages.extend(getattr(cursor, "messages", None) or [])
+
+        while cursor.nextset():
+            messages.extend(getattr(cursor, "messages", None) or [])
+            if cursor.description:
+                for (value,) in cursor.fetchall():
+                    # May start with an <?xml ...?> declaration
+                    if isinstance(value, str) and "<ShowPlanXML" in value[:200]:
+                        plan_xml = value
+
+    finally:
+        for statement in MSSQL_STATISTICS_OFF:
+            try:
+                cursor.execute(statement)
+            except Exception as e:
+                pass
+        cursor.close()
+
+    messages = [
+        _ODBC_MESSAGE_PREFIX_PATTERN.sub("", str(message[-1])) for message in messages
+    ]
+
+    report = {
+        "elapsed_seconds": elapsed_seconds,
+        "operators": get_mssql_plan_operators(plan_xml) if plan_xml else [],
+        "statistics": {
+            "io": get_mssql_io_statistics(messages),
+            "time": get_mssql_time_statistics(messages),
+            "messages": messages,
+        },
+        "raw_plan": plan_xml,
+        "raw_plan_extension": ".sqlplan",
+    }
+
+    df = pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+    return df, report
+
+
+def get_mssql_plan_operators(plan_xml) -> list:
+    """
+    Returns one dict per operator (RelOp) of a SQL Server XML
+    showplan, with its estimated own cost (CPU + IO for all its
+    estimated executions, excluding its children) and, for
+    actual plans, the actual rows, executions and logical reads.
+    """
+    root = ET.fromstring(plan_xml)
+    relops = list(root.iter(f"{{{SHOWPLAN_NAMESPACE}}}RelOp"))
+
+    parent_ids = {}
+    _record_parent_ids(root, None, parent_ids)
+
+    operators = []
+    for relop in relops:
+        estimated_executions = (
+            1.0
+            + float(relop.get("EstimateRebinds", 0))
+            + float(relop.get("EstimateRewinds", 0))
+        )
+        estimated_cost = (
+            float(relop.get("EstimateCPU", 0)) + float(relop.get("EstimateIO", 0))
+        ) * estimated_executions
+
+        # The operator's own element, e.g. <IndexScan>, holds the object it reads
+        objects = [
+            child.find("sp:Object", _SHOWPLAN)
+            for child in relop
+            if child.tag != f"{{{SHOWPLAN_NAMESPACE}}}RunTimeInformation"
+        ]
+        objects = [obj for obj in objects if obj is not None]
+
+        actual_counters = relop.findall(
+            "sp:RunTimeInformation/sp:RunTimeCountersPerThread", _SHOWPLAN
+        )
+
+        physical_operator = relop.get("PhysicalOp")
+        plan_object = _format_plan_object(objects[0]) if objects else None
+        operators.append(
+            {
+                "node_id": int(relop.get("NodeId")),
+                "parent_id": _int_or_none(parent_ids.get(relop.get("NodeId"))),
+                "operator": physical_operator,
+                "logical_operator": relop.get("LogicalOp"),
+                "object": plan_object,
+                "detail": physical_operator
+                + (f" on {plan_object}" if plan_object else ""),
+                "estimated_cost": estimated_cost,
+                "estimated_rows": float(relop.get("EstimateRows", 0)),
+                "estimated_executions": estimated_executions,
+                "actual_rows": _sum_counter(actual_counters, "ActualRows"),
+                "actual_executions": _sum_counter(actual_counters, "ActualExecutions"),
+                "logical_reads": _sum_counter(actual_counters, "ActualLogicalReads"),
+                "is_scan": "Scan" in physical_operator,
+            }
+        )
+
+    return operators
+
+
+def _record_parent_ids(element, parent_id, parent_ids) -> None:
+    """
+    Maps the NodeId of each RelOp below element
+    to the NodeId of its nearest enclosing RelOp
+    """
+    for child in element:
+        if child.tag == f"{{{SHOWPLAN_NAMESPACE}}}RelOp":
+            parent_ids[child.get("NodeId")] = parent_id
+            _record_parent_ids(child, child.get("NodeId"), parent_ids)
+        else:
+            _record_parent_ids(child, parent_id, parent_ids)
+
+
+def _format_plan_object(plan_object) -> str:
+    return ".".join(
+        plan_object.get(part)
+        for part in ("Table", "Index")
+        if plan_object.get(part) is not None
+    )
+
+
+def _sum_counter(counters, attribute) -> int:
+    values = [
+        int(counter.get(attribute)) for counter in counters if counter.get(attribute)
+    ]
+    return sum(values) if values else None
+
+
+def _int_or_none(value) -> int:
+    return None if value is None else int(value)
+
+
+def get_mssql_io_statistics(messages) -> list:
+    """
+    Parses the STATISTICS IO messages: scans and reads per table
+    """
+    io_statistics = []
+    for message in messages:
+        for match in _MSSQL_IO_STATISTICS_PATTERN.finditer(message):
+            io_statistics.append(
+                {
+                    "table": match["table"],
+                    "scan_count": int(match["scan_count"]),
+                    "logical_reads": int(match["logical_reads"]),
+                    "physical_reads": int(match["physical_reads"]),
+                }
+            )
+    return io_statistics
+
+
+def get_mssql_time_statistics(messages) -> dict:
+    """
+    Parses the STATISTICS TIME messages, adding up the CPU and
+    elapsed times of every statement executed
+    """
+    cpu_ms = elapsed_ms = 0
+    for message in messages:
+        for match in _MSSQL_TIME_STATISTICS_PATTERN.finditer(message):
+            cpu_ms += int(match["cpu_ms"])
+            elapsed_ms += int(match["elapsed_ms"])
+    return {"cpu_ms": cpu_ms, "elapsed_ms": elapsed_ms}
+
+
+def capture_sqlite_query_plan(
+    connection, sql_query, params=None
+) -> (pd.DataFrame, dict):
+    """
+    Captures the EXPLAIN QUERY PLAN of sql_query, then runs it
+    counting the virtual machine instructions it takes.
+    SQLite has no cost estimates, so operators have none.
+    """
+    plan_rows = connection.execute(
+        f"EXPLAIN QUERY PLAN {sql_query}", params or ()
+    ).fetchall()
+
+    progress_calls = [0]
+
+    def count_progress():
+        progress_calls[0] += 1
+        return 0
+
+    connection.set_progress_handler(count_progress, SQLITE_PROGRESS_INTERVAL)
+    try:
+        start_time = time.perf_counter()
+        df = pd.read_sql(sql_query, connection, params=params)
+        elapsed_seconds = time.perf_counter() - start_time
+    finally:
+        connection.set_progress_handler(None, 0)
+
+    operators = []
+    for node_id, parent_id, _, detail in plan_rows:
+        detail_words = detail.split()
+        is_access = detail_words[0] in ("SCAN", "SEARCH") and len(detail_words) > 1
+        operators.append(
+            {
+                "node_id": node_id,
+                "parent_id": parent_id or None,
+                "operator": detail_words[0],
+                "logical_operator": None,
+                "object": detail_words[1] if is_access else None,
+                "detail": detail,
+                "estimated_cost": None,
+                "estimated_rows": None,
+                "estimated_executions": None,
+                "actual_rows": None,
+                "actual_executions": None,
+                "logical_reads": None,
+                "is_scan": detail_words[0] == "SCAN" and is_access,
+            }
+        )
+
+    report = {
+        "elapsed_seconds": elapsed_seconds,
+        "operators": operators,
+        "statistics": {
+            "vm_instructions": progress_calls[0] * SQLITE_PROGRESS_INTERVAL,
+        },
+        "raw_plan": "\n".join(
+            f"{node_id}\t{parent_id}\t{detail}"
+            for node_id, parent_id, _, detail in plan_rows
+        ),
+        "raw_plan_extension": ".plan.txt",
+    }
+    return df, report
+
+
+@provide_db_connection
+def get_compilation_counters(connection=None) -> dict:
+    """
+    Returns SQL Server's running totals of batch requests, plan
+    compilations and recompilations. Reading them before and
+    after a workload shows how many of its batches needed a
+    fresh plan, see get_compilation_counter_deltas.
+    Needs the VIEW SERVER STATE permission.
+
+    @provide_db_connection provides the connection object.
+
+    Returns None on backends without such counters, or if
+    they cannot be read.
+    """
+    if get_backend().name != "mssql":
+        return None
+
+    try:
+        cursor = connection.execute(MSSQL_COMPILATION_COUNTERS_QUERY)
+        rows = cursor.fetchall()
+        cursor.close()
+    except Exception as e:
+        return None
+
+    return {
+        MSSQL_COMPILATION_COUNTER_NAMES[counter_name]: int(value)
+        for counter_name, value in rows
+        if counter_name in MSSQL_COMPILATION_COUNTER_NAMES
+    }
+
+
+def get_compilation_counter_deltas(before, after) -> dict:
+    """
+    Returns the increase of each get_compilation_counters
+    counter between two reads, or None if either is missing.
+    """
+    if before is None or after is None:
+        return None
+
+    return {name: after[name] - before[name] for name in after if name in before}
+
+
+def get_query_plan_summary(operators, top=DEFAULT_TOP_OPERATORS) -> dict:
+    """
+    Summarizes the operators of a plan: how many scan rather
+    than seek, and the top most expensive ones. Without cost
+    estimates (SQLite), scans are listed first, in plan order.
+    """
+    if any(operator["estimated_cost"] is not None for operator in operators):
+        ranked = sorted(
+            operators,
+            key=lambda operator: operator["estimated_cost"] or 0,
+            reverse=True,
+        )
+    else:
+        # Only data access and temporary B-trees cost anything
+        ranked = sorted(
+            (
+                operator
+                for operator in operators
+                if operator["object"] or "TEMP B-TREE" in operator["detail"]
+            ),
+            key=lambda operator: not operator["is_scan"],
+        )
+
+    total_cost = sum(operator["estimated_cost"] or 0 for operator in operators)
+
+    return {
+        "operators": len(operators),
+        "scans": sum(operator["is_scan"] for operator in operators),
+        "total_estimated_cost": total_cost if total_cost else None,
+        "most_expensive_operators": ranked[:top],
+    }
+
+
+def get_query_plan_report_basename(report) -> str:
+    sql_hash = hashlib.sha1(report["sql"].encode("UTF-8")).hexdigest()[:10]
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    return f"{timestamp}_{sql_hash}"
+
+
+def save_query_plan_report(report, directory=DEFAULT_QUERY_PLAN_DIRECTORY) -> str:
+    """
+    Writes, side by side in directory, the query text (.sql),
+    the report (.plan.json) and the backend's raw plan, e.g. a
+    .sqlplan file which SQL Server Management Studio can open.
+
+    Returns the path of the report and records it in
+    report["report_path"].
+    """
+    os.makedirs(directory, exist_ok=True)
+    basepath = os.path.join(directory, get_query_plan_report_basename(report))
+
+    with open(f"{basepath}.sql", "w") as file:
+        file.write(report["sql"])
+
+    if report["raw_plan"]:
+        with open(f"{basepath}{report['raw_plan_extension']}", "w") as file:
+            file.write(report["raw_plan"])
+
+    report_path = f"{basepath}.plan.json"
+    report["report_path"] = report_path
+
+    saved_report = {key: value for key, value in report.items() if key != "raw_plan"}
+    with open(report_path, "w") as file:
+        json.dump(saved_report, file, indent=2, default=str)
+
+    return report_path
+
+
+def stdout_query_plan_summary(report) -> None:
+    summary = report["summary"]
+
+    print(
+        f"Query plan ({report['backend']}): {summary['operators']} operators, "
+        f"{summary['scans']} scans, {report['rows']} rows "
+        f"in {report['elapsed_seconds']:.3f}s"
+    )
+    for operator in summary["most_expensive_operators"]:
+        cost = operator["estimated_cost"]
+        cost = "" if cost is None else f"cost {cost:.4f}  "
+        print(f"  {cost}{operator['detail']}")
+    print(f"Query plan report saved to {report['report_path']}")
+
+
+# Capture function of each backend, see db_backends
+QUERY_PLAN_CAPTURERS = {
+    "mssql": capture_mssql_query_plan,
+    "sqlite": capture_sqlite_query_plan,
+}
@@ -0,0 +1,394 @@
+from __future__ import annotations
+
+# Standard library imports
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+# Local Imports
+from .dependency_installation import lazy_import
+from .db_connection import get_backend, get_config
+from . import file_utilities as futils
+
+# External library imports, imported on first use
+pd = lazy_import("pandas")
+
+
+# SHARED VARIABLES
+
+DEFAULT_CACHE_DIRECTORY = os.path.join(
+    os.path.join(os.path.dirname(__file__)), "Data", "result_cache"
+)
+
+# Used when config.ini has no [RESULT_CACHE] section
+DEFAULT_CACHE_ENABLED = False
+DEFAULT_CACHE_TTL_SECONDS = 3600
+DEFAULT_CACHE_MAX_SIZE_MB = 512
+
+# Entries of queries reading any of these are dropped
+# when the survey structure changes
+SURVEY_STRUCTURE_TABLES = ("survey", "question", "surveystructure", "vw_allsurveydata")
+
+# Column partition views, vw_allsurveydata_part1, ..., included
+_SURVEY_STRUCTURE_TABLES_PATTERN = re.compile(
+    r"\b(" + "|".join(SURVEY_STRUCTURE_TABLES) + r")(_part\d+)?\b"
+)
+
+INDEX_FILENAME = "index.json"
+
+# Entries are stored in this file_utilities export format
+ENTRY_FORMAT = "parquet"
+
+# Single process wide cache, created lazily by get_result_cache()
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+# CLASSES
+class ResultCache:
+    """
+    Disk-backed cache of SELECT query results.
+
+    Entries are keyed on the database queried and the normalized
+    SQL text (see get_cache_key), and the result DataFrames stored
+    as Parquet files, with an index.json alongside recording each
+    entry's dtypes, size, expiry time and last access. Results
+    which cannot be stored as Parquet are not cached.
+
+    Expired entries are never returned. When the total size of the
+    entries goes over max_size_bytes, least recently used entries
+    are evicted until it fits again.
+    """
+
+    def __init__(
+        self,
+        directory=DEFAULT_CACHE_DIRECTORY,
+        max_size_bytes=DEFAULT_CACHE_MAX_SIZE_MB * 1024 * 1024,
+        default_ttl=DEFAULT_CACHE_TTL_SECONDS,
+    ):
+        self.directory = directory
+        self.max_size_bytes = max_size_bytes
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._index = self._load_index()
+
+    def get(self, sql_query, params=None) -> pd.DataFrame:
+        """
+        Returns the cached result of sql_query run with params,
+        or None if it is missing or expired.
+        """
+        key = get_cache_key(sql_query, params)
+
+        with self._lock:
+            entry = self._index["entries"].get(key)
+            if entry is None:
+                return None
+
+            if entry["expires_at"] <= time.time():
+                self._remove_entry(key)
+                self._save_index()
+                return None
+
+            try:
+                df = futils.read_export(self._entry_path(key), ENTRY_FORMAT)
+                df = set_cached_dtypes(df, entry["dtypes"])
+            except Exception as e:
+                self._remove_entry(key)
+                self._save_index()
+                return None
+
+            entry["last_access"] = self._next_access_time()
+            self._save_index()
+            return df
+
+    def put(self, sql_query, df: pd.DataFrame, ttl=None, params=None) -> None:
+        """
+        Stores df as the result of sql_query, run with params,
+        for ttl seconds (default_ttl if None), evicting least
+        recently used entries if the cache goes over its size budget.
+        """
+        if ttl is None:
+            ttl = self.default_ttl
+
+        normalized_sql = normalize_sql(sql_query)
+        key = get_cache_key(sql_query, params)
+
+        with self._lock:
+            entry_path = self._entry_path(key)
+            try:
+                futils.save_dataframe(df, entry_path, ENTRY_FORMAT)
+            except Exception as e:
+                self._remove_entry(key)
+                self._save_index()
+                return
+
+            self._index["entries"][key] = {
+                "dtypes": {column: str(dtype) for column, dtype in df.dtypes.items()},
+                "size": os.path.getsize(entry_path),
+                "expires_at": time.time() + ttl,
+                "last_access": self._next_access_time(),
+                "reads_survey_structure": reads_survey_structure(normalized_sql),
+            }
+
+            self._evict_to_size_budget()
+            self._save_index()
+
+    def invalidate(self, sql_query=None, params=None) -> None:
+        """
+        Drops the entry for sql_query run with params,
+        or every entry if sql_query is None.
+        """
+        with self._lock:
+            if sql_query is None:
+                keys = list(self._index["entries"])
+            else:
+                keys = [get_cache_key(sql_query, params)]
+
+            for key in keys:
+                self._remove_entry(key)
+            self._save_index()
+
+    def invalidate_if_survey_structure_changed(self, structure_version) -> bool:
+        """
+        Drops every entry reading the survey structure tables
+        if structure_version differs from the last one seen.
+
+        Returns True if entries were invalidated.
+        """
+        with self._lock:
+            previous_version = self._index["structure_version"]
+            if previous_version == structure_version:
+                return False
+
+            self._index["structure_version"] = structure_version
+
+            if previous_version is not None:
+                for key, entry in list(self._index["entries"].items()):
+                    if entry["reads_survey_structure"]:
+                        self._remove_entry(key)
+
+            self._save_index()
+            return previous_version is not None
+
+    def size_bytes(self) -> int:
+        with self._lock:
+            return sum(entry["size"] for entry in self._index["entries"].values())
+
+    def _evict_to_size_budget(self) -> None:
+        """
+        Removes expired, then least recently used, entries until
+        the cache fits in max_size_bytes.
+        Must be called with self._lock held.
+        """
+        now = time.time()
+        for key, entry in list(self._index["entries"].items()):
+            if entry["expires_at"] <= now:
+                self._remove_entry(key)
+
+        entries = self._index["entries"]
+        total_size = sum(entry["size"] for entry in entries.values())
+
+        for key in sorted(entries, key=lambda key: entries[key]["last_access"]):
+            if total_size <= self.max_size_bytes:
+                break
+            total_size -= entries[key]["size"]
+            self._remove_entry(key)
+
+    def _next_access_time(self) -> float:
+        """
+        Current time, nudged forward if needed so that access
+        times are strictly increasing even on coarse clocks.
+        Must be called with self._lock held.
+        """
+        last_access_times = [
+            entry["last_access"] for entry in self._index["entries"].values()
+        ]
+        latest = max(last_access_times, default=0.0)
+        return max(time.time(), latest + 1e-6)
+
+    def _remove_entry(self, key) -> None:
+        self._index["entries"].pop(key, None)
+        try:
+            os.remove(self._entry_path(key))
+        except OSError:
+            pass
+
+    def _entry_path(self, key) -> str:
+        return os.path.join(self.directory, f"{key}.parquet")
+
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, INDEX_FILENAME)
+
+    def _load_index(self) -> dict:
+        try:
+            with open(self._index_path(), "r") as file:
+                index = json.load(file)
+        except (OSError, ValueError):
+            index = {}
+
+        index.setdefault("structure_version", None)
+        index.setdefault("entries", {})
+        return index
+
+    def _save_index(self) -> None:
+        temporary_path = f"{self._index_path()}.tmp"
+        with open(temporary_path, "w") as file:
+            json.dump(self._index, file)
+        os.replace(temporary_path, self._index_path())
+
+
+# FUNCTIONS
+def normalize_sql(sql_query: str) -> str:
+    """
+    Returns sql_query with whitespace collapsed and any trailing
+    semicolon removed, leaving single-quoted string literals
+    untouched, so differently laid out spellings of a query
+    share a cache entry.
+
+    Case is kept, as identifiers are case sensitive
+    under a case sensitive collation.
+    """
+    # Odd items of the split are the quoted literals
+    parts = re.split(r"('(?:[^']|'')*')", sql_query.strip().rstrip(";"))
+
+    normalized_parts = []
+    for position, part in enumerate(parts):
+        if position % 2:
+            normalized_parts.append(part)
+        else:
+            normalized_parts.append(re.sub(r"\s+", " ", part))
+
+    return "".join(normalized_parts).strip()
+
+
+def get_cache_key(sql_query: str, params=None) -> str:
+    """
+    Results are cached per database queried (see
+    get_connection_target) and, for a parameterized
+    query, per set of parameter values
+    """
+    key_text = f"{get_connection_target()}\n{normalize_sql(sql_query)}"
+    if params is not None:
+        key_text += f"\n{list(params)!r}"
+    return hashlib.sha1(key_text.encode("UTF-8")).hexdigest()
+
+
+def get_connection_target() -> str:
+    """
+    Returns the name and connection string of the current
+    backend, which tell the server and database queried
+    """
+    backend = get_backend()
+    return f"{backend.name}\n{backend.connection_string}"
+
+
+def reads_survey_structure(normalized_sql: str) -> bool:
+    """
+    Returns True if the query reads any of SURVEY_STRUCTURE_TABLES
+    """
+    return bool(_SURVEY_STRUCTURE_TABLES_PATTERN.search(normalized_sql.lower()))
+
+
+def set_cached_dtypes(df: pd.DataFrame, dtypes: dict) -> pd.DataFrame:
+    """
+    Returns df, read back from a cache entry, with the dtypes of
+    the DataFrame that was cached. Parquet has no object column
+    of NULLs, such columns come back as NaN and get None again.
+    """
+    df = df.astype(dtypes)
+    for column, dtype in dtypes.items():
+        if dtype == "object":
+            df[column] = df[column].where(df[column].notna(), None)
+    return df
+
+
+def get_result_cache_settings() -> dict:
+    """
+    Reads the optional [RESULT_CACHE] section of config.ini,
+    falling back to the module defaults for anything missing.
+    """
+    config = get_config()
+
+    if not config.has_section("RESULT_CACHE"):
+        return {
+            "enabled": DEFAULT_CACHE_ENABLED,
+            "directory": DEFAULT_CACHE_DIRECTORY,
+            "max_size_bytes": DEFAULT_CACHE_MAX_SIZE_MB * 1024 * 1024,
+            "default_ttl": DEFAULT_CACHE_TTL_SECONDS,
+        }
+
+    section = config["RESULT_CACHE"]
+    return {
+        "enabled": section.getboolean("enabled", fallback=DEFAULT_CACHE_ENABLED),
+        "directory": section.get("directory", fallback="").strip()
+        or DEFAULT_CACHE_DIRECTORY,
+        "max_size_bytes": int(
+            section.getfloat("max_size_mb", fallback=DEFAULT_CACHE_MAX_SIZE_MB)
+            * 1024
+            * 1024
+        ),
+        "default_ttl": section.getfloat(
+            "ttl_seconds", fallback=DEFAULT_CACHE_TTL_SECONDS
+        ),
+    }
+
+
+def is_result_cache_enabled() -> bool:
+    """
+    Returns True if the cache is enabled in config.ini and the
+    current backend's results may be cached (see DBBackend).
+    """
+    return get_result_cache_settings()["enabled"] and get_backend().cache_results
+
+
+def get_result_cache() -> ResultCache:
+    """
+    Returns the shared ResultCache, rebuilt if its
+    settings in config.ini have changed.
+    """
+    global _result_cache
+
+    settings = get_result_cache_settings()
+
+    with _result_cache_lock:
+        cache = _result_cache
+        cache_is_current = (
+            cache is not None
+            and cache.directory == settings["directory"]
+            and cache.max_size_bytes == settings["max_size_bytes"]
+            and cache.default_ttl == settings["default_ttl"]
+        )
+
+        if not cache_is_current:
+            _result_cache = ResultCache(
+                directory=settings["directory"],
+                max_size_bytes=settings["max_size_bytes"],
+                default_ttl=settings["default_ttl"],
+            )
+
+        return _result_cache
+
+
+def invalidate_result_cache(sql_query=None) -> None:
+    """
+    Drops the cached result of sql_query, or
+    every cached result if sql_query is None.
+    """
+    get_result_cache().invalidate(sql_query)
+
+
+def invalidate_if_survey_structure_changed(structure_version) -> bool:
+    """
+    Drops cached results reading the survey structure tables if
+    the structure has changed since the cache last saw it.
+    Does nothing, and touches no files, if the cache is disabled.
+    """
+    if not is_result_cache_enabled():
+        return False
+
+    return get_result_cache().invalidate_if_survey_structure_changed(structure_version)
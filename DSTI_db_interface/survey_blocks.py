@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+# Standard library imports
+import threading
+
+# Local Imports
+from .dependency_installation import lazy_import
+from . import db_api as db
+
+# External library imports, imported on first use
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+
+# SHARED VARIABLES
+
+# Columns every block starts with, identifying its rows
+KEY_COLUMNS = ["UserId", "SurveyId"]
+
+
+# CLASSES
+class SurveyBlocks:
+    """
+    AllSurveyData held as one block per survey, each block only
+    having the answer columns of the questions in that survey.
+
+    In the dense AllSurveyData most cells are the NULLs of
+    questions outside the row's survey, so the blocks take a
+    fraction of its memory.
+
+    SurveyBlocks is not a DataFrame. Code expecting one should
+    use the dense property, the dense AllSurveyData built on
+    first access and kept, or to_dataframe(), which builds a
+    new one on each call.
+
+    Pickling keeps the blocks only, the dense
+    DataFrame is built again when needed.
+    """
+
+    def __init__(self, blocks: dict, columns):
+        # SurveyId -> DataFrame of KEY_COLUMNS and the survey's answer columns
+        self.blocks = blocks
+        # Columns of the dense AllSurveyData, in order
+        self.columns = pd.Index(columns)
+        self._dense = None
+        self._dense_lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state["_dense_lock"]
+        state["_dense"] = None
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._dense_lock = threading.Lock()
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame, questions_in_survey_matrix: dict):
+        """
+        Splits a dense AllSurveyData df into blocks, keeping for each
+        survey the answer columns of its questions in
+        questions_in_survey_matrix
+        """
+        blocks = {
+            survey_id: get_survey_block(
+                survey_rows, survey_id, questions_in_survey_matrix
+            )
+            for survey_id, survey_rows in df.groupby("SurveyId", sort=True)
+        }
+
+        return cls(blocks, df.columns)
+
+    def __len__(self) -> int:
+        return sum(len(block) for block in self.blocks.values())
+
+    @property
+    def shape(self) -> tuple:
+        return (len(self), len(self.columns))
+
+    @property
+    def dense(self) -> pd.DataFrame:
+        """
+        The dense AllSurveyData, built on first access
+        """
+        with self._dense_lock:
+            if self._dense is None:
+                self._dense = self.to_dataframe()
+            return self._dense
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Builds the dense AllSurveyData: NULL for the questions
+        outside each row's survey, rows ordered by UserId
+        then SurveyId, and the dtypes of the dense fetch (see
+        db_api.set_sql_answer_dtypes)
+        """
+        if not self.blocks:
+            return pd.DataFrame(columns=self.columns)
+
+        dense = pd.concat(self.blocks.values(), ignore_index=True, sort=False)
+        dense = dense.reindex(columns=self.columns)
+        dense = dense.sort_values(KEY_COLUMNS, kind="stable", ignore_index=True)
+        return db.set_sql_answer_dtypes(dense)
+
+    def memory_usage_bytes(self) -> int:
+        """
+        In-memory size of the blocks, not counting the dense view
+        """
+        return int(
+            sum(
+                block.memory_usage(index=False, deep=True).sum()
+                for block in self.blocks.values()
+            )
+        )
+
+    def get_hash_id(self) -> str:
+        """
+        Returns db_api.get_dataframe_hash_id of the dense
+        AllSurveyData, computed from the blocks without
+        building it
+        """
+        rows_sum = 0
+        for block in self.blocks.values():
+            rows_sum += db.get_dataframe_row_hashes_sum(block, self.columns)
+        return db.format_dataframe_hash_id(self.columns, len(self), rows_sum % 2**64)
+
+    def compact(self) -> SurveyBlocks:
+        """
+        Returns the blocks narrowed with db_api.get_compact_dataframe
+        """
+        return SurveyBlocks(
+            {
+                survey_id: db.get_compact_dataframe(block)
+                for survey_id, block in self.blocks.items()
+            },
+            self.columns,
+        )
+
+
+# FUNCTIONS
+def get_survey_block(
+    survey_rows: pd.DataFrame, survey_id, questions_in_survey_matrix: dict
+) -> pd.DataFrame:
+    """
+    Returns survey_rows, rows of survey_id in a dense AllSurveyData,
+    with only KEY_COLUMNS and the answer columns of the survey's
+    questions in questions_in_survey_matrix
+    """
+    block_columns = KEY_COLUMNS + [
+        f"{db.ANSWER_COLUMN_PREFIX}{question_id}"
+        for question_id, in_survey in questions_in_survey_matrix.get(survey_id, [])
+        if in_survey
+    ]
+    return survey_rows[
+        [column for column in block_columns if column in survey_rows.columns]
+    ].reset_index(drop=True)
+
+
+def get_dense_columns(questions_in_survey_matrix: dict) -> list:
+    """
+    Returns the columns of the dense AllSurveyData built
+    from questions_in_survey_matrix: KEY_COLUMNS, then one
+    answer column per question, ordered by QuestionId
+    """
+    question_ids = sorted(
+        {
+            question_id
+            for questions_in_survey in questions_in_survey_matrix.values()
+            for question_id, _ in questions_in_survey
+        }
+    )
+    return KEY_COLUMNS + [
+        f"{db.ANSWER_COLUMN_PREFIX}{question_id}" for question_id in question_ids
+    ]
+
+
+def pivot_long_format_answers_to_blocks(
+    answers: pd.DataFrame, questions_in_survey_matrix: dict
+) -> SurveyBlocks:
+    """
+    Same as db_api.pivot_long_format_answers, but builds each
+    survey's block directly, never allocating the NULL cells of
+    the questions outside the survey.
+    """
+    survey_ids = np.array(sorted(questions_in_survey_matrix), dtype=np.int64)
+    columns = get_dense_columns(questions_in_survey_matrix)
+
+    answer_survey_positions, known_survey = db.get_sorted_positions(
+        survey_ids, answers["SurveyId"].to_numpy(dtype=np.int64)
+    )
+
+    # Answers grouped by survey, so each survey's are a slice
+    order = np.argsort(answer_survey_positions[known_survey], kind="stable")
+    answer_survey_positions = answer_survey_positions[known_survey][order]
+    user_ids = answers["UserId"].to_numpy(dtype=np.int64)[known_survey][order]
+    question_ids_of_answers = answers["QuestionId"].to_numpy(dtype=np.int64)
+    answer_question_ids = question_ids_of_answers[known_survey][order]
+    answer_values = (
+        pd.to_numeric(answers["Answer_Value"])
+        .fillna(-1)
+        .to_numpy(dtype=np.float64)[known_survey][order]
+    )
+    boundaries = np.searchsorted(
+        answer_survey_positions, np.arange(len(survey_ids) + 1)
+    )
+
+    blocks = {}
+    for survey_position, (survey_id, questions_in_survey) in enumerate(
+        sorted(questions_in_survey_matrix.items())
+    ):
+        start, end = boundaries[survey_position], boundaries[survey_position + 1]
+        if start == end:
+            # Nobody answered the survey
+            continue
+
+        survey_question_ids = np.array(
+            sorted(
+                question_id
+                for question_id, in_survey in questions_in_survey
+                if in_survey
+            ),
+            dtype=np.int64,
+        )
+
+        # Every user who answered the survey has a row,
+        # even if only to questions outside it
+        row_user_ids, row_codes = np.unique(user_ids[start:end], return_inverse=True)
+        values = np.full((len(row_user_ids), len(survey_question_ids)), -1.0)
+
+        question_positions, in_survey = db.get_sorted_positions(
+            survey_question_ids, answer_question_ids[start:end]
+        )
+        values[row_codes[in_survey], question_positions[in_survey]] = answer_values[
+            start:end
+        ][in_survey]
+
+        block = pd.DataFrame(
+            values,
+            columns=[
+                f"{db.ANSWER_COLUMN_PREFIX}{question_id}"
+                for question_id in survey_question_ids
+            ],
+        )
+        block.insert(0, "SurveyId", np.full(len(row_user_ids), survey_id))
+        block.insert(0, "UserId", row_user_ids)
+        blocks[survey_id] = block
+
+    return SurveyBlocks(blocks, columns)
@@ -0,0 +1,68 @@
+# Standard Library Imports
+import os
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+# Add project root to sys.path
+sys.path.insert(0, PROJECT_ROOT)
+
+# Local Imports
+import DSTI_db_interface.db_backends as backends
+import DSTI_db_interface.db_connection as db_conn
+
+# 3rd party packages
+import pytest
+
+
+def is_db_server_configured() -> bool:
+    """
+    Tells whether config.ini or the DSTI_DB_BACKEND environment
+    variable say which database the tests should run against
+    """
+    return os.path.exists(db_conn.CONFIG_FILE_PATH) or bool(
+        os.environ.get(db_conn.BACKEND_ENVIRONMENT_VARIABLE)
+    )
+
+
+@pytest.fixture
+def make_sqlite_backend():
+    """
+    Returns a function creating a SQLiteBackend (or backend_class)
+    from its keyword arguments and making every connection come
+    from it. The backends are closed when the test ends.
+    """
+    created_backends = []
+
+    def make(backend_class=backends.SQLiteBackend, **kwargs):
+        backend = backend_class(**kwargs)
+        created_backends.append(backend)
+        db_conn.configure_backend(backend)
+        return backend
+
+    yield make
+
+    db_conn.configure_backend(None)
+    for backend in created_backends:
+        backend.close()
+
+
+@pytest.fixture
+def sqlite_backend(make_sqlite_backend):
+    """
+    A SQLiteBackend seeded with the sample survey data
+    """
+    return make_sqlite_backend()
+
+
+@pytest.fixture(autouse=True)
+def default_backend(request):
+    """
+    Runs every test against the sample SQLite database
+    unless a database server is configured
+    """
+    if is_db_server_configured():
+        yield None
+        return
+
+    yield request.getfixturevalue("make_sqlite_backend")()
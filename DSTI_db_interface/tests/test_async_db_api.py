@@ -0,0 +1,212 @@
+# Standard Library Imports
+import asyncio
+import os
+import sys
+import threading
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+# Add project root to sys.path
+sys.path.insert(0, PROJECT_ROOT)
+
+# Local Imports
+import DSTI_db_interface.async_db_api as adb
+import DSTI_db_interface.db_connection as dbconn
+
+# 3rd party packages
+import pandas as pd
+import pytest
+from unittest import mock
+
+
+class BlockingCursor:
+    """
+    Cursor whose execute blocks until cancel() is called
+    """
+
+    def __init__(self):
+        self.cancelled = threading.Event()
+        self.description = [("UserId",)]
+
+    def execute(self, qry):
+        self.cancelled.wait(timeout=5)
+        raise RuntimeError("Operation canceled")
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.cursor_obj = BlockingCursor()
+        self.released = threading.Event()
+
+    def cursor(self):
+        return self.cursor_obj
+
+    def rollback(self):
+        self.released.set()
+
+    def close(self):
+        pass
+
+
+def test_non_permitted_query_raises():
+    with pytest.raises(adb.db.NonPermittedQuery):
+        asyncio.run(adb.run_sql_select_query("DELETE FROM Answer"))
+
+
+def test_params_and_compact_are_passed_through(sqlite_backend):
+    df = asyncio.run(
+        adb.run_sql_select_query(
+            "SELECT UserId FROM [User] WHERE UserId > ?",
+            params=(3,),
+            use_cache=False,
+            compact=True,
+        )
+    )
+
+    assert df["UserId"].tolist() == [4, 5]
+    assert df["UserId"].dtype == "int8"
+
+
+@pytest.mark.parametrize("fetch_mode", ["single", "parallel", "client_pivot"])
+def test_get_all_survey_data_same_as_sync(sqlite_backend, fetch_mode):
+    """
+    The async fetch takes the same options as
+    db_api.get_all_survey_data and returns the same result
+    """
+    blocks = asyncio.run(
+        adb.get_all_survey_data(
+            update_view=False, fetch_mode=fetch_mode, compact=True, blocked=True
+        )
+    )
+    expected = adb.db.get_all_survey_data(
+        update_view=False, fetch_mode=fetch_mode, compact=True, blocked=True
+    )
+
+    assert isinstance(blocks, adb.db.survey_blocks.SurveyBlocks)
+    pd.testing.assert_frame_equal(blocks.dense, expected.dense)
+
+
+def test_structure_lookups_run_concurrently():
+    """
+    The Survey, Question and SurveyStructure lookups overlap
+    instead of running one after the other
+    """
+    adb.configure(max_workers=3)
+
+    def slow(result):
+        def lookup():
+            time.sleep(0.2)
+            return result
+
+        return lookup
+
+    with mock.patch.object(adb.q, "get_survey_ids", slow([1])), mock.patch.object(
+        adb.q, "get_question_ids", slow([1, 2])
+    ), mock.patch.object(
+        adb.q,
+        "get_survey_structure",
+        slow(pd.DataFrame({"SurveyId": [1], "QuestionId": [2]})),
+    ):
+        start = time.perf_counter()
+        matrix = asyncio.run(adb.get_live_questions_in_survey_matrix())
+        elapsed = time.perf_counter() - start
+
+    assert matrix == {1: [(1, 0), (2, 1)]}
+    assert elapsed < 0.5
+
+
+def test_concurrency_limit():
+    """
+    No more than max_concurrent_queries calls run at once
+    """
+    adb.configure(max_workers=4, max_concurrent_queries=2)
+    running = {"now": 0, "max": 0}
+    lock = threading.Lock()
+
+    def work():
+        with lock:
+            running["now"] += 1
+            running["max"] = max(running["max"], running["now"])
+        time.sleep(0.05)
+        with lock:
+            running["now"] -= 1
+
+    async def main():
+        await asyncio.gather(*[adb.run_blocking(work) for _ in range(6)])
+
+    asyncio.run(main())
+    assert running["max"] == 2
+
+
+def test_cancel_cancels_statement_and_releases_connection():
+    """
+    Cancelling the task cancels the running statement and the
+    connection is handed back to the pool afterwards
+    """
+    adb.configure(max_workers=2)
+    connection = FakeConnection()
+    pool = dbconn.ConnectionPool(
+        connect=lambda conn_str: connection, liveness_check=False
+    )
+
+    async def main():
+        task = asyncio.ensure_future(
+            adb.read_sql_cancellable("SELECT UserId FROM [User]")
+        )
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    with mock.patch.object(adb, "get_connection_pool", return_value=pool):
+        asyncio.run(main())
+
+    assert connection.cursor_obj.cancelled.is_set()
+    assert connection.released.wait(timeout=5)
+
+
+def test_cancel_while_acquiring_releases_connection():
+    """
+    A connection acquired after the task was cancelled
+    is handed back to the pool once it arrives
+    """
+    adb.configure(max_workers=2)
+    connection = FakeConnection()
+    connection_ready = threading.Event()
+
+    def connect(conn_str):
+        connection_ready.wait(timeout=5)
+        return connection
+
+    pool = dbconn.ConnectionPool(connect=connect, liveness_check=False)
+
+    async def main():
+        task = asyncio.ensure_future(
+            adb.read_sql_cancellable("SELECT UserId FROM [User]")
+        )
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        connection_ready.set()
+
+    with mock.patch.object(adb, "get_connection_pool", return_value=pool):
+        asyncio.run(main())
+
+    assert connection.released.wait(timeout=5)
+    assert not connection.cursor_obj.cancelled.is_set()
+
+
+def test_project_root_in_path():
+    """
+    Ensure that the project root has been correctly added
+    to the Python import path sys.path
+    """
+    assert PROJECT_ROOT in sys.path
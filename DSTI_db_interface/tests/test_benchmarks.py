@@ -0,0 +1,78 @@
+# Standard Library Imports
+import json
+import os
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+# Add project root to sys.path
+sys.path.insert(0, PROJECT_ROOT)
+
+# Local Imports
+import DSTI_db_interface.benchmarks as bench
+
+
+def test_generate_survey_data_is_reproducible():
+    """
+    The same seed gives the same dataset, within the requested sizes
+    """
+    data = bench.generate_survey_data(users=50, surveys=4, questions_per_survey=3)
+
+    assert data == bench.generate_survey_data(
+        users=50, surveys=4, questions_per_survey=3
+    )
+    assert len(data["User"]) == 50
+    assert len(data["Survey"]) == 4
+    assert len(data["SurveyStructure"]) == 4 * 3
+
+    survey_structure = {(row[0], row[1]) for row in data["SurveyStructure"]}
+    assert all((row[1], row[0]) in survey_structure for row in data["Answer"])
+
+
+def test_answer_density_scales_answers():
+    sparse = bench.generate_survey_data(users=200, answer_density=0.2)
+    dense = bench.generate_survey_data(users=200, answer_density=0.9)
+    assert len(sparse["Answer"]) < len(dense["Answer"])
+
+
+def test_run_benchmark_records_every_phase(tmp_path):
+    """
+    Each phase is timed on every repetition and the
+    result is saved as one line of JSON
+    """
+    result = bench.run_benchmark(users=20, surveys=3, questions_per_survey=2, repeat=2)
+    filepath = tmp_path / "results.jsonl"
+    bench.save_benchmark_result(result, str(filepath))
+    bench.save_benchmark_result(result, str(filepath))
+
+    assert list(result["phases"]) == list(bench.PHASES)
+    assert all(len(phase["seconds"]) == 2 for phase in result["phases"].values())
+    assert result["result"]["rows"] > 0
+    # One parameterized statement per survey and repetition
+    assert result["statements"]["executions"] == 3 * 2
+    assert 0 < result["statements"]["prepares"] <= 3 * 2
+
+    lines = filepath.read_text().splitlines()
+    assert len(lines) == 2
+    assert json.loads(lines[0])["parameters"]["users"] == 20
+
+
+def test_importing_package_loads_no_heavy_library():
+    """
+    pandas and the database drivers are only imported on first use
+    """
+    result = bench.run_import_time_benchmark(
+        modules=["DSTI_db_interface.cli_user_interface"], repeat=1
+    )
+
+    timing = result["imports"]["DSTI_db_interface.cli_user_interface"]
+    assert timing["heavy_libraries_loaded"] == []
+    assert len(timing["seconds"]) == 1
+
+
+def test_project_root_in_path():
+    """
+    Ensure that the project root has been correctly added
+    to the Python import path sys.path
+    """
+    assert PROJECT_ROOT in sys.path
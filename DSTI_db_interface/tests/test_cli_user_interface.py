@@ -9,9 +9,11 @@ sys.path.insert(0, PROJECT_ROOT)
 
 # Local Imports
 import DSTI_db_interface.cli_user_interface as cli_user_interface
+import DSTI_db_interface.db_connection as db_conn
 
 # 3rd party packages
 import pytest
+from unittest import mock
 
 # SHARED_VARIABLES
 
@@ -23,6 +25,85 @@ def test_instantiate_cli():
     assert "UserCLI" in cli_user_interface.__dict__
 
 
+@pytest.fixture
+def sqlite_backend(sqlite_backend, tmp_path):
+    checkpoint_path = tmp_path / "checkpoint.txt"
+    with mock.patch.object(
+        cli_user_interface.db, "CHECKPOINT_PATH", str(checkpoint_path)
+    ), mock.patch("builtins.input", side_effect=AssertionError("prompted")):
+        yield checkpoint_path
+
+
+def test_batch_export_without_prompts(sqlite_backend, tmp_path):
+    output = tmp_path / "survey_data.csv"
+
+    exit_code = cli_user_interface.run_batch_command(
+        ["--quiet", "export", "--output", str(output), "--update-view"]
+    )
+
+    assert exit_code == cli_user_interface.EXIT_SUCCESS
+    assert len(output.read_text().splitlines()) == 1 + 5
+    assert sqlite_backend.read_text()
+
+
+def test_batch_refresh_view(sqlite_backend):
+    exit_code = cli_user_interface.run_batch_command(
+        ["refresh-view", "--checkpoint-mode", "structure"]
+    )
+
+    assert exit_code == cli_user_interface.EXIT_SUCCESS
+    assert sqlite_backend.read_text().startswith("structure:")
+
+
+def test_batch_query_from_file(sqlite_backend, tmp_path):
+    query_file = tmp_path / "query.sql"
+    query_file.write_text("SELECT * FROM [User]")
+    output = tmp_path / "users.csv"
+
+    exit_code = cli_user_interface.run_batch_command(
+        ["query", "--query-file", str(query_file), "--output", str(output)]
+    )
+
+    assert exit_code == cli_user_interface.EXIT_SUCCESS
+    assert output.exists()
+
+
+BATCH_FAILURES = [
+    (["query", "--sql", "DELETE FROM Answer"], "EXIT_NON_PERMITTED_QUERY"),
+    (["query", "--sql", "SELECT * FROM [User]"], "EXIT_USAGE_ERROR"),
+    (
+        ["query", "--sql", "SELECT * FROM Nope", "--output", "{tmp}/x.csv"],
+        "EXIT_FAILURE",
+    ),
+    (["export", "--output", "{tmp}/missing/x.csv"], "EXIT_USAGE_ERROR"),
+    (["export", "--output", "{tmp}/x.txt"], "EXIT_USAGE_ERROR"),
+]
+
+
+@pytest.mark.parametrize("argv, expected_exit_code", BATCH_FAILURES)
+def test_batch_failures_exit_codes(sqlite_backend, tmp_path, argv, expected_exit_code):
+    argv = [arg.format(tmp=tmp_path) for arg in argv]
+    exit_code = cli_user_interface.run_batch_command(argv)
+    assert exit_code == getattr(cli_user_interface, expected_exit_code)
+
+
+def test_batch_connection_failure_exit_code():
+    with mock.patch.object(
+        cli_user_interface.db,
+        "update_vw_AllSurveyData_if_obsolete",
+        side_effect=db_conn.DBConnectionFailed,
+    ):
+        exit_code = cli_user_interface.run_batch_command(["refresh-view"])
+
+    assert exit_code == cli_user_interface.EXIT_DB_CONNECTION_FAILED
+
+
+def test_batch_usage_error_exits():
+    with pytest.raises(SystemExit) as exit_info:
+        cli_user_interface.run_batch_command(["export"])
+    assert exit_info.value.code == cli_user_interface.EXIT_USAGE_ERROR
+
+
 def test_project_root_in_path():
     """
     Ensure that the project root has been correctly added
@@ -1,5 +1,6 @@
 # Standard Library Imports
 import os
+import sqlite3
 import sys
 
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
@@ -9,11 +10,13 @@ sys.path.insert(0, PROJECT_ROOT)
 
 # Local Imports
 import DSTI_db_interface.db_api as db
-from DSTI_db_interface.db_connection import provide_db_connection
+import DSTI_db_interface.db_backends as backends
+from DSTI_db_interface.db_connection import provide_db_connection, render_sql
 
 # 3rd party packages
 import pandas as pd
 import pytest
+from unittest import mock
 
 # SHARED_VARIABLES
 DF_1 = pd.DataFrame({"A": 1, "B": 2, "C": 3}, index=(1, 2, 3))
@@ -61,10 +64,571 @@ def test_run_sql_select_query_returns_df(connection=None):
     table = "[dbo].[User]"
     qry = f"SELECT * FROM {table}"
 
-    df = pd.read_sql(qry, connection)
+    df = pd.read_sql(render_sql(qry), connection)
     assert isinstance(df, pd.DataFrame)
 
 
+STRUCTURE_1 = {1: [(1, 1), (2, 0)], 2: [(1, 0), (2, 1)]}
+STRUCTURE_2 = {1: [(1, 1), (2, 1)], 2: [(1, 0), (2, 1)]}
+
+
+def test_survey_structure_hash_id():
+    """
+    The structure hash is stable for a given structure,
+    changes with it, and is never a bare data hash
+    """
+    hash_1 = db.get_survey_structure_hash_id(STRUCTURE_1)
+
+    assert hash_1 == db.get_survey_structure_hash_id(dict(STRUCTURE_1))
+    assert hash_1 != db.get_survey_structure_hash_id(STRUCTURE_2)
+    assert hash_1.startswith(db.STRUCTURE_CHECKPOINT_PREFIX)
+
+
+def test_structure_checkpoint_recreates_view_only_on_change(tmp_path):
+    """
+    In structure mode the view is recreated on first run and when
+    the structure changes, without downloading AllSurveyData
+    """
+    live_structure = {"matrix": STRUCTURE_1}
+
+    with mock.patch.object(
+        db, "CHECKPOINT_PATH", str(tmp_path / "checkpoint.txt")
+    ), mock.patch.object(
+        db.q,
+        "get_live_questions_in_survey_matrix",
+        side_effect=lambda: live_structure["matrix"],
+    ), mock.patch.object(
+        db, "get_all_survey_data"
+    ) as get_all_survey_data, mock.patch.object(
+        db, "drop_vw_AllSurveyData"
+    ), mock.patch.object(
+        db, "create_vw_AllSurveyData"
+    ) as create_view:
+
+        db.update_vw_AllSurveyData_if_obsolete(checkpoint_mode="structure")
+        db.update_vw_AllSurveyData_if_obsolete(checkpoint_mode="structure")
+        assert create_view.call_count == 1
+
+        live_structure["matrix"] = STRUCTURE_2
+        db.update_vw_AllSurveyData_if_obsolete(checkpoint_mode="structure")
+        assert create_view.call_count == 2
+
+        get_all_survey_data.assert_not_called()
+
+
+def test_checksum_checkpoint_catches_answer_changes(sqlite_backend, tmp_path):
+    """
+    Checksums computed by the database detect a changed answer,
+    without AllSurveyData ever being downloaded
+    """
+    with mock.patch.object(
+        db, "CHECKPOINT_PATH", str(tmp_path / "checkpoint.txt")
+    ), mock.patch.object(db, "get_all_survey_data") as get_all_survey_data:
+
+        assert db.update_vw_AllSurveyData_if_obsolete(checkpoint_mode="checksum")
+        assert not db.update_vw_AllSurveyData_if_obsolete(checkpoint_mode="checksum")
+
+        connection = sqlite_backend.connect()
+        connection.execute(
+            "UPDATE Answer SET Answer_Value = 6 WHERE UserId = 1 AND QuestionId = 1"
+        )
+        connection.commit()
+        connection.close()
+
+        assert db.update_vw_AllSurveyData_if_obsolete(checkpoint_mode="checksum")
+        checkpoint = (tmp_path / "checkpoint.txt").read_text()
+
+    get_all_survey_data.assert_not_called()
+
+    assert checkpoint.startswith(db.CHECKSUM_CHECKPOINT_PREFIX)
+    assert not db.is_legacy_dataframe_hash_id(checkpoint)
+
+
+def test_unknown_checkpoint_mode_raises():
+    with pytest.raises(db.UnknownCheckpointMode):
+        db.update_vw_AllSurveyData_if_obsolete(checkpoint_mode="everything")
+
+
+def test_dataframe_hash_id_ignores_row_order():
+    """
+    Shuffling rows or changing the index does not change the hash
+    """
+    shuffled = DF_1.iloc[::-1].reset_index(drop=True)
+    assert db.get_dataframe_hash_id(DF_1) == db.get_dataframe_hash_id(shuffled)
+
+
+def test_dataframe_hash_id_changes_with_content():
+    """
+    Different values or columns give a different hash
+    """
+    renamed = DF_1.rename(columns={"A": "Z"})
+    assert db.get_dataframe_hash_id(DF_1) != db.get_dataframe_hash_id(DF_2)
+    assert db.get_dataframe_hash_id(DF_1) != db.get_dataframe_hash_id(renamed)
+    assert db.get_dataframe_hash_id(DF_1).startswith(db.DATAFRAME_HASH_PREFIX)
+
+
+def test_legacy_checkpoint_migrated_without_recreating_view(tmp_path):
+    """
+    A checkpoint in the former to_string() md5 format matching the
+    live data is rewritten in the new format, and the view is kept
+    """
+    checkpoint_path = tmp_path / "checkpoint.txt"
+    live_survey_data = pd.DataFrame({"UserId": [2, 1], "SurveyId": [1, 1]})
+    checkpoint_path.write_text(db.get_legacy_dataframe_hash_id(live_survey_data))
+
+    with mock.patch.object(
+        db, "CHECKPOINT_PATH", str(checkpoint_path)
+    ), mock.patch.object(db, "drop_vw_AllSurveyData"), mock.patch.object(
+        db, "create_vw_AllSurveyData"
+    ) as create_view:
+
+        db.update_vw_AllSurveyData_if_obsolete(
+            live_survey_data=live_survey_data, checkpoint_mode="data"
+        )
+
+    create_view.assert_not_called()
+    assert checkpoint_path.read_text() == db.get_dataframe_hash_id(live_survey_data)
+
+
+def test_export_sql_select_query_streams_whole_result(tmp_path):
+    """
+    Exporting in small chunks writes the same rows, and computes
+    the same hash, as reading the whole result set at once
+    """
+    connection = sqlite3.connect(":memory:")
+    connection.executescript(
+        """
+        CREATE TABLE Answer (UserId INTEGER, SurveyId INTEGER, Answer_Value INTEGER);
+        INSERT INTO Answer VALUES (1, 1, 5), (2, 1, NULL), (3, 2, 7), (4, 2, 1), (5, 3, 2);
+        """
+    )
+    qry = "SELECT * FROM Answer"
+    filepath = tmp_path / "export.csv"
+
+    # Call the undecorated function with our own connection
+    export_summary = db.export_sql_select_query.__wrapped__(
+        qry,
+        filepath=str(filepath),
+        chunksize=2,
+        report_progress=False,
+        connection=connection,
+    )
+
+    df = pd.read_sql(qry, connection)
+    assert export_summary["rows"] == 5
+    assert export_summary["hash_id"] == db.get_dataframe_hash_id(df)
+    assert filepath.read_text() == df.astype({"Answer_Value": "Int64"}).to_csv()
+    pd.testing.assert_frame_equal(pd.read_csv(filepath, index_col=0), df)
+
+
+def test_failed_export_keeps_previous_file(tmp_path):
+    """
+    An export failing after some chunks were written leaves
+    neither a truncated file nor its temporary file behind
+    """
+    connection = sqlite3.connect(":memory:")
+    connection.executescript(
+        """
+        CREATE TABLE Answer (UserId INTEGER, Answer_Value INTEGER);
+        INSERT INTO Answer VALUES (1, 5), (2, 3), (3, 7);
+        """
+    )
+    filepath = tmp_path / "export.csv"
+    filepath.write_text("previous export")
+
+    with mock.patch.object(
+        db, "record_fetched_dataframe", side_effect=[None, RuntimeError("lost")]
+    ):
+        export_summary = db.export_sql_select_query.__wrapped__(
+            "SELECT * FROM Answer",
+            filepath=str(filepath),
+            chunksize=2,
+            report_progress=False,
+            connection=connection,
+        )
+
+    assert export_summary is None
+    assert filepath.read_text() == "previous export"
+    assert os.listdir(tmp_path) == ["export.csv"]
+
+
+PREVIOUS_SURVEY_DATA = pd.DataFrame(
+    {
+        "UserId": [1, 1, 2, 3],
+        "SurveyId": [1, 2, 1, 1],
+        "ANS_Q1": [5, None, 3, 4],
+        "ANS_Q2": [None, 2, -1, 1],
+    }
+)
+
+# User 2 changed an answer, user 3 left, user 4 is new
+LIVE_SURVEY_DATA = pd.DataFrame(
+    {
+        "UserId": [4, 2, 1, 1],
+        "SurveyId": [1, 1, 2, 1],
+        "ANS_Q1": [1, 3, None, 5],
+        "ANS_Q2": [1, 6, 2, None],
+    }
+)
+
+
+def test_survey_data_delta():
+    """
+    Only inserted, changed and deleted rows are
+    returned, each flagged with its change type
+    """
+    previous_index = db.get_row_hash_index(PREVIOUS_SURVEY_DATA)
+
+    delta, live_index = db.get_survey_data_delta(LIVE_SURVEY_DATA, previous_index)
+
+    changes = {(row.UserId, row.SurveyId): row.ChangeType for row in delta.itertuples()}
+    assert changes == {(4, 1): "insert", (2, 1): "update", (3, 1): "delete"}
+    assert len(live_index) == len(LIVE_SURVEY_DATA)
+
+
+def test_survey_data_delta_without_previous_index():
+    """
+    On the first run every row is an insert
+    """
+    delta, _ = db.get_survey_data_delta(LIVE_SURVEY_DATA)
+    assert (delta[db.CHANGE_TYPE_COLUMN] == "insert").all()
+    assert len(delta) == len(LIVE_SURVEY_DATA)
+
+
+def test_merge_survey_data_delta_matches_full_export(tmp_path):
+    """
+    Merging the delta into the previous export gives
+    the same rows as a full export of the live data
+    """
+    filepath = tmp_path / "all_survey_data.csv"
+    PREVIOUS_SURVEY_DATA.to_csv(filepath)
+    delta, _ = db.get_survey_data_delta(
+        LIVE_SURVEY_DATA, db.get_row_hash_index(PREVIOUS_SURVEY_DATA)
+    )
+
+    db.merge_survey_data_delta(str(filepath), delta)
+
+    key = ["UserId", "SurveyId"]
+    merged = pd.read_csv(filepath, index_col=0).sort_values(key)
+    expected = LIVE_SURVEY_DATA.sort_values(key)
+    pd.testing.assert_frame_equal(
+        merged.reset_index(drop=True),
+        expected.reset_index(drop=True),
+        check_dtype=False,
+    )
+
+
+def test_failed_fetch_keeps_row_hash_index(tmp_path):
+    """
+    When AllSurveyData cannot be fetched, no delta is written
+    and the row hash index of the last run is kept
+    """
+    index_path = tmp_path / "row_hash_index.csv"
+    filepath = tmp_path / "delta.csv"
+    db.get_row_hash_index(PREVIOUS_SURVEY_DATA).to_csv(index_path, index=False)
+    previous_index = index_path.read_text()
+
+    with mock.patch.object(
+        db, "ROW_HASH_INDEX_PATH", str(index_path)
+    ), mock.patch.object(db, "get_all_survey_data", return_value=None):
+        assert db.get_all_survey_data_delta() is None
+        assert db.export_all_survey_data_delta(str(filepath)) is None
+
+    assert index_path.read_text() == previous_index
+    assert not filepath.exists()
+
+
+def test_parallel_fetch_concatenates_in_user_order():
+    """
+    Per-survey results are concatenated ordered by UserId, and
+    a failed survey query fails the whole fetch
+    """
+    survey_queries = {1: ("SELECT ?", (1,)), 2: ("SELECT ?", (2,))}
+    survey_results = {
+        (1,): LIVE_SURVEY_DATA[LIVE_SURVEY_DATA["SurveyId"] == 1],
+        (2,): LIVE_SURVEY_DATA[LIVE_SURVEY_DATA["SurveyId"] == 2],
+    }
+
+    with mock.patch.object(
+        db.q,
+        "get_per_survey_queries_to_update_vw_AllSurveyData",
+        return_value=survey_queries,
+    ), mock.patch.object(
+        db,
+        "run_sql_select_query",
+        side_effect=lambda qry, params, **_: survey_results[params],
+    ):
+        df = db.get_all_survey_data_in_parallel(fetch_workers=2)
+
+    assert list(zip(df["UserId"], df["SurveyId"])) == [(1, 1), (1, 2), (2, 1), (4, 1)]
+
+    with mock.patch.object(
+        db.q,
+        "get_per_survey_queries_to_update_vw_AllSurveyData",
+        return_value=survey_queries,
+    ), mock.patch.object(db, "run_sql_select_query", return_value=None):
+        assert db.get_all_survey_data_in_parallel(fetch_workers=2) is None
+
+
+def test_parallel_fetch_has_same_hash_as_single_query():
+    """
+    Answer columns all NULL in one survey come back as object, the
+    concatenation gives them back the single query's dtype, so
+    switching fetch_mode does not make the data checkpoint obsolete
+    """
+    survey_queries = {1: ("SELECT ?", (1,)), 2: ("SELECT ?", (2,))}
+    survey_results = {
+        (1,): pd.DataFrame(
+            {"UserId": [1], "SurveyId": [1], "ANS_Q1": [5], "ANS_Q2": [None]}
+        ),
+        (2,): pd.DataFrame(
+            {"UserId": [2], "SurveyId": [2], "ANS_Q1": [None], "ANS_Q2": [7]}
+        ),
+    }
+    single = pd.DataFrame(
+        {"UserId": [1, 2], "SurveyId": [1, 2], "ANS_Q1": [5, None], "ANS_Q2": [None, 7]}
+    )
+
+    with mock.patch.object(
+        db.q,
+        "get_per_survey_queries_to_update_vw_AllSurveyData",
+        return_value=survey_queries,
+    ), mock.patch.object(
+        db,
+        "run_sql_select_query",
+        side_effect=lambda qry, params, **_: survey_results[params],
+    ):
+        parallel = db.get_all_survey_data_in_parallel(fetch_workers=2)
+
+    assert parallel["ANS_Q2"].dtype == single["ANS_Q2"].dtype
+    assert db.get_dataframe_hash_id(parallel) == db.get_dataframe_hash_id(single)
+
+
+@pytest.mark.parametrize(
+    "query_generator", ["correlated_subqueries", "conditional_aggregation"]
+)
+def test_client_pivot_equivalent_to_sql_pivot(make_sqlite_backend, query_generator):
+    """
+    Pivoting the long format answers in memory gives the same
+    AllSurveyData as the generated SQL, including NULL vs -1
+    cells, NULL answers and answers the SQL ignores
+    """
+    survey_data = dict(backends.SAMPLE_SURVEY_DATA)
+    survey_data["Answer"] = survey_data["Answer"] + [
+        (1, 3, 5, None),  # NULL answer
+        (3, 1, 3, 9),  # question 3 is not in survey 1
+        (1, 1, 6, 2),  # user 6 is not in [User]
+        (1, 4, 1, 2),  # survey 4 is not in Survey
+        (2, 2, 7, None),  # user 7 only has a NULL answer
+    ]
+    survey_data["User"] = survey_data["User"] + [(7, "User 7", "user7@example.com")]
+
+    make_sqlite_backend(survey_data=survey_data)
+    sql_pivot = db.get_all_survey_data(
+        update_view=False, query_generator=query_generator, fetch_mode="single"
+    )
+    client_pivot = db.get_all_survey_data(update_view=False, fetch_mode="client_pivot")
+
+    key = ["UserId", "SurveyId"]
+    assert list(client_pivot.columns) == list(sql_pivot.columns)
+    pd.testing.assert_frame_equal(
+        client_pivot, sql_pivot.sort_values(key, ignore_index=True)
+    )
+    assert db.get_dataframe_hash_id(client_pivot) == db.get_dataframe_hash_id(sql_pivot)
+    assert len(client_pivot) == 8
+
+
+def test_column_partitions_split_views_and_rejoin(sqlite_backend, tmp_path):
+    """
+    Past max_view_columns, the columns are split across several
+    views and fetches, and rejoined into the same AllSurveyData
+    """
+    whole = db.get_all_survey_data(update_view=False)
+
+    with mock.patch.object(db.q, "DEFAULT_MAX_VIEW_COLUMNS", 4):
+        partitioned = db.get_all_survey_data(update_view=False)
+        db.drop_vw_AllSurveyData()
+        db.create_vw_AllSurveyData()
+        partition_views = db.run_sql_select_query(
+            db.q.get_partition_views_qry("sqlite"), use_cache=False
+        )
+
+    # Back to a single view, the partitions are dropped
+    db.drop_vw_AllSurveyData()
+    db.create_vw_AllSurveyData()
+    views_after = db.run_sql_select_query(
+        db.q.get_partition_views_qry("sqlite"), use_cache=False
+    )
+
+    assert sorted(partition_views["name"]) == [
+        "vw_AllSurveyData_Part1",
+        "vw_AllSurveyData_Part2",
+    ]
+    assert views_after.empty
+    assert list(partitioned.columns) == list(whole.columns)
+    assert db.get_dataframe_hash_id(partitioned) == db.get_dataframe_hash_id(whole)
+
+
+def test_join_column_partitions_with_different_rows():
+    """
+    A row added between two partition queries is kept,
+    with NULL for the columns of the partition missing it
+    """
+    first = pd.DataFrame({"UserId": [2, 1], "SurveyId": [1, 1], "ANS_Q1": [4, 5]})
+    second = pd.DataFrame(
+        {"UserId": [1, 2, 3], "SurveyId": [1, 1, 1], "ANS_Q2": [3, -1, 6]}
+    )
+
+    joined = db.join_column_partitions([first, second])
+
+    assert list(joined.columns) == ["UserId", "SurveyId", "ANS_Q1", "ANS_Q2"]
+    assert joined["UserId"].tolist() == [1, 2, 3]
+    assert joined["ANS_Q1"].isna().tolist() == [False, False, True]
+
+
+def test_client_pivot_has_sql_dtypes():
+    """
+    Answer columns get the dtypes of the AllSurveyData query:
+    int64 without NULLs, float64 with some, None if all NULL
+    """
+    answers = pd.DataFrame(
+        [(1, 1, 1, 5), (2, 2, 1, None)],
+        columns=["UserId", "SurveyId", "QuestionId", "Answer_Value"],
+    )
+    questions_in_survey_matrix = {1: [(1, 1), (2, 1), (3, 0)], 2: [(1, 1), (2, 0)]}
+
+    df = db.pivot_long_format_answers(answers, questions_in_survey_matrix)
+
+    assert df.dtypes.astype(str).to_dict() == {
+        "UserId": "int64",
+        "SurveyId": "int64",
+        "ANS_Q1": "int64",
+        "ANS_Q2": "float64",
+        "ANS_Q3": "object",
+    }
+    assert df["ANS_Q1"].tolist() == [5, -1]
+    assert df["ANS_Q3"].tolist() == [None, None]
+
+
+@pytest.mark.parametrize("answer_value", [5, 300, 70000])
+def test_compact_client_pivot_same_as_narrowed_pivot(answer_value):
+    """
+    Pivoting into narrow integers gives the same
+    DataFrame as narrowing the float64 pivot
+    """
+    answers = pd.DataFrame(
+        [(1, 1, 1, answer_value), (2, 2, 1, None), (3, 1, 2, 4)],
+        columns=["UserId", "SurveyId", "QuestionId", "Answer_Value"],
+    )
+    questions_in_survey_matrix = {1: [(1, 1), (2, 1), (3, 0)], 2: [(1, 1), (2, 0)]}
+
+    compact = db.pivot_long_format_answers(
+        answers, questions_in_survey_matrix, compact=True
+    )
+    expected = db.get_compact_dataframe(
+        db.pivot_long_format_answers(answers, questions_in_survey_matrix)
+    )
+
+    pd.testing.assert_frame_equal(compact, expected)
+    assert db.get_dataframe_hash_id(compact) == db.get_dataframe_hash_id(expected)
+
+
+def test_compact_fetch_narrows_each_chunk():
+    """
+    Chunks are narrowed as they arrive, the widest dtype wins,
+    and the hash is the same as without compact dtypes
+    """
+    connection = sqlite3.connect(":memory:")
+    connection.executescript(
+        """
+        CREATE TABLE AllSurveyData (UserId INTEGER, SurveyId INTEGER, ANS_Q1 INTEGER, ANS_Q2 INTEGER, Label TEXT);
+        INSERT INTO AllSurveyData VALUES
+            (1, 1, 5, NULL, 'a'), (2, 1, -1, NULL, 'b'), (3, 1, 300, NULL, 'c'),
+            (40000, 2, NULL, NULL, 'd'), (5, 2, 7, NULL, 'e');
+        """
+    )
+    qry = "SELECT * FROM AllSurveyData"
+
+    default_df = db._run_sql_select_query.__wrapped__(qry, connection=connection)
+    with mock.patch.object(db, "DEFAULT_COMPACT_FETCH_CHUNKSIZE", 2):
+        compact_df = db._run_sql_select_query.__wrapped__(
+            qry, compact=True, connection=connection
+        )
+
+    assert compact_df.dtypes.astype(str).to_dict() == {
+        "UserId": "int32",
+        "SurveyId": "int8",
+        "ANS_Q1": "Int16",
+        "ANS_Q2": "Int8",
+        "Label": default_df["Label"].dtype.name,
+    }
+    assert compact_df["ANS_Q1"].isna().tolist() == [False, False, False, True, False]
+    assert db.get_dataframe_hash_id(compact_df) == db.get_dataframe_hash_id(default_df)
+    assert 0 < db.get_compact_dtypes_bytes_saved(compact_df) < 8 * 5 * 4
+
+
+def test_compact_dtype_rejects_fractions():
+    assert db.get_compact_dtype(pd.Series([1.5, 2.0])) is None
+    assert db.get_compact_dtype(pd.Series([1.0, None])) == "Int8"
+    assert db.get_compact_dtype(pd.Series([None, None], dtype=object)) is None
+    assert (
+        db.get_compact_dtype(pd.Series([None, None], dtype=object), nullable=True)
+        == "Int8"
+    )
+
+
+class CachedSQLiteBackend(backends.SQLiteBackend):
+    cache_results = True
+
+
+def test_pipeline_queries_bypass_result_cache(make_sqlite_backend, tmp_path):
+    """
+    With the result cache enabled, changed answers and survey
+    structure still show in AllSurveyData, only explicit queries
+    are cached, and those reading the structure tables are dropped
+    when the structure checkpoint sees it change
+    """
+    cache_settings = {
+        "enabled": True,
+        "directory": str(tmp_path / "result_cache"),
+        "max_size_bytes": 1024 * 1024,
+        "default_ttl": 3600,
+    }
+    structure_qry = "SELECT * FROM SurveyStructure"
+
+    backend = make_sqlite_backend(CachedSQLiteBackend)
+    with mock.patch.object(
+        db.result_cache, "get_result_cache_settings", return_value=cache_settings
+    ), mock.patch.object(db, "CHECKPOINT_PATH", str(tmp_path / "checkpoint.txt")):
+
+        assert db.result_cache.is_result_cache_enabled()
+        db.update_vw_AllSurveyData_if_obsolete(checkpoint_mode="structure")
+        db.run_sql_select_query(structure_qry)
+        survey_data = db.get_all_survey_data(update_view=False)
+
+        connection = backend.connect()
+        connection.execute("INSERT INTO Answer VALUES (1, 3, 5, 9)")
+        connection.commit()
+        answer_changed = db.get_all_survey_data(update_view=False)
+
+        cache = db.result_cache.get_result_cache()
+        assert cache.get(structure_qry) is not None
+        assert cache.get("SELECT SurveyId, QuestionId FROM SurveyStructure") is None
+
+        connection.execute("INSERT INTO SurveyStructure VALUES (3, 4, 2)")
+        connection.commit()
+        connection.close()
+        structure_changed = db.get_all_survey_data(update_view=False)
+
+        assert cache.get(structure_qry) is None
+        assert db.update_vw_AllSurveyData_if_obsolete(checkpoint_mode="structure")
+
+    assert len(answer_changed) == len(survey_data) + 1
+    assert db.get_dataframe_hash_id(answer_changed) != db.get_dataframe_hash_id(
+        structure_changed
+    )
+
+
 def test_project_root_in_path():
     """
     Ensure that the project root has been correctly added
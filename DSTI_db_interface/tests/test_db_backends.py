@@ -0,0 +1,113 @@
+# Standard Library Imports
+import os
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+# Add project root to sys.path
+sys.path.insert(0, PROJECT_ROOT)
+
+# Local Imports
+import DSTI_db_interface.db_api as db
+import DSTI_db_interface.db_backends as backends
+import DSTI_db_interface.metrics as metrics
+
+# 3rd party packages
+import pandas as pd
+import pytest
+from unittest import mock
+
+# SHARED_VARIABLES
+RENDERED_QUERIES = [
+    ("SELECT * FROM [dbo].[User]", 'SELECT * FROM "User"'),
+    (
+        "DROP VIEW IF EXISTS [dbo].[vw_AllSurveyData]",
+        'DROP VIEW IF EXISTS "vw_AllSurveyData"',
+    ),
+    (
+        "SELECT '[dbo].[User]' AS t FROM [User]",
+        "SELECT '[dbo].[User]' AS t FROM \"User\"",
+    ),
+]
+
+
+@pytest.mark.parametrize("qry, expected", RENDERED_QUERIES)
+def test_render_sql_for_sqlite(qry, expected):
+    """
+    T-SQL identifiers are translated, string literals are not
+    """
+    assert backends.render_sql_for_sqlite(qry) == expected
+
+
+def test_backend_must_implement_connect():
+    with pytest.raises(TypeError):
+        backends.DBBackend()
+
+
+def test_unknown_backend_raises():
+    with pytest.raises(backends.UnknownDBBackend):
+        backends.get_backend_class("oracle")
+
+
+def test_sqlite_backend_is_seeded(sqlite_backend):
+    """
+    The survey schema is created and filled with the sample data
+    """
+    df = db.run_sql_select_query("SELECT * FROM [dbo].[User]")
+    assert len(df) == len(backends.SAMPLE_SURVEY_DATA["User"])
+    assert list(df.columns) == list(backends.SURVEY_SCHEMA_COLUMNS["User"])
+
+
+def test_all_survey_data_pipeline_on_sqlite(sqlite_backend, tmp_path):
+    """
+    AllSurveyData is fetched, the view created and the
+    checkpoint recorded without a SQL Server
+    """
+    checkpoint_path = tmp_path / "checkpoint.txt"
+    with mock.patch.object(db, "CHECKPOINT_PATH", str(checkpoint_path)):
+        df = db.get_all_survey_data(update_view=True)
+
+    view = db.run_sql_select_query("SELECT * FROM [dbo].[vw_AllSurveyData]")
+
+    assert list(df.columns) == [
+        "UserId",
+        "SurveyId",
+        "ANS_Q1",
+        "ANS_Q2",
+        "ANS_Q3",
+        "ANS_Q4",
+    ]
+    assert sorted(zip(df["UserId"], df["SurveyId"])) == [
+        (1, 1),
+        (2, 1),
+        (2, 2),
+        (3, 2),
+        (4, 3),
+    ]
+    assert db.get_dataframe_hash_id(view) == db.get_dataframe_hash_id(df)
+    assert checkpoint_path.read_text() == db.get_dataframe_hash_id(df)
+
+
+def test_parameterized_query_prepared_once(sqlite_backend):
+    """
+    Repeated runs of a parameterized query reuse the statement
+    prepared on the pooled connection
+    """
+    metrics.reset_metrics()
+    qry = "SELECT UserId FROM [dbo].[Answer] WHERE SurveyId = ? ORDER BY UserId"
+
+    survey_1 = db.run_sql_select_query(qry, (1,))
+    survey_2 = db.run_sql_select_query(qry, (2,))
+
+    counters = metrics.get_metrics_snapshot()
+    assert counters["dsti_statement_prepares_total"]["samples"][0]["value"] == 1
+    assert counters["dsti_statement_executions_total"]["samples"][0]["value"] == 2
+    assert survey_1["UserId"].tolist() != survey_2["UserId"].tolist()
+
+
+def test_project_root_in_path():
+    """
+    Ensure that the project root has been correctly added
+    to the Python import path sys.path
+    """
+    assert PROJECT_ROOT in sys.path
@@ -1,6 +1,7 @@
 # Standard Library Imports
 import os
 import sys
+import time
 
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
 
@@ -12,6 +13,7 @@ import DSTI_db_interface.db_connection as dbconn
 
 # 3rd party packages
 import pyodbc
+from unittest import mock
 
 
 def test_config_ini_file_present():
@@ -47,3 +49,155 @@ def test_project_root_in_path():
     to the Python import path sys.path
     """
     assert PROJECT_ROOT in sys.path
+
+
+class FakeConnection:
+    """
+    Minimal stand-in for a pyodbc.Connection,
+    used to exercise ConnectionPool without a database.
+    """
+
+    def __init__(self, alive=True):
+        self.alive = alive
+        self.closed = False
+
+    def execute(self, qry):
+        if not self.alive:
+            raise RuntimeError("Connection lost")
+        return self
+
+    def fetchall(self):
+        return [(1,)]
+
+    def rollback(self):
+        if not self.alive:
+            raise RuntimeError("Connection lost")
+
+    def cursor(self):
+        return FakeCursor()
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCursor:
+    def __init__(self):
+        self.executed = []
+        self.closed = False
+
+    def execute(self, qry, params=()):
+        self.executed.append((qry, params))
+        return self
+
+    def close(self):
+        self.closed = True
+
+
+def test_connection_pool_reuses_released_connection():
+    """
+    A released connection is handed out again
+    instead of opening a new one
+    """
+    pool = dbconn.ConnectionPool(connect=lambda conn_str: FakeConnection())
+
+    first = pool.acquire()
+    pool.release(first)
+    second = pool.acquire()
+
+    assert first is second
+
+
+def test_connection_pool_discards_dead_connection():
+    """
+    A connection failing the liveness check on
+    checkout is closed and replaced
+    """
+    pool = dbconn.ConnectionPool(connect=lambda conn_str: FakeConnection())
+
+    first = pool.acquire()
+    pool.release(first)
+    first.alive = False
+
+    second = pool.acquire()
+
+    assert second is not first
+    assert first.closed
+
+
+def test_connection_pool_evicts_idle_connections():
+    """
+    Connections idle for longer than idle_timeout are closed
+    """
+    pool = dbconn.ConnectionPool(
+        idle_timeout=0, connect=lambda conn_str: FakeConnection()
+    )
+
+    first = pool.acquire()
+    pool.release(first)
+    time.sleep(0.01)
+    second = pool.acquire()
+
+    assert second is not first
+    assert first.closed
+
+
+def test_connection_pool_respects_pool_size():
+    """
+    No more than pool_size idle connections are kept open
+    """
+    pool = dbconn.ConnectionPool(pool_size=2, connect=lambda conn_str: FakeConnection())
+
+    connections = [pool.acquire() for _ in range(4)]
+    for connection in connections:
+        pool.release(connection)
+
+    assert pool.idle_count() == 2
+    assert sum(connection.closed for connection in connections) == 2
+
+
+def test_prepared_statement_cursor_reused():
+    """
+    The same SQL text runs on the same cursor, whatever
+    its parameters, until it is least recently used
+    """
+    cache = dbconn.PreparedStatementCache(max_statements=2)
+    connection = FakeConnection()
+
+    first = cache.execute(connection, "SELECT ?", (1,))
+    assert cache.execute(connection, "SELECT ?", (2,)) is first
+    assert first.executed == [("SELECT ?", (1,)), ("SELECT ?", (2,))]
+
+    cache.execute(connection, "SELECT ?, ?", (1, 2))
+    cache.execute(connection, "SELECT ? + 1", (1,))
+
+    assert first.closed
+    assert cache.statement_count(connection) == 2
+    assert cache.statement_count(FakeConnection()) == 0
+
+
+def test_connection_pool_forgets_prepared_statements_of_closed_connections():
+    pool = dbconn.ConnectionPool(pool_size=0, connect=lambda conn_str: FakeConnection())
+    statements = dbconn.get_prepared_statement_cache()
+
+    connection = pool.acquire()
+    cursor = dbconn.execute_prepared(connection, "SELECT ?", (1,))
+    pool.release(connection)
+
+    assert connection.closed and cursor.closed
+    assert statements.statement_count(connection) == 0
+
+
+def test_pinned_connection_used_by_decorated_functions():
+    pool = dbconn.ConnectionPool(connect=lambda conn_str: FakeConnection())
+
+    @dbconn.provide_db_connection
+    def get_connection(connection=None):
+        return connection
+
+    with mock.patch.object(dbconn, "get_connection_pool", return_value=pool):
+        with dbconn.pinned_connection() as connection:
+            assert get_connection() is connection
+            assert get_connection() is connection
+            assert pool.idle_count() == 0
+        assert pool.idle_count() == 1
+        assert get_connection() is connection
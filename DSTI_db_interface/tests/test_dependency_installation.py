@@ -32,6 +32,50 @@ def test_requirements_txt_at_project_root():
     assert requirements_ok is True
 
 
+def test_requirements_read_from_utf16_file(tmp_path):
+    """
+    requirements.txt at the project root is saved as UTF-16
+    """
+    # Local Imports
+    import DSTI_db_interface.dependency_installation as di
+
+    requirements_txt_pth = tmp_path / "requirements.txt"
+    requirements_txt_pth.write_text(
+        "# comment\npyodbc\npandas>=1.0 # pinned\n\npytest\n", encoding="utf-16"
+    )
+
+    assert di.get_requirements(str(requirements_txt_pth)) == [
+        "pyodbc",
+        "pandas",
+        "pytest",
+    ]
+    assert di.get_requirements()
+
+
+def test_missing_dependencies_found_without_importing():
+    # Local Imports
+    import DSTI_db_interface.dependency_installation as di
+
+    missing = di.get_missing_dependencies(["pytest", "surely-not-installed-package"])
+
+    assert missing == ["surely-not-installed-package"]
+    assert "surely_not_installed_package" not in sys.modules
+
+
+def test_lazy_module_imported_on_first_use():
+    # Local Imports
+    import DSTI_db_interface.dependency_installation as di
+
+    sys.modules.pop("colorsys", None)
+    colorsys = di.lazy_import("colorsys")
+
+    assert "colorsys" not in sys.modules
+    assert colorsys.rgb_to_hsv(1.0, 0.0, 0.0) == (0.0, 1.0, 1.0)
+    assert "colorsys" in sys.modules
+    assert "hls_to_rgb" in vars(colorsys)
+    assert di.lazy_import("colorsys") is sys.modules["colorsys"]
+
+
 def test_project_root_in_path():
     """
     Ensure that the project root has been correctly added
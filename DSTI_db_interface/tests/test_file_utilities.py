@@ -11,6 +11,7 @@ sys.path.insert(0, PROJECT_ROOT)
 import DSTI_db_interface.file_utilities as futil
 
 # 3rd party packages
+import pandas as pd
 import pytest
 from unittest import mock
 
@@ -19,6 +20,9 @@ from unittest import mock
 EXAMPLE_FILENAMES = [
     ("test_54.csv", True),
     ("test_54.txt", False),
+    ("test_54.parquet", True),
+    ("test_54.feather", True),
+    ("test_54.arrow", True),
     ("query results.csv", False),
     ("my-file-namecsv", False),
     ("my_file_namecsv", False),
@@ -67,3 +71,120 @@ def test_is_valid_write_filepath(filepath, exists):
         expected = exists
         actual = futil.is_valid_write_filepath(filepath)
         assert expected == actual
+
+
+def test_csv_chunk_writer_matches_to_csv(tmp_path):
+    """
+    Writing a DataFrame in chunks gives the same csv as
+    writing it in one go, with a single header line, and
+    whole numbers are written the same way in chunks which
+    had a NULL (floats) and in those which had none (ints)
+    """
+    chunks = [
+        pd.DataFrame({"UserId": [1, 2], "ANS_Q1": [1, None]}),
+        pd.DataFrame({"UserId": [3, 4], "ANS_Q1": [3, -1]}),
+        pd.DataFrame({"UserId": [5], "ANS_Q1": [2.5]}),
+    ]
+    df = pd.concat(chunks, ignore_index=True)
+    filepath = tmp_path / "chunks.csv"
+
+    with futil.CsvChunkWriter(str(filepath)) as writer:
+        for chunk in chunks[:2]:
+            writer.write(chunk)
+
+    assert writer.rows_written == 4
+    assert filepath.read_text() == df.iloc[:4].astype({"ANS_Q1": "Int64"}).to_csv()
+    assert "3.0" not in filepath.read_text()
+
+    # Fractions are kept
+    futil.save_dataframe(df, str(filepath))
+    assert filepath.read_text() == df.to_csv()
+
+
+EXAMPLE_EXPORT_FORMATS = [
+    ("results.csv", None, "csv"),
+    ("results.PARQUET", None, "parquet"),
+    ("results.feather", None, "feather"),
+    ("results.arrow", None, "arrow_ipc"),
+    ("results.ipc", None, "arrow_ipc"),
+    ("results.dat", "parquet", "parquet"),
+]
+
+
+@pytest.mark.parametrize("filepath, file_format, expected", EXAMPLE_EXPORT_FORMATS)
+def test_get_export_format(filepath, file_format, expected):
+    """
+    The export format comes from file_format when given,
+    otherwise from the file extension
+    """
+    assert futil.get_export_format(filepath, file_format) == expected
+
+
+def test_get_export_format_rejects_unknown_format():
+    with pytest.raises(futil.UnsupportedExportFormat):
+        futil.get_export_format("results.xlsx")
+
+
+@pytest.mark.parametrize("extension", [".parquet", ".feather", ".arrow"])
+def test_columnar_chunk_writers_round_trip(tmp_path, extension):
+    """
+    Chunks written in a columnar format read back as the
+    original data, integer columns holding NULLs included
+    """
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    df = pd.DataFrame({"UserId": [1, 2, 3, 4], "ANS_Q1": [5, None, None, -1]})
+    filepath = str(tmp_path / f"results{extension}")
+
+    with futil.get_chunk_writer(filepath, compression="zstd") as writer:
+        writer.write(df.iloc[:2].astype({"ANS_Q1": "Int64"}))
+        writer.write(df.iloc[2:])
+
+    if extension == ".parquet":
+        table = pq.read_table(filepath)
+    else:
+        table = pa.ipc.open_file(filepath).read_all()
+
+    assert table.num_rows == 4
+    assert table.column("ANS_Q1").to_pylist() == [5, None, None, -1]
+
+
+def test_columnar_chunk_writer_types_null_columns_from_later_chunks(tmp_path):
+    """
+    Columns only NULL in the first chunks take their type from
+    the chunk which has values, and columns are widened when
+    chunks disagree, as long as the file isn't created yet
+    """
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    filepath = str(tmp_path / "results.parquet")
+
+    with futil.get_chunk_writer(filepath) as writer:
+        writer.write(pd.DataFrame({"Label": [None, None], "ANS_Q1": [1, 2]}))
+        writer.write(pd.DataFrame({"Label": [None, None], "ANS_Q1": [1.5, None]}))
+        writer.write(pd.DataFrame({"Label": ["x", "y"], "ANS_Q1": [3, 4]}))
+
+    table = pq.read_table(filepath)
+
+    assert table.schema.field("ANS_Q1").type == pa.float64()
+    assert table.column("ANS_Q1").to_pylist() == [1, 2, 1.5, None, 3, 4]
+    assert table.column("Label").to_pylist() == [None, None, None, None, "x", "y"]
+
+
+def test_columnar_chunk_writer_buffers_a_bounded_number_of_rows(tmp_path):
+    """
+    Columns still NULL after max_buffered_rows are stored as float64
+    """
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    filepath = str(tmp_path / "results.parquet")
+
+    with futil.ParquetChunkWriter(filepath, max_buffered_rows=2) as writer:
+        writer.write(pd.DataFrame({"ANS_Q1": [None, None]}))
+        assert writer.schema.field("ANS_Q1").type == pa.float64()
+        writer.write(pd.DataFrame({"ANS_Q1": [3, 4]}))
+
+    assert pq.read_table(filepath).column("ANS_Q1").to_pylist() == [None, None, 3, 4]
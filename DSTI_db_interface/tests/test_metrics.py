@@ -0,0 +1,97 @@
+# Standard Library Imports
+import json
+import os
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+# Add project root to sys.path
+sys.path.insert(0, PROJECT_ROOT)
+
+# Local Imports
+import DSTI_db_interface.metrics as metrics
+
+# 3rd party packages
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def empty_registry():
+    metrics.reset_metrics()
+    yield
+    metrics.reset_metrics()
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = metrics.Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+
+    assert histogram.cumulative_bucket_counts() == [
+        (0.1, 2),
+        (1.0, 3),
+        (float("inf"), 4),
+    ]
+    assert histogram.count == 4
+    assert histogram.sum == pytest.approx(2.65)
+
+
+def test_timer_records_when_block_raises():
+    """
+    Failed operations still count towards latency
+    """
+    with pytest.raises(ValueError):
+        with metrics.timer("dsti_query_execution_seconds"):
+            raise ValueError
+
+    snapshot = metrics.get_metrics_snapshot()
+    assert snapshot["dsti_query_execution_seconds"]["samples"][0]["count"] == 1
+
+
+def test_prometheus_text_format():
+    """
+    Counters and histograms are written in the
+    Prometheus text format, one series per label set
+    """
+    metrics.increment("dsti_rows_fetched_total", 10)
+    metrics.increment("dsti_rows_fetched_total", 5)
+    metrics.increment("dsti_query_memo_requests_total", result="hit")
+    metrics.observe("dsti_view_ddl_seconds", 0.2, statement="create")
+
+    lines = metrics.get_prometheus_text().splitlines()
+
+    assert "# TYPE dsti_rows_fetched_total counter" in lines
+    assert "dsti_rows_fetched_total 15" in lines
+    assert 'dsti_query_memo_requests_total{result="hit"} 1' in lines
+    assert "# TYPE dsti_view_ddl_seconds histogram" in lines
+    assert 'dsti_view_ddl_seconds_bucket{statement="create",le="0.1"} 0' in lines
+    assert 'dsti_view_ddl_seconds_bucket{statement="create",le="0.25"} 1' in lines
+    assert 'dsti_view_ddl_seconds_bucket{statement="create",le="+Inf"} 1' in lines
+    assert 'dsti_view_ddl_seconds_count{statement="create"} 1' in lines
+
+
+def test_label_values_are_escaped():
+    metrics.increment("dsti_query_errors_total", query='say "hi"\n')
+    assert 'query="say \\"hi\\"\\n"' in metrics.get_prometheus_text()
+
+
+def test_export_metrics_json_and_prometheus(tmp_path):
+    metrics.increment("dsti_connections_opened_total")
+
+    json_path = tmp_path / "metrics.json"
+    prometheus_path = tmp_path / "dsti.prom"
+    metrics.export_metrics_json(str(json_path))
+    metrics.export_metrics_prometheus(str(prometheus_path))
+
+    exported = json.loads(json_path.read_text())
+    samples = exported["metrics"]["dsti_connections_opened_total"]["samples"]
+    assert samples == [{"labels": {}, "value": 1}]
+    assert "dsti_connections_opened_total 1" in prometheus_path.read_text()
+
+
+def test_project_root_in_path():
+    """
+    Ensure that the project root has been correctly added
+    to the Python import path sys.path
+    """
+    assert PROJECT_ROOT in sys.path
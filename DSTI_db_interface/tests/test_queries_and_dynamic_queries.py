@@ -1,5 +1,6 @@
 # Standard Library Imports
 import os
+import sqlite3
 import sys
 
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
@@ -12,7 +13,9 @@ sys.path.insert(0, PROJECT_ROOT)
 import DSTI_db_interface.queries_and_dynamic_queries as q
 
 # 3rd Party Imports
+import pandas as pd
 import pytest
+from unittest import mock
 
 # SHARED VARIABLES
 test_survey_id = 1
@@ -60,6 +63,310 @@ def test_get_survey_ids_returns_list(func):
     assert isinstance(returned_object, list)
 
 
+# Small survey structure used by the in-memory matrix tests.
+# Question 4 is referenced by SurveyStructure but missing from Question.
+EXAMPLE_SURVEY_IDS = [1, 2, 3]
+EXAMPLE_QUESTION_IDS = [1, 2, 3]
+EXAMPLE_SURVEY_STRUCTURE = pd.DataFrame(
+    {"SurveyId": [1, 1, 2, 2, 2], "QuestionId": [1, 3, 2, 3, 4]}
+)
+
+
+def legacy_questions_in_survey(survey_id):
+    """
+    Reproduces, for EXAMPLE_* data, the result set of
+    get_questions_in_survey_qry as returned by the database
+    """
+    structure = EXAMPLE_SURVEY_STRUCTURE
+    in_survey = set(structure[structure["SurveyId"] == survey_id]["QuestionId"])
+    question_ids = sorted(in_survey | set(EXAMPLE_QUESTION_IDS))
+    return pd.DataFrame(
+        {
+            "SurveyId": survey_id,
+            "QuestionId": question_ids,
+            "InSurvey": [int(qid in in_survey) for qid in question_ids],
+        }
+    )
+
+
+def legacy_dynamic_query():
+    """
+    The per-survey query building loop as it was before the
+    survey structure was fetched in bulk
+    """
+    wip_query = ""
+    for survey_id in EXAMPLE_SURVEY_IDS:
+        answer_columns_qry = ""
+        for row in legacy_questions_in_survey(survey_id).itertuples():
+            if row.InSurvey == 0:
+                answer_columns_qry += q.get_strQueryTemplateForNullColumn(
+                    row.QuestionId
+                )
+            else:
+                answer_columns_qry += q.get_strQueryTemplateForAnswerColumn(
+                    survey_id, row.QuestionId
+                )
+        wip_query += (
+            q.get_strQueryTemplateOuterUnionQuery(
+                survey_id=survey_id, dynamic_question_answers=answer_columns_qry
+            )
+            + " UNION "
+        )
+    return wip_query[:-7]
+
+
+def test_questions_in_survey_matrix():
+    """
+    The in-memory matrix flags each question as in (1)
+    or not in (0) each survey, ordered by QuestionId
+    """
+    expected = {
+        1: [(1, 1), (2, 0), (3, 1)],
+        2: [(1, 0), (2, 1), (3, 1), (4, 1)],
+        3: [(1, 0), (2, 0), (3, 0)],
+    }
+    actual = q.get_questions_in_survey_matrix(
+        EXAMPLE_SURVEY_IDS, EXAMPLE_QUESTION_IDS, EXAMPLE_SURVEY_STRUCTURE
+    )
+    assert expected == actual
+
+
+def test_dynamic_query_identical_to_per_survey_build():
+    """
+    Building the query from the bulk matrix produces exactly
+    the same string as the former per-survey round trips
+    """
+    matrix = q.get_questions_in_survey_matrix(
+        EXAMPLE_SURVEY_IDS, EXAMPLE_QUESTION_IDS, EXAMPLE_SURVEY_STRUCTURE
+    )
+    actual = q.get_dynamic_query_from_questions_in_survey_matrix(matrix)
+    assert legacy_dynamic_query() == actual
+
+
+def get_example_answers_db():
+    """
+    In-memory SQLite database holding EXAMPLE_* data plus answers,
+    including a NULL answer, an unanswered question, an answer to a
+    question outside the survey and a user missing from [User].
+    Used to compare the result sets of the query generators.
+    """
+    connection = sqlite3.connect(":memory:")
+    connection.executescript(
+        """
+        CREATE TABLE [User] (UserId INTEGER PRIMARY KEY);
+        CREATE TABLE Answer (
+            UserId INTEGER, SurveyId INTEGER, QuestionId INTEGER, Answer_Value INTEGER
+        );
+        INSERT INTO [User] VALUES (1), (2), (3);
+        INSERT INTO Answer VALUES
+            (1, 1, 1, 5), (1, 1, 3, 2),
+            (1, 2, 2, 7),
+            (2, 1, 1, NULL),
+            (2, 2, 1, 9), (2, 2, 4, 3),
+            (3, 3, 1, 4),
+            (99, 1, 1, 1);
+        """
+    )
+    return connection
+
+
+def test_conditional_aggregation_query_equivalent_to_correlated_subqueries():
+    """
+    Both query generators return the same vw_AllSurveyData
+    rows and columns, including NULL vs -1 cells
+    """
+    # Question 4 only exists in SurveyStructure, which the UNION
+    # based query cannot handle, so it is left out here
+    survey_structure = EXAMPLE_SURVEY_STRUCTURE[
+        EXAMPLE_SURVEY_STRUCTURE["QuestionId"] != 4
+    ]
+    matrix = q.get_questions_in_survey_matrix(
+        EXAMPLE_SURVEY_IDS, EXAMPLE_QUESTION_IDS, survey_structure
+    )
+    connection = get_example_answers_db()
+
+    results = []
+    for query_generator in ("correlated_subqueries", "conditional_aggregation"):
+        qry = q.QUERY_GENERATORS[query_generator](matrix)
+        df = pd.read_sql(qry, connection)
+        results.append(df.sort_values(["UserId", "SurveyId"]).reset_index(drop=True))
+
+    correlated, conditional = results
+    assert list(correlated.columns) == list(conditional.columns)
+    pd.testing.assert_frame_equal(correlated, conditional, check_dtype=False)
+    assert len(conditional) == 5
+
+
+@pytest.mark.parametrize(
+    "query_generator", ["correlated_subqueries", "conditional_aggregation"]
+)
+def test_per_survey_queries_equivalent_to_single_query(query_generator):
+    """
+    The per-survey queries of the parallel fetch together
+    return the same rows as the single query
+    """
+    survey_structure = EXAMPLE_SURVEY_STRUCTURE[
+        EXAMPLE_SURVEY_STRUCTURE["QuestionId"] != 4
+    ]
+    matrix = q.get_questions_in_survey_matrix(
+        EXAMPLE_SURVEY_IDS, EXAMPLE_QUESTION_IDS, survey_structure
+    )
+    connection = get_example_answers_db()
+    key = ["UserId", "SurveyId"]
+
+    full = pd.read_sql(q.QUERY_GENERATORS[query_generator](matrix), connection)
+    survey_queries = q.get_per_survey_queries_to_update_vw_AllSurveyData(
+        query_generator, matrix
+    )
+    per_survey = pd.concat(
+        [
+            pd.read_sql(qry, connection, params=params)
+            for qry, params in survey_queries.values()
+        ]
+    )
+
+    assert sorted(survey_queries) == sorted(matrix)
+    # Surveys without any NULL cell come back as int columns
+    pd.testing.assert_frame_equal(
+        per_survey.sort_values(key).reset_index(drop=True).astype(float),
+        full.sort_values(key).reset_index(drop=True).astype(float),
+    )
+
+
+def test_per_survey_queries_bind_survey_id():
+    """
+    Surveys asking the same questions share one statement
+    text, their ids being bound parameters
+    """
+    matrix = {
+        1: [(1, 1), (2, 0)],
+        2: [(1, 1), (2, 0)],
+        3: [(1, 0), (2, 1)],
+    }
+
+    for query_generator in q.PER_SURVEY_QUERY_GENERATORS:
+        survey_queries = q.PER_SURVEY_QUERY_GENERATORS[query_generator](matrix)
+
+        assert survey_queries[1][0] == survey_queries[2][0] != survey_queries[3][0]
+        assert survey_queries[2][1] == (2,) * survey_queries[2][0].count("?")
+        assert survey_queries[2][1]
+
+
+def test_templates_return_parameters_in_marker_order():
+    """
+    Substituting the bound parameters for the markers,
+    in order, gives back the query with literal ids
+    """
+    matrix = {3: [(1, 1), (2, 0), (4, 1)]}
+
+    for build_query in [
+        lambda matrix, params=None: q.get_survey_select_query(3, matrix[3], params),
+        q.get_conditional_aggregation_query_from_questions_in_survey_matrix,
+    ]:
+        params = []
+        bound_query = build_query(matrix, params)
+
+        assert params and set(params) == {3}
+        assert "".join(
+            part + (str(params[pos]) if pos < len(params) else "")
+            for pos, part in enumerate(bound_query.split(q.SQL_PARAMETER_MARKER))
+        ) == build_query(matrix)
+
+
+def test_dynamic_query_memoized_per_structure_version():
+    """
+    The query string is built once per survey structure
+    and rebuilt when the structure changes
+    """
+    matrix = q.get_questions_in_survey_matrix(
+        EXAMPLE_SURVEY_IDS, EXAMPLE_QUESTION_IDS, EXAMPLE_SURVEY_STRUCTURE
+    )
+    changed_matrix = q.get_questions_in_survey_matrix(
+        EXAMPLE_SURVEY_IDS, EXAMPLE_QUESTION_IDS, EXAMPLE_SURVEY_STRUCTURE[1:]
+    )
+    build_query = mock.Mock(side_effect=lambda m: f"SELECT {len(m[1])}")
+    q.clear_dynamic_query_memo()
+
+    with mock.patch.dict(q.QUERY_GENERATORS, {"test_generator": build_query}):
+        first = q.get_dynamic_query_to_update_vw_AllSurveyData("test_generator", matrix)
+        second = q.get_dynamic_query_to_update_vw_AllSurveyData(
+            "test_generator", matrix
+        )
+        assert first == second
+        assert build_query.call_count == 1
+
+        q.get_dynamic_query_to_update_vw_AllSurveyData("test_generator", changed_matrix)
+        assert build_query.call_count == 2
+
+    q.clear_dynamic_query_memo()
+
+
+def test_column_partitioned_queries_fit_max_view_columns():
+    """
+    Each partition query returns UserId, SurveyId and its own
+    slice of the answer columns, in column order
+    """
+    survey_structure = EXAMPLE_SURVEY_STRUCTURE[
+        EXAMPLE_SURVEY_STRUCTURE["QuestionId"] != 4
+    ]
+    matrix = q.get_questions_in_survey_matrix(
+        EXAMPLE_SURVEY_IDS, EXAMPLE_QUESTION_IDS, survey_structure
+    )
+    connection = get_example_answers_db()
+
+    assert q.get_question_id_partitions(matrix, max_view_columns=4) == [[1, 2], [3]]
+    assert len(q.get_question_id_partitions(matrix, max_view_columns=1024)) == 1
+    with pytest.raises(ValueError):
+        q.get_question_id_partitions(matrix, max_view_columns=2)
+
+    for query_generator in q.QUERY_GENERATORS:
+        partition_queries = q.get_column_partitioned_queries_to_update_vw_AllSurveyData(
+            query_generator, matrix, max_view_columns=4
+        )
+        columns = [
+            list(pd.read_sql(qry, connection).columns) for qry in partition_queries
+        ]
+        assert columns == [
+            ["UserId", "SurveyId", "ANS_Q1", "ANS_Q2"],
+            ["UserId", "SurveyId", "ANS_Q3"],
+        ]
+
+
+def test_table_checksums_query():
+    """
+    One row per checksummed table, whatever the backend, using
+    SQL Server's checksum aggregates where available
+    """
+    mssql_query = q.get_table_checksums_query("mssql")
+    assert mssql_query.count("CHECKSUM_AGG(BINARY_CHECKSUM(") == len(q.CHECKSUM_TABLES)
+
+    connection = sqlite3.connect(":memory:")
+    connection.executescript(
+        """
+        CREATE TABLE Answer (QuestionId, SurveyId, UserId, Answer_Value);
+        CREATE TABLE SurveyStructure (SurveyId, QuestionId, OrdinalValue);
+        CREATE TABLE Question (QuestionId);
+        CREATE TABLE Survey (SurveyId);
+        CREATE TABLE User (UserId);
+        INSERT INTO Answer VALUES (1, 1, 1, 5), (2, 1, 1, NULL);
+        """
+    )
+    sqlite_query = q.get_table_checksums_query("sqlite").replace("[dbo].", "")
+    rows = {row[0]: row for row in connection.execute(sqlite_query)}
+
+    assert set(rows) == set(q.CHECKSUM_TABLES)
+    assert rows["Answer"][1] == 2
+    assert rows["Survey"] == ("Survey", 0, None, None)
+
+    # A NULL answer turned into -1, or 0, changes the checksums
+    for answer_value in (-1, 0):
+        connection.execute(
+            "UPDATE Answer SET Answer_Value = ? WHERE QuestionId = 2", (answer_value,)
+        )
+        changed_rows = {row[0]: row for row in connection.execute(sqlite_query)}
+        assert changed_rows["Answer"][2:] != rows["Answer"][2:]
+
+
 def test_project_root_in_path():
     """
     Ensure that the project root has been correctly added
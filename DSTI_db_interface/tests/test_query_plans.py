@@ -0,0 +1,233 @@
+# Standard Library Imports
+import json
+import os
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+# Add project root to sys.path
+sys.path.insert(0, PROJECT_ROOT)
+
+# Local Imports
+import DSTI_db_interface.db_backends as backends
+import DSTI_db_interface.query_plans as qp
+
+# 3rd party packages
+import pytest
+from unittest import mock
+
+# SHARED_VARIABLES
+EXAMPLE_SHOWPLAN = """<?xml version="1.0" encoding="utf-16"?>
+<ShowPlanXML xmlns="http://schemas.microsoft.com/sqlserver/2004/07/showplan">
+  <BatchSequence><Batch><Statements><StmtSimple><QueryPlan>
+    <RelOp NodeId="0" PhysicalOp="Nested Loops" LogicalOp="Left Semi Join"
+           EstimateRows="10" EstimateCPU="0.001" EstimateIO="0">
+      <RunTimeInformation>
+        <RunTimeCountersPerThread Thread="0" ActualRows="8" ActualExecutions="1" />
+      </RunTimeInformation>
+      <NestedLoops Optimized="false">
+        <RelOp NodeId="1" PhysicalOp="Clustered Index Scan" LogicalOp="Clustered Index Scan"
+               EstimateRows="10" EstimateCPU="0.0002" EstimateIO="0.003">
+          <RunTimeInformation>
+            <RunTimeCountersPerThread Thread="0" ActualRows="10" ActualExecutions="1"
+                                      ActualLogicalReads="2" />
+          </RunTimeInformation>
+          <IndexScan Ordered="false">
+            <Object Database="[Survey_Sample_A19]" Schema="[dbo]" Table="[User]" Index="[PK_User]" />
+          </IndexScan>
+        </RelOp>
+        <RelOp NodeId="2" PhysicalOp="Index Seek" LogicalOp="Index Seek"
+               EstimateRows="1" EstimateCPU="0.0001" EstimateIO="0.003"
+               EstimateRebinds="9" EstimateRewinds="0">
+          <RunTimeInformation>
+            <RunTimeCountersPerThread Thread="0" ActualRows="8" ActualExecutions="10"
+                                      ActualLogicalReads="20" />
+          </RunTimeInformation>
+          <IndexScan Ordered="true">
+            <Object Database="[Survey_Sample_A19]" Schema="[dbo]" Table="[Answer]" Index="[PK_Answer]" />
+          </IndexScan>
+        </RelOp>
+      </NestedLoops>
+    </RelOp>
+  </QueryPlan></StmtSimple></Statements></Batch></BatchSequence>
+</ShowPlanXML>"""
+
+EXAMPLE_MESSAGES = [
+    "Table 'Answer'. Scan count 10, logical reads 20, physical reads 0, read-ahead reads 0.",
+    "Table 'User'. Scan count 1, logical reads 2, physical reads 1, read-ahead reads 0.",
+    "SQL Server Execution Times:\n   CPU time = 15 ms,  elapsed time = 21 ms.",
+]
+
+
+class FakeMSSQLCursor:
+    """
+    Minimal stand-in for a pyodbc cursor with STATISTICS
+    XML on: the results, then the showplan result set
+    """
+
+    def __init__(self):
+        self.executed = []
+        self.messages = []
+        self.description = None
+        self._result_sets = []
+
+    def execute(self, sql_query):
+        self.executed.append(sql_query)
+        if sql_query.startswith("SET"):
+            self.description = None
+            self._result_sets = []
+        else:
+            self.description = [("UserId",)]
+            self.messages = [
+                ("[01000] (0)", f"[Microsoft][SQL Server]{EXAMPLE_MESSAGES[0]}")
+            ]
+            self._result_sets = [[(1,), (2,)], [(EXAMPLE_SHOWPLAN,)]]
+        return self
+
+    def fetchall(self):
+        return self._result_sets[0]
+
+    def nextset(self):
+        self._result_sets = self._result_sets[1:]
+        if not self._result_sets:
+            return False
+        self.description = [("Microsoft SQL Server 2005 XML Showplan",)]
+        self.messages = [
+            ("[01000] (0)", f"[Microsoft][SQL Server]{EXAMPLE_MESSAGES[2]}")
+        ]
+        return True
+
+    def close(self):
+        pass
+
+
+class FakeMSSQLConnection:
+    def __init__(self):
+        self.fake_cursor = FakeMSSQLCursor()
+
+    def cursor(self):
+        return self.fake_cursor
+
+
+def test_mssql_plan_operators():
+    """
+    Operators carry their own estimated cost over all their
+    executions, their parent and their actual counters
+    """
+    operators = {
+        operator["node_id"]: operator
+        for operator in qp.get_mssql_plan_operators(EXAMPLE_SHOWPLAN)
+    }
+
+    assert operators[0]["parent_id"] is None
+    assert operators[1]["parent_id"] == 0
+    assert operators[2]["parent_id"] == 0
+
+    assert operators[1]["object"] == "[User].[PK_User]"
+    assert operators[1]["is_scan"] and not operators[2]["is_scan"]
+    assert operators[2]["estimated_executions"] == 10
+    assert operators[2]["estimated_cost"] == pytest.approx(0.031)
+    assert operators[2]["logical_reads"] == 20
+    assert operators[0]["logical_reads"] is None
+
+
+def test_summary_ranks_operators_by_cost():
+    operators = qp.get_mssql_plan_operators(EXAMPLE_SHOWPLAN)
+    summary = qp.get_query_plan_summary(operators, top=2)
+
+    assert summary["scans"] == 1
+    assert [
+        operator["node_id"] for operator in summary["most_expensive_operators"]
+    ] == [2, 1]
+
+
+def test_mssql_statistics_messages():
+    assert qp.get_mssql_io_statistics(EXAMPLE_MESSAGES) == [
+        {"table": "Answer", "scan_count": 10, "logical_reads": 20, "physical_reads": 0},
+        {"table": "User", "scan_count": 1, "logical_reads": 2, "physical_reads": 1},
+    ]
+    assert qp.get_mssql_time_statistics(EXAMPLE_MESSAGES) == {
+        "cpu_ms": 15,
+        "elapsed_ms": 21,
+    }
+
+
+def test_capture_mssql_query_plan():
+    """
+    Results, plan and statistics are collected, and the
+    STATISTICS options are switched back off
+    """
+    connection = FakeMSSQLConnection()
+
+    df, report = qp.capture_mssql_query_plan(connection, "SELECT UserId FROM [User]")
+
+    assert df["UserId"].tolist() == [1, 2]
+    assert len(report["operators"]) == 3
+    assert report["statistics"]["io"][0]["table"] == "Answer"
+    assert report["statistics"]["time"]["cpu_ms"] == 15
+    assert report["raw_plan"] == EXAMPLE_SHOWPLAN
+    assert connection.fake_cursor.executed[-3:] == list(qp.MSSQL_STATISTICS_OFF)
+
+
+def test_explain_on_sqlite_saves_report_next_to_query(sqlite_backend, tmp_path):
+    df, report = qp.explain_sql_select_query(
+        "SELECT * FROM [User] u WHERE EXISTS "
+        "(SELECT * FROM Answer a WHERE a.UserId = u.UserId AND a.SurveyId = 1)",
+        directory=str(tmp_path),
+    )
+
+    assert report["rows"] == len(df) == 2
+    assert any(operator["object"] == "u" for operator in report["operators"])
+
+    basepath = report["report_path"][: -len(".plan.json")]
+    assert os.path.exists(f"{basepath}.sql")
+    assert os.path.exists(f"{basepath}.plan.txt")
+    with open(report["report_path"]) as file:
+        assert json.load(file)["summary"]["scans"] == report["summary"]["scans"]
+
+
+def test_compilation_counters():
+    """
+    SQL Server's counters are read by name and compared between
+    two reads, other backends have none
+    """
+
+    class FakeCounterConnection:
+        def execute(self, sql_query):
+            self.rows = [
+                ("Batch Requests/sec", 120),
+                ("SQL Compilations/sec", 40),
+                ("SQL Re-Compilations/sec", 2),
+            ]
+            return self
+
+        def fetchall(self):
+            return self.rows
+
+        def close(self):
+            pass
+
+    get_compilation_counters = qp.get_compilation_counters.__wrapped__
+
+    with mock.patch.object(qp, "get_backend", return_value=backends.MSSQLBackend()):
+        before = get_compilation_counters(connection=FakeCounterConnection())
+
+    assert before == {"batch_requests": 120, "compilations": 40, "recompilations": 2}
+    after = dict(before, batch_requests=150, compilations=41)
+    assert qp.get_compilation_counter_deltas(before, after) == {
+        "batch_requests": 30,
+        "compilations": 1,
+        "recompilations": 0,
+    }
+
+    with mock.patch.object(qp, "get_backend", return_value=backends.SQLiteBackend()):
+        assert get_compilation_counters(connection=FakeCounterConnection()) is None
+    assert qp.get_compilation_counter_deltas(None, after) is None
+
+
+def test_project_root_in_path():
+    """
+    Ensure that the project root has been correctly added
+    to the Python import path sys.path
+    """
+    assert PROJECT_ROOT in sys.path
@@ -0,0 +1,160 @@
+# Standard Library Imports
+import os
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+# Add project root to sys.path
+sys.path.insert(0, PROJECT_ROOT)
+
+# Local Imports
+import DSTI_db_interface.db_backends as backends
+import DSTI_db_interface.result_cache as rc
+
+# 3rd party packages
+import pandas as pd
+import pytest
+
+# SHARED_VARIABLES
+DF = pd.DataFrame({"UserId": [1, 2, 3], "ANS_Q1": [5, None, -1]})
+
+EQUIVALENT_QUERIES = [
+    ("SELECT * FROM [User]", "SELECT *\n   FROM [User];"),
+    (
+        "SELECT * FROM Answer WHERE x = 'A  b'",
+        "SELECT  *  FROM Answer WHERE x = 'A  b'",
+    ),
+]
+
+DIFFERENT_QUERIES = [
+    ("SELECT * FROM Answer WHERE x = 'A  b'", "SELECT * FROM Answer WHERE x = 'a b'"),
+    ("SELECT * FROM [User]", "SELECT * FROM Answer"),
+    ("SELECT * FROM [User]", "select * from [user]"),
+]
+
+
+@pytest.mark.parametrize("qry_1, qry_2", EQUIVALENT_QUERIES)
+def test_equivalent_queries_share_cache_key(qry_1, qry_2):
+    assert rc.get_cache_key(qry_1) == rc.get_cache_key(qry_2)
+
+
+@pytest.mark.parametrize("qry_1, qry_2", DIFFERENT_QUERIES)
+def test_different_queries_have_different_cache_keys(qry_1, qry_2):
+    """
+    String literals and letter case are not normalized
+    """
+    assert rc.get_cache_key(qry_1) != rc.get_cache_key(qry_2)
+
+
+def test_parameterized_queries_cached_per_params():
+    qry = "SELECT * FROM Answer WHERE SurveyId = ?"
+    assert rc.get_cache_key(qry, (1,)) == rc.get_cache_key(qry, [1])
+    assert rc.get_cache_key(qry, (1,)) != rc.get_cache_key(qry, (2,))
+    assert rc.get_cache_key(qry, (1,)) != rc.get_cache_key(qry)
+
+
+def test_same_query_on_other_database_has_different_cache_key(make_sqlite_backend):
+    qry = "SELECT * FROM [User]"
+    make_sqlite_backend()
+    key = rc.get_cache_key(qry)
+    make_sqlite_backend()
+
+    assert rc.get_cache_key(qry) != key
+
+
+def test_cache_round_trip(tmp_path):
+    cache = rc.ResultCache(directory=str(tmp_path))
+    cache.put("SELECT * FROM Answer", DF)
+
+    pd.testing.assert_frame_equal(cache.get("SELECT *  FROM Answer"), DF)
+    assert cache.get("SELECT * FROM [User]") is None
+
+
+def test_cache_entries_stored_as_parquet_with_their_dtypes(tmp_path):
+    df = pd.DataFrame(
+        {
+            "UserId": pd.array([1, 2, 3], dtype="int8"),
+            "ANS_Q1": pd.array([5, None, -1], dtype="Int8"),
+            "ANS_Q2": pd.Series([None, None, None], dtype=object),
+            "Name": ["a", "b", None],
+        }
+    )
+    cache = rc.ResultCache(directory=str(tmp_path))
+    cache.put("SELECT * FROM Answer", df)
+
+    pd.testing.assert_frame_equal(cache.get("SELECT * FROM Answer"), df)
+    assert [path.suffix for path in tmp_path.glob("*") if path.stem != "index"] == [
+        ".parquet"
+    ]
+
+
+def test_cache_entries_expire(tmp_path):
+    cache = rc.ResultCache(directory=str(tmp_path))
+    cache.put("SELECT * FROM Answer", DF, ttl=0.01)
+    time.sleep(0.02)
+
+    assert cache.get("SELECT * FROM Answer") is None
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    """
+    Going over the size budget evicts the entry
+    read least recently, not the oldest one
+    """
+    cache = rc.ResultCache(directory=str(tmp_path))
+    cache.put("SELECT 1", DF)
+    entry_size = cache.size_bytes()
+    cache.max_size_bytes = 2 * entry_size
+
+    cache.put("SELECT 2", DF)
+    cache.get("SELECT 1")
+    cache.put("SELECT 3", DF)
+
+    assert cache.get("SELECT 1") is not None
+    assert cache.get("SELECT 2") is None
+    assert cache.get("SELECT 3") is not None
+
+
+def test_cache_index_persisted(tmp_path):
+    rc.ResultCache(directory=str(tmp_path)).put("SELECT 1", DF)
+    assert rc.ResultCache(directory=str(tmp_path)).get("SELECT 1") is not None
+
+
+def test_cache_invalidate(tmp_path):
+    cache = rc.ResultCache(directory=str(tmp_path))
+    cache.put("SELECT 1", DF)
+    cache.put("SELECT 2", DF)
+
+    cache.invalidate("SELECT 1")
+    assert cache.get("SELECT 1") is None
+    assert cache.get("SELECT 2") is not None
+
+    cache.invalidate()
+    assert cache.get("SELECT 2") is None
+
+
+def test_cache_invalidated_on_survey_structure_change(tmp_path):
+    """
+    Only entries reading the survey structure tables
+    are dropped when the structure changes
+    """
+    cache = rc.ResultCache(directory=str(tmp_path))
+    cache.invalidate_if_survey_structure_changed("structure:1")
+    cache.put("SELECT * FROM SurveyStructure", DF)
+    cache.put("SELECT * FROM [User]", DF)
+
+    assert not cache.invalidate_if_survey_structure_changed("structure:1")
+    assert cache.get("SELECT * FROM SurveyStructure") is not None
+
+    assert cache.invalidate_if_survey_structure_changed("structure:2")
+    assert cache.get("SELECT * FROM SurveyStructure") is None
+    assert cache.get("SELECT * FROM [User]") is not None
+
+
+def test_project_root_in_path():
+    """
+    Ensure that the project root has been correctly added
+    to the Python import path sys.path
+    """
+    assert PROJECT_ROOT in sys.path
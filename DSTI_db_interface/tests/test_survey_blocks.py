@@ -0,0 +1,145 @@
+# Standard Library Imports
+import os
+import pickle
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+# Add project root to sys.path
+sys.path.insert(0, PROJECT_ROOT)
+
+# Local Imports
+import DSTI_db_interface.db_api as db
+import DSTI_db_interface.survey_blocks as sb
+
+# 3rd party packages
+import pandas as pd
+import pytest
+from unittest import mock
+
+# SHARED_VARIABLES
+QUESTIONS_IN_SURVEY_MATRIX = {
+    1: [(1, 1), (2, 1), (3, 0), (4, 0)],
+    2: [(1, 0), (2, 1), (3, 1), (4, 0)],
+    3: [(1, 1), (2, 0), (3, 0), (4, 0)],
+}
+
+ANSWERS = pd.DataFrame(
+    [
+        (1, 1, 1, 5),
+        (1, 1, 2, 3),
+        (2, 1, 1, 4),
+        (2, 2, 2, 1),
+        (2, 2, 3, None),
+        (3, 2, 2, 7),
+        (4, 3, 1, 8),
+        (5, 1, 3, 9),  # question 3 is not in survey 1
+        (6, 9, 1, 2),  # survey 9 is unknown
+    ],
+    columns=["UserId", "SurveyId", "QuestionId", "Answer_Value"],
+)
+
+
+def test_blocks_pivot_equivalent_to_dense_pivot():
+    """
+    The blocks only hold their survey's answer columns, and
+    their dense view is the dense client-side pivot
+    """
+    blocks = sb.pivot_long_format_answers_to_blocks(ANSWERS, QUESTIONS_IN_SURVEY_MATRIX)
+    dense = db.pivot_long_format_answers(ANSWERS, QUESTIONS_IN_SURVEY_MATRIX)
+
+    assert list(blocks.blocks[2].columns) == ["UserId", "SurveyId", "ANS_Q2", "ANS_Q3"]
+    assert blocks.blocks[1]["UserId"].tolist() == [1, 2, 5]
+    assert blocks.shape == dense.shape
+    pd.testing.assert_frame_equal(blocks.to_dataframe(), dense)
+
+
+def test_dense_view_built_only_on_demand():
+    blocks = sb.pivot_long_format_answers_to_blocks(ANSWERS, QUESTIONS_IN_SURVEY_MATRIX)
+    dense = db.pivot_long_format_answers(ANSWERS, QUESTIONS_IN_SURVEY_MATRIX)
+
+    assert blocks.get_hash_id() == db.get_dataframe_hash_id(dense)
+    assert len(blocks) == len(dense)
+    pd.testing.assert_index_equal(blocks.columns, dense.columns)
+    assert blocks._dense is None
+
+    # DataFrame callers go through the dense view, built once
+    assert blocks.dense["ANS_Q4"].tolist() == [None] * len(dense)
+    assert blocks.dense is blocks.dense
+    assert not hasattr(blocks, "sort_values")
+    with pytest.raises(TypeError):
+        blocks["UserId"]
+
+
+def test_blocks_pickle_without_dense_view():
+    """
+    Blocks pickle with their dense view already built,
+    which is built again after unpickling
+    """
+    blocks = sb.pivot_long_format_answers_to_blocks(ANSWERS, QUESTIONS_IN_SURVEY_MATRIX)
+    dense = blocks.dense
+
+    unpickled = pickle.loads(pickle.dumps(blocks))
+
+    assert unpickled._dense is None
+    assert unpickled.get_hash_id() == blocks.get_hash_id()
+    pd.testing.assert_frame_equal(unpickled.dense, dense)
+
+
+def test_from_dataframe_drops_other_surveys_columns():
+    dense = db.pivot_long_format_answers(ANSWERS, QUESTIONS_IN_SURVEY_MATRIX)
+    blocks = sb.SurveyBlocks.from_dataframe(dense, QUESTIONS_IN_SURVEY_MATRIX)
+
+    assert list(blocks.blocks[3].columns) == ["UserId", "SurveyId", "ANS_Q1"]
+    assert blocks.memory_usage_bytes() < dense.memory_usage(index=False).sum()
+    pd.testing.assert_frame_equal(blocks.to_dataframe(), dense)
+    assert blocks.compact().get_hash_id() == blocks.get_hash_id()
+
+
+@pytest.mark.parametrize("fetch_mode", ["single", "parallel", "client_pivot"])
+def test_blocked_fetch_shares_checkpoint_with_dense_fetch(
+    sqlite_backend, tmp_path, fetch_mode
+):
+    """
+    Blocked and dense fetches of the same data agree on the
+    checkpoint, so switching between them keeps the view
+    """
+    with mock.patch.object(
+        db, "CHECKPOINT_PATH", str(tmp_path / "checkpoint.txt")
+    ), mock.patch.object(db, "create_vw_AllSurveyData") as create_view:
+        blocks = db.get_all_survey_data(
+            fetch_mode=fetch_mode, blocked=True, checkpoint_mode="data"
+        )
+        dense = db.get_all_survey_data(fetch_mode="single", checkpoint_mode="data")
+
+    assert isinstance(blocks, sb.SurveyBlocks)
+    assert create_view.call_count == 1
+    # Question 4 is in no survey
+    assert blocks.dense["ANS_Q4"].dtype == dense["ANS_Q4"].dtype == object
+    pd.testing.assert_frame_equal(
+        blocks.dense, dense.sort_values(sb.KEY_COLUMNS, ignore_index=True)
+    )
+
+
+def test_parallel_blocked_fetch_never_builds_dense(sqlite_backend):
+    """
+    Each survey's block is cut from its own result,
+    the dense DataFrame is neither fetched nor split
+    """
+    with mock.patch.object(
+        sb.SurveyBlocks, "from_dataframe", side_effect=AssertionError
+    ), mock.patch.object(db.pd, "concat", side_effect=AssertionError):
+        blocks = db.get_all_survey_data(
+            update_view=False, fetch_mode="parallel", blocked=True
+        )
+
+    assert sorted(blocks.blocks) == [1, 2, 3]
+    assert list(blocks.blocks[3].columns) == sb.KEY_COLUMNS + ["ANS_Q1"]
+
+
+def test_project_root_in_path():
+    """
+    Ensure that the project root has been correctly added
+    to the Python import path sys.path
+    """
+    assert PROJECT_ROOT in sys.path
@@ -0,0 +1,125 @@
+# Standard Library Imports
+import os
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+# Add project root to sys.path
+sys.path.insert(0, PROJECT_ROOT)
+
+# Local Imports
+import DSTI_db_interface.db_api as db
+import DSTI_db_interface.metrics as metrics
+import DSTI_db_interface.watch as watch
+
+# 3rd party packages
+import pytest
+from unittest import mock
+
+
+@pytest.fixture
+def sqlite_backend(sqlite_backend, tmp_path):
+    with mock.patch.object(
+        watch, "WATCH_CHECKPOINT_PATH", str(tmp_path / "watch_checkpoint.txt")
+    ), mock.patch.object(db, "CHECKPOINT_PATH", str(tmp_path / "checkpoint.txt")):
+        yield sqlite_backend
+
+
+def test_view_recreated_only_when_structure_changes(sqlite_backend):
+    watcher = watch.ViewWatcher()
+
+    assert watcher.poll_once()["decision"] == "refreshed"
+    assert watcher.poll_once()["decision"] == "unchanged"
+
+    # A new question in survey 3
+    connection = sqlite_backend.connect()
+    connection.execute("INSERT INTO SurveyStructure VALUES (3, 2, 2)")
+    connection.commit()
+    connection.close()
+
+    decision = watcher.poll_once()
+    assert decision["decision"] == "refreshed"
+    assert decision["refresh_seconds"] is not None
+    assert watcher.poll_once()["decision"] == "unchanged"
+    watcher.close()
+
+    # A restarted watcher finds the view up to date
+    restarted_watcher = watch.ViewWatcher()
+    assert restarted_watcher.poll_once()["decision"] == "up_to_date"
+    restarted_watcher.close()
+
+
+def test_watcher_keeps_one_warm_connection(sqlite_backend):
+    metrics.reset_metrics()
+    watcher = watch.ViewWatcher(poll_interval=0, jitter=0)
+
+    watcher.run(max_polls=3)
+
+    assert metrics.get_counter_total("dsti_connections_opened_total") == 1
+    assert metrics.get_counter_total("dsti_watch_polls_total") == 3
+
+
+def test_watcher_keeps_checkpoint_of_its_own(sqlite_backend, tmp_path):
+    """
+    The watcher's structure checkpoint leaves the
+    data or checksum checkpoint of other refreshes alone
+    """
+    db.update_vw_AllSurveyData_if_obsolete(checkpoint_mode="checksum")
+    checkpoint = (tmp_path / "checkpoint.txt").read_text()
+
+    watcher = watch.ViewWatcher()
+    assert watcher.poll_once()["decision"] == "refreshed"
+    watcher.close()
+
+    assert (tmp_path / "checkpoint.txt").read_text() == checkpoint
+    watch_checkpoint = (tmp_path / "watch_checkpoint.txt").read_text()
+    assert watch_checkpoint.startswith(db.STRUCTURE_CHECKPOINT_PREFIX)
+    assert not db.update_vw_AllSurveyData_if_obsolete(checkpoint_mode="checksum")
+
+
+def test_dead_warm_connection_replaced_before_poll(sqlite_backend):
+    metrics.reset_metrics()
+    watcher = watch.ViewWatcher()
+    watcher.poll_once()
+    warm_connection = watcher._connection
+
+    with mock.patch.object(watcher._connection_pool, "is_alive", return_value=False):
+        assert watcher.poll_once()["decision"] == "unchanged"
+
+    assert watcher._connection is not warm_connection
+    assert metrics.get_counter_total("dsti_connections_opened_total") == 2
+    watcher.close()
+
+
+def test_failed_polls_back_off(sqlite_backend):
+    watcher = watch.ViewWatcher(
+        poll_interval=10, jitter=0.1, max_backoff=35, random_fraction=lambda: 0.5
+    )
+
+    with mock.patch.object(
+        watch.q, "get_live_questions_in_survey_matrix", side_effect=RuntimeError
+    ):
+        delays = []
+        for _ in range(3):
+            assert watcher.poll_once()["decision"] == "error"
+            delays.append(watcher.get_next_delay())
+
+    assert delays == [20, 35, 35]
+    assert watcher.poll_once()["decision"] == "refreshed"
+    assert watcher.get_next_delay() == 10
+    watcher.close()
+
+
+def test_jitter_bounds():
+    low = watch.ViewWatcher(poll_interval=10, jitter=0.2, random_fraction=lambda: 0)
+    high = watch.ViewWatcher(poll_interval=10, jitter=0.2, random_fraction=lambda: 1)
+    assert low.get_next_delay() == pytest.approx(8)
+    assert high.get_next_delay() == pytest.approx(12)
+
+
+def test_project_root_in_path():
+    """
+    Ensure that the project root has been correctly added
+    to the Python import path sys.path
+    """
+    assert PROJECT_ROOT in sys.path
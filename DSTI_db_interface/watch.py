@@ -0,0 +1,238 @@
+# Standard library imports
+import datetime
+import os
+import random
+import threading
+import time
+
+# Local Imports
+from . import db_api as db
+from . import metrics
+from . import queries_and_dynamic_queries as q
+from .db_connection import get_config, get_connection_pool, pinned_connection
+
+# External library imports
+
+
+# SHARED VARIABLES
+
+# Used when config.ini has no [WATCH] section
+DEFAULT_POLL_INTERVAL_SECONDS = 60.0
+DEFAULT_JITTER = 0.1
+DEFAULT_MAX_BACKOFF_SECONDS = 900.0
+
+# The watcher's structure checkpoint, kept apart from db_api.CHECKPOINT_PATH
+# so it doesn't overwrite a data or checksum checkpoint
+WATCH_CHECKPOINT_PATH = os.path.join(
+    os.path.join(os.path.dirname(__file__)), "Data", "watch_last_checkpoint.txt"
+)
+
+# Outcome of a poll, see ViewWatcher.poll_once:
+#   unchanged: same change signal as the previous poll
+#   up_to_date: new signal, but matching the checkpoint
+#   refreshed: vw_AllSurveyData recreated
+#   error: the poll failed, the next one is backed off
+POLL_DECISIONS = ("unchanged", "up_to_date", "refreshed", "error")
+
+
+# CLASSES
+class ViewWatcher:
+    """
+    Long running loop keeping vw_AllSurveyData up to date.
+
+    Every poll_interval seconds (give or take jitter, a fraction
+    of the interval) it reads a cheap change signal: the hash of
+    the survey structure, which is all the view definition
+    depends on, read from 3 small tables without touching Answer.
+    The view is only recreated, through the structure checkpoint
+    (see db_api.update_vw_AllSurveyData_if_obsolete) kept at
+    checkpoint_path, when the signal differs from the previous
+    poll's.
+
+    Failed polls are retried after an exponentially growing
+    delay, capped at max_backoff seconds. A pooled connection is
+    held between polls and used by all of them (see
+    db_connection.pinned_connection). It is checked before each
+    poll, and replaced if it is no longer alive or after a failure.
+    """
+
+    def __init__(
+        self,
+        poll_interval=DEFAULT_POLL_INTERVAL_SECONDS,
+        jitter=DEFAULT_JITTER,
+        max_backoff=DEFAULT_MAX_BACKOFF_SECONDS,
+        query_generator=None,
+        random_fraction=random.random,
+        checkpoint_path=None,
+    ):
+        self.poll_interval = poll_interval
+        self.jitter = jitter
+        self.max_backoff = max_backoff
+        self.query_generator = query_generator
+        self.random_fraction = random_fraction
+        self.checkpoint_path = checkpoint_path or WATCH_CHECKPOINT_PATH
+
+        self.last_signal = None
+        self.consecutive_failures = 0
+        self.polls = 0
+        self._stop_event = threading.Event()
+        # Warm connection held between polls, and the pool it is from
+        self._connection = None
+        self._connection_pool = None
+
+    def poll_once(self) -> dict:
+        """
+        Reads the change signal and recreates the view if it changed.
+
+        Returns the poll's decision (one of POLL_DECISIONS)
+        with the seconds each step took.
+        """
+        self.polls += 1
+        decision = {
+            "poll": self.polls,
+            "time": datetime.datetime.now().isoformat(timespec="seconds"),
+            "decision": None,
+            "signal": None,
+            "signal_seconds": None,
+            "refresh_seconds": None,
+            "error": None,
+        }
+        start_time = time.perf_counter()
+
+        try:
+            with pinned_connection(self._get_connection()):
+                questions_in_survey_matrix = q.get_live_questions_in_survey_matrix(
+                    use_cache=False
+                )
+                signal = db.get_survey_structure_hash_id(questions_in_survey_matrix)
+                decision["signal"] = signal
+                decision["signal_seconds"] = time.perf_counter() - start_time
+
+                if signal == self.last_signal:
+                    decision["decision"] = "unchanged"
+                else:
+                    refresh_start_time = time.perf_counter()
+                    refreshed = db.update_vw_AllSurveyData_if_obsolete(
+                        query_generator=self.query_generator,
+                        checkpoint_mode="structure",
+                        questions_in_survey_matrix=questions_in_survey_matrix,
+                        checkpoint_path=self.checkpoint_path,
+                    )
+                    decision["refresh_seconds"] = (
+                        time.perf_counter() - refresh_start_time
+                    )
+                    decision["decision"] = "refreshed" if refreshed else "up_to_date"
+                    self.last_signal = signal
+
+            self.consecutive_failures = 0
+
+        except Exception as e:
+            decision["decision"] = "error"
+            decision["error"] = str(e)
+            self.consecutive_failures += 1
+            # The connection may be the problem, get a fresh one next time
+            self.close()
+
+        decision["seconds"] = time.perf_counter() - start_time
+        metrics.increment("dsti_watch_polls_total", decision=decision["decision"])
+        metrics.observe("dsti_watch_poll_seconds", decision["seconds"])
+        return decision
+
+    def get_next_delay(self) -> float:
+        """
+        Seconds to wait before the next poll: poll_interval, doubled
+        for every consecutive failure up to max_backoff, then moved
+        by up to +/- jitter of itself so that several watchers
+        don't poll in lockstep.
+        """
+        delay = self.poll_interval * 2**self.consecutive_failures
+        delay = min(delay, max(self.max_backoff, self.poll_interval))
+        return delay * (1 + self.jitter * (2 * self.random_fraction() - 1))
+
+    def run(self, max_polls=None) -> None:
+        """
+        Polls until stop() is called, or max_polls polls are done
+        """
+        try:
+            while not self._stop_event.is_set():
+                decision = self.poll_once()
+                stdout_watch_decision(decision)
+                export_watch_metrics()
+
+                if max_polls is not None and self.polls >= max_polls:
+                    break
+
+                self._stop_event.wait(self.get_next_delay())
+        finally:
+            self.close()
+
+    def stop(self) -> None:
+        """
+        Ends run() at once, even while waiting for the next poll.
+        Safe to call from signal handlers and other threads.
+        """
+        self._stop_event.set()
+
+    def close(self) -> None:
+        """
+        Hands the warm connection back to the pool
+        """
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            # Broken connections are discarded by the pool
+            self._connection_pool.release(connection)
+
+    def _get_connection(self):
+        # The server may have dropped it since the last poll
+        if self._connection is not None and not self._connection_pool.is_alive(
+            self._connection
+        ):
+            self.close()
+
+        if self._connection is None:
+            self._connection_pool = get_connection_pool()
+            with metrics.timer("dsti_connection_acquire_seconds"):
+                self._connection = self._connection_pool.acquire()
+        return self._connection
+
+
+# FUNCTIONS
+def get_watch_settings() -> dict:
+    """
+    Reads the optional [WATCH] section of config.ini,
+    falling back to the module defaults for anything missing.
+    """
+    config = get_config()
+    return {
+        "poll_interval": config.getfloat(
+            "WATCH", "poll_interval_seconds", fallback=DEFAULT_POLL_INTERVAL_SECONDS
+        ),
+        "jitter": config.getfloat("WATCH", "jitter", fallback=DEFAULT_JITTER),
+        "max_backoff": config.getfloat(
+            "WATCH", "max_backoff_seconds", fallback=DEFAULT_MAX_BACKOFF_SECONDS
+        ),
+    }
+
+
+def stdout_watch_decision(decision) -> None:
+    timings = f"signal {decision['signal_seconds'] or 0:.3f}s"
+    if decision["refresh_seconds"] is not None:
+        timings += f", refresh {decision['refresh_seconds']:.3f}s"
+
+    if decision["decision"] == "error":
+        print(
+            f"[{decision['time']}] poll {decision['poll']}: error after "
+            f"{decision['seconds']:.3f}s: {decision['error']}"
+        )
+    else:
+        print(
+            f"[{decision['time']}] poll {decision['poll']}: {decision['decision']} "
+            f"({timings}, total {decision['seconds']:.3f}s)"
+        )
+
+
+def export_watch_metrics() -> None:
+    try:
+        metrics.export_configured_metrics()
+    except OSError as e:
+        print(f"Could not export metrics:\n{e}\n")
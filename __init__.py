@@ -1,6 +1,6 @@
 # Standard Library Imports
 import os
-import subprocess
+import runpy
 import sys
 
 
@@ -13,19 +13,24 @@ import DSTI_db_interface.db_api as db_api
 import DSTI_db_interface.db_connection as db_connection
 import DSTI_db_interface.queries_and_dynamic_queries as queries_and_dynamic_queries
 
-# Install any missing dependencies for import
-dependency_installation.install_dependencies()
+# Warn about any missing dependencies. Installing them is
+# left to: python __init__.py --install-dependencies
+dependency_installation.check_dependencies()
 
 
 PROJECT_NAME = "DSTI_db_interface"
 
 if __name__ == "__main__":
 
+    if "--install-dependencies" in sys.argv[1:]:
+        dependency_installation.install_dependencies()
+        sys.exit()
+
     try:
-        # Run as command line app
+        # Run as command line app, in this interpreter
         app_file_pth = os.path.join(
             os.path.dirname(__file__), PROJECT_NAME, "Scripts", "app.py"
         )
-        subprocess.check_call([sys.executable, app_file_pth])
+        runpy.run_path(app_file_pth, run_name="__main__")
     except KeyboardInterrupt:
         pass